@@ -1,9 +1,151 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import difflib
-from knowledge import symptom_to_diseases, disease_to_symptoms, disease_info
+import tkinter.font as tkfont
+import core
+import metrics
+from knowledge import store
 from chatbot import MedicalChatbot
-import matplotlib.pyplot as plt
+from search import SubstringIndex
+
+# Quiet period after a keystroke before the symptom list is filtered
+SEARCH_DEBOUNCE_MS = 120
+
+
+def build_symptom_search(kb):
+    return SubstringIndex(sorted(kb.symptom_to_diseases))
+
+
+class BackgroundRunner:
+    """Runs engine work on one worker thread and hands results back to Tk.
+
+    Tk is not thread-safe, so the worker only ever touches queues; the main
+    loop polls the result queue every frame (~60 fps) and runs the callbacks.
+    Tasks submitted on the same channel supersede each other: an older one is
+    skipped if it has not started, and its result is dropped if it has.
+    Channel None never cancels (used for chat, where every turn matters).
+    """
+
+    def __init__(self, root, on_busy=None, poll_ms=16):
+        self.root = root
+        self.on_busy = on_busy
+        self.poll_ms = poll_ms
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = {}
+        self.pending = 0
+        self.busy = False
+
+        threading.Thread(target=self._work, name="engine-worker", daemon=True).start()
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, channel, func, args=(), on_done=None):
+        gen = self.latest.get(channel, 0) + 1
+        if channel is not None:
+            self.latest[channel] = gen
+        self.pending += 1
+        self.tasks.put((channel, gen, func, args, on_done))
+        self._set_busy(True)
+
+    def _set_busy(self, busy):
+        if busy != self.busy:
+            self.busy = busy
+            if self.on_busy:
+                self.on_busy(busy)
+
+    def _stale(self, channel, gen):
+        return channel is not None and self.latest.get(channel) != gen
+
+    def _work(self):
+        while True:
+            channel, gen, func, args, on_done = self.tasks.get()
+            result = error = None
+            if not self._stale(channel, gen):
+                try:
+                    result = func(*args)
+                except Exception as e:
+                    error = e
+            self.results.put((channel, gen, result, error, on_done))
+
+    def _poll(self):
+        while True:
+            try:
+                channel, gen, result, error, on_done = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if self._stale(channel, gen):
+                continue
+            if error is not None:
+                messagebox.showerror("Error", str(error))
+            elif on_done:
+                on_done(result)
+        if self.pending == 0:
+            self._set_busy(False)
+        self.root.after(self.poll_ms, self._poll)
+
+
+class VirtualListbox(tk.Frame):
+    """Listbox that only holds the rows in view; scrolling swaps their text,
+    so a 100k-item list costs the same as a 20-item one"""
+
+    def __init__(self, parent, **listbox_options):
+        super().__init__(parent, bg=listbox_options.get("bg"))
+        self.items = []
+        self.top = 0
+        self.rows = 10
+
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.listbox = tk.Listbox(self, exportselection=False, **listbox_options)
+        self.listbox.pack(side="left", fill="both", expand=True)
+
+        font = tkfont.Font(font=self.listbox.cget("font"))
+        self.row_height = font.metrics("linespace") + 1
+
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.listbox.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.listbox.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+
+    def set_items(self, items):
+        self.items = items
+        self.top = 0
+        self._render()
+
+    def selected(self):
+        sel = self.listbox.curselection()
+        return self.items[self.top + sel[0]] if sel else None
+
+    def yview(self, *args):
+        """Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")"""
+        if args[0] == "moveto":
+            top = int(float(args[1]) * len(self.items))
+        else:
+            step = self.rows if args[2] == "pages" else 1
+            top = self.top + int(args[1]) * step
+        top = max(0, min(top, len(self.items) - self.rows))
+        if top != self.top:
+            self.top = top
+            self._render()
+        return "break"
+
+    def _on_resize(self, event):
+        rows = max(1, event.height // self.row_height)
+        if rows != self.rows:
+            self.rows = rows
+            self._render()
+
+    def _render(self):
+        n = len(self.items)
+        self.listbox.delete(0, tk.END)
+        if n:
+            self.listbox.insert(tk.END, *self.items[self.top:self.top + self.rows])
+            self.scrollbar.set(self.top / n, min(1.0, (self.top + self.rows) / n))
+        else:
+            self.scrollbar.set(0.0, 1.0)
 
 
 class SymptomCheckerApp:
@@ -14,14 +156,24 @@ class SymptomCheckerApp:
         self.root.configure(bg="#e9edf2")
 
         # Data
-        self.all_symptoms = sorted(list(symptom_to_diseases.keys()))
+        self.kb_version = store.current.version
+        self.all_symptoms = core.all_symptoms()
         self.selected_symptoms = []
+        # Ranking kept in step with the selection, one symptom at a time
+        self.live = core.live_ranking()
         self.chatbot = MedicalChatbot()
 
         self.setup_styles()
         self.create_header()
+        self.create_status_bar()
         self.create_main_layout()
 
+        # Diagnosis, chat and plotting run off the Tk main loop
+        self.runner = BackgroundRunner(self.root, on_busy=self.set_busy)
+
+        # Refresh the symptom list after a knowledge reload
+        self.root.after(1000, self.check_knowledge)
+
     # ---------------- STYLES ----------------
     def setup_styles(self):
         style = ttk.Style()
@@ -62,6 +214,25 @@ class SymptomCheckerApp:
                  bg=self.primary_color, fg="#e0f2f1",
                  font=("Helvetica", 12, "italic")).pack(pady=(5, 0))
 
+    # ---------------- STATUS BAR ----------------
+    def create_status_bar(self):
+        bar = tk.Frame(self.root, bg=self.bg_color, padx=20)
+        bar.pack(side="bottom", fill="x", pady=(0, 8))
+
+        self.status_label = tk.Label(bar, text="Ready", bg=self.bg_color, fg=self.text_color)
+        self.status_label.pack(side="left")
+
+        self.busy_bar = ttk.Progressbar(bar, mode="indeterminate", length=160)
+        self.busy_bar.pack(side="right")
+
+    def set_busy(self, busy):
+        if busy:
+            self.status_label.config(text="Working…")
+            self.busy_bar.start(15)
+        else:
+            self.status_label.config(text="Ready")
+            self.busy_bar.stop()
+
     # ---------------- MAIN LAYOUT ----------------
     def create_main_layout(self):
         main_frame = tk.Frame(self.root, bg=self.bg_color, padx=20, pady=20)
@@ -92,24 +263,16 @@ class SymptomCheckerApp:
         content.pack(fill="both", expand=True)
 
         self.search_var = tk.StringVar()
-        self.search_var.trace("w", self.update_list)
+        self.search_var.trace("w", self.schedule_update_list)
+        self.search_job = None
 
         tk.Entry(content, textvariable=self.search_var).pack(fill="x", pady=5)
 
-        list_frame = tk.Frame(content, bg=self.card_bg)
-        list_frame.pack(fill="both", expand=True)
-
-        scrollbar = tk.Scrollbar(list_frame)
-        scrollbar.pack(side="right", fill="y")
+        self.symptom_listbox = VirtualListbox(content, bg=self.card_bg, fg=self.text_color)
+        self.symptom_listbox.pack(fill="both", expand=True)
 
-        self.symptom_listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set,
-                                          bg=self.card_bg, fg=self.text_color)
-        self.symptom_listbox.pack(side="left", fill="both", expand=True)
-        
-        scrollbar.config(command=self.symptom_listbox.yview)
-
-        self.symptom_listbox.bind("<<ListboxSelect>>", self.on_select_symptom)
-        self.update_list()
+        self.symptom_listbox.listbox.bind("<<ListboxSelect>>", self.on_select_symptom)
+        self.symptom_listbox.set_items(self.all_symptoms)
 
         # Selected symptoms
         right_card = tk.Frame(top, bg=self.card_bg, bd=2, relief="raised")
@@ -176,19 +339,40 @@ class SymptomCheckerApp:
         self.add_chat_message("bot", "Hi! Ask me anything about your symptoms or results.")
 
     # ---------------- LOGIC ----------------
+    def schedule_update_list(self, *args):
+        # Debounce: only filter once typing pauses
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DEBOUNCE_MS, self.update_list)
+
     def update_list(self, *args):
+        self.search_job = None
         term = self.search_var.get().lower()
-        self.symptom_listbox.delete(0, tk.END)
-        items = [s for s in self.all_symptoms if term in s.lower()]
-        for s in items:
-            self.symptom_listbox.insert(tk.END, s)
+        # Filtered on the worker; a newer keystroke supersedes this one
+        self.runner.submit("filter", self.filter_symptoms, (term,), self.symptom_listbox.set_items)
+
+    def filter_symptoms(self, term):
+        if not term:
+            return self.all_symptoms
+        return store.current.derived("symptom_search", build_symptom_search).search(term)
+
+    def check_knowledge(self):
+        kb = store.current
+        if kb.version != self.kb_version:
+            self.kb_version = kb.version
+            self.all_symptoms = core.all_symptoms()
+            self.update_list()
+            self.live = core.live_ranking(self.selected_symptoms)
+            self.show_live_ranking()
+        self.root.after(1000, self.check_knowledge)
 
     def on_select_symptom(self, event):
-        if self.symptom_listbox.curselection():
-            s = self.symptom_listbox.get(self.symptom_listbox.curselection())
-            if s not in self.selected_symptoms:
-                self.selected_symptoms.append(s)
-                self.selected_listbox.insert(tk.END, s)
+        s = self.symptom_listbox.selected()
+        if s and s not in self.selected_symptoms:
+            self.selected_symptoms.append(s)
+            self.selected_listbox.insert(tk.END, s)
+            self.live.add(s)
+            self.show_live_ranking()
 
     def remove_symptom(self):
         if self.selected_listbox.curselection():
@@ -196,82 +380,80 @@ class SymptomCheckerApp:
             s = self.selected_listbox.get(idx)
             self.selected_symptoms.remove(s)
             self.selected_listbox.delete(idx)
+            self.live.remove(s)
+            self.show_live_ranking()
 
     def clear_all(self):
         self.selected_symptoms.clear()
         self.selected_listbox.delete(0, tk.END)
+        self.live.clear()
         self.results_text.config(state="normal")
         self.results_text.delete(1.0, tk.END)
         self.results_text.config(state="disabled")
 
+    def show_live_ranking(self):
+        # Cheap enough for the main thread: only the candidates are scored
+        self.results_text.config(state="normal")
+        self.results_text.delete(1.0, tk.END)
+        if self.selected_symptoms:
+            self.results_text.insert(tk.END, "Live ranking (press Analyze for details):\n\n")
+            for disease, score in self.live.top(3):
+                self.results_text.insert(tk.END, f"• {disease} ({score}%)\n")
+        self.results_text.config(state="disabled")
+
     # ---------------- DIAGNOSIS ----------------
     def diagnose(self):
         if not self.selected_symptoms:
             messagebox.showwarning("No symptoms", "Please select symptoms first.")
             return
 
-        matches = self.match_symptoms(self.selected_symptoms)
-        scores = self.compute_certainty(matches)
-
-        top3 = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:3]
-
-        # Confidence floor
-        if top3 and top3[0][1] < 35:
-            top3[0] = (top3[0][0], 35.0)
-
-        self.display_results(top3, self.selected_symptoms)
-        self.chatbot.set_diagnosis_context(top3, self.selected_symptoms,
-                                           self.get_severity(len(self.selected_symptoms)))
-
-    def match_symptoms(self, user_symptoms):
-        matches = {}
-        for s in user_symptoms:
-            for d in symptom_to_diseases.get(s, []):
-                matches[d] = matches.get(d, 0) + 1
-        return matches
-
-    # ⭐ JACCARD + COVERAGE BONUS ⭐
-    def compute_certainty(self, matches):
-        scores = {}
-        user_set = set(self.selected_symptoms)
-
-        for disease in matches:
-            disease_set = set(disease_to_symptoms.get(disease, []))
-            if not disease_set:
-                continue
-
-            intersection = user_set & disease_set
-            union = user_set | disease_set
-
-            jaccard = len(intersection) / len(union)
-            coverage = len(intersection) / len(user_set)
-
-            final_score = (jaccard * 70) + (coverage * 30)
-            scores[disease] = round(final_score, 1)
-
-        return scores
+        # Score a copy on the worker; a newer click supersedes this one
+        symptoms = list(self.selected_symptoms)
+        self.runner.submit("diagnose", self.run_diagnosis, (symptoms,),
+                           lambda result: self.show_diagnosis(*result, symptoms))
+
+    @metrics.timed("gui.diagnose")
+    def run_diagnosis(self, symptoms):
+        # Jaccard + coverage ranking with the confidence floor (see scoring.py),
+        # cached per symptom set (see cache.py)
+        with metrics.stage("gui.score"):
+            top3 = core.diagnose(symptoms, 3)
+        # Also on the worker: the first lookup builds the related-conditions index
+        related = {disease: core.related_conditions(disease, 2) for disease, _ in top3}
+        question = core.next_question(symptoms, [disease for disease, _ in top3])
+        return top3, related, question
+
+    def show_diagnosis(self, top3, related, question, symptoms):
+        self.display_results(top3, symptoms, related, question)
+        # Queued behind any chat turn so the bot's context is only touched by the worker
+        self.runner.submit(None, self.chatbot.set_diagnosis_context,
+                           (top3, symptoms, self.get_severity(len(symptoms))))
 
     def get_severity(self, count):
-        if count <= 2:
-            return "Mild — Home care recommended."
-        elif count <= 4:
-            return "Moderate — Consider seeing a doctor."
-        else:
-            return "Severe — Seek medical attention."
+        return core.severity(count)
 
-    def display_results(self, top_matches, user_symptoms):
+    def display_results(self, top_matches, user_symptoms, related=None, question=None):
         self.results_text.config(state="normal")
         self.results_text.delete(1.0, tk.END)
 
         for disease, score in top_matches:
-            desc = disease_info.get(disease, "No description available.")
+            desc = core.describe(disease)
             self.results_text.insert(
                 tk.END,
-                f"• {disease} ({score}% likelihood based on selected symptoms)\n  {desc}\n\n"
+                f"• {disease} ({score}% likelihood based on selected symptoms)\n  {desc}\n"
             )
+            similar = (related or {}).get(disease)
+            if similar:
+                self.results_text.insert(
+                    tk.END, "  Often confused with: " + ", ".join(f"{d} ({j:.0%} overlap)" for d, j in similar) + "\n")
+            self.results_text.insert(tk.END, "\n")
 
         self.results_text.insert(tk.END,
                                  f"⚠️ Severity Estimate: {self.get_severity(len(user_symptoms))}")
+        if question:
+            self.results_text.insert(
+                tk.END, f"\n\n❓ To narrow it down: do you also have {store.current.label(question[0])}? "
+                        "If so, add it and analyze again.")
         self.results_text.config(state="disabled")
 
     # ---------------- GRAPH ----------------
@@ -280,15 +462,30 @@ class SymptomCheckerApp:
             messagebox.showwarning("No data", "Analyze symptoms first.")
             return
 
-        days = [1, 2, 3, 4, 5, 6, 7]
-        recovery = [20, 35, 50, 65, 75, 85, 95]
+        self.runner.submit("graph", self.build_recovery_figure, (), self.show_figure)
+
+    def build_recovery_figure(self):
+        # Runs on the worker: the matplotlib import and plotting are the slow part
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(6, 4))
+        ax = fig.add_subplot()
+        ax.plot(core.RECOVERY_DAYS, core.RECOVERY_PERCENT, marker="o")
+        ax.set_title("Estimated Recovery Progress")
+        ax.set_xlabel("Days")
+        ax.set_ylabel("Recovery (%)")
+        ax.grid(True)
+        return fig
+
+    def show_figure(self, fig):
+        # Embedded in a Toplevel instead of plt.show(), which would block the main loop
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-        plt.plot(days, recovery, marker="o")
-        plt.title("Estimated Recovery Progress")
-        plt.xlabel("Days")
-        plt.ylabel("Recovery (%)")
-        plt.grid(True)
-        plt.show()
+        window = tk.Toplevel(self.root)
+        window.title("Estimated Recovery Progress")
+        canvas = FigureCanvasTkAgg(fig, master=window)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill="both", expand=True)
 
     # ---------------- CHAT ----------------
     def send_message(self):
@@ -297,8 +494,8 @@ class SymptomCheckerApp:
             return
         self.chat_input.delete(0, tk.END)
         self.add_chat_message("user", msg)
-        reply = self.chatbot.get_response(msg)
-        self.add_chat_message("bot", reply)
+        self.runner.submit(None, self.chatbot.get_response, (msg,),
+                           lambda reply: self.add_chat_message("bot", reply))
 
     def add_chat_message(self, sender, msg):
         self.chat_display.config(state="normal")
@@ -308,6 +505,7 @@ class SymptomCheckerApp:
 
 
 if __name__ == "__main__":
+    store.start_watching()
     root = tk.Tk()
     app = SymptomCheckerApp(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Batch diagnosis for offline re-scoring of intake records
+Uses the same scoring engine as the GUI's Analyze button, so results match it
+
+Usage:
+    python batch.py intake.csv -o results.jsonl --workers 4
+    cat intake.jsonl | python batch.py - --format jsonl > results.jsonl
+
+Input records:
+    CSV   - a 'symptoms' column with ';'-separated symptoms, optional 'id' column
+    JSONL - {"id": ..., "symptoms": [...]} objects, or plain lists of symptoms
+Output: one JSON object per line: {"id": ..., "results": [{"disease": ..., "score": ...}]}
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import sys
+from collections import deque
+from itertools import islice
+
+
+def get_engine():
+    """Loads the knowledge base, keeping its status messages off stdout"""
+    with contextlib.redirect_stdout(sys.stderr):
+        from knowledge import scoring_engine
+    return scoring_engine
+
+
+def normalize(symptoms):
+    """Matches the knowledge base's lower-case symptom names; sorted and
+    deduplicated like the diagnosis cache's keys, so ties break as in the GUI"""
+    return sorted({s.strip().lower() for s in symptoms if s and s.strip()})
+
+
+def diagnose_batch(symptom_sets, k=3, engine=None):
+    """Yields the top k (disease, score) list for each symptom set, lazily"""
+    engine = engine or get_engine()
+    for symptoms in symptom_sets:
+        yield engine.diagnose(normalize(symptoms), k)
+
+
+# ----------------------------------------------------------
+# STREAMING I/O
+# ----------------------------------------------------------
+
+def read_records(f, fmt):
+    """Yields (record_id, symptoms) from a CSV or JSONL stream"""
+    if fmt == "csv":
+        for n, row in enumerate(csv.DictReader(f), 1):
+            yield row.get("id") or n, (row.get("symptoms") or "").split(";")
+    else:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if isinstance(rec, dict):
+                yield rec.get("id", n), rec.get("symptoms", [])
+            else:
+                yield n, rec
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _score_chunk(chunk, k):
+    """Worker task: scores one chunk of (record_id, symptoms)"""
+    engine = get_engine()
+    return [(rid, engine.diagnose(normalize(symptoms), k)) for rid, symptoms in chunk]
+
+
+def score_records(records, k=3, workers=1, chunk_size=1000):
+    """Yields (record_id, top_k) in input order, holding at most ~2 chunks per worker"""
+    chunks = chunked(records, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _score_chunk(chunk, k)
+        return
+
+    import multiprocessing
+
+    with multiprocessing.Pool(workers) as pool:
+        # A sliding window of submitted chunks keeps memory bounded
+        # (Pool.imap would drain the whole input into its task queue)
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_score_chunk, (chunk, k)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch symptom-set diagnosis (CSV/JSONL in, JSONL out)")
+    parser.add_argument("input", help="input file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output JSONL file (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: from extension)")
+    parser.add_argument("-k", "--top", type=int, default=3, help="diseases per record")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="records per work unit")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+
+    # Load once in the parent so forked workers share it
+    get_engine()
+
+    with contextlib.ExitStack() as stack:
+        src = sys.stdin if args.input == "-" else stack.enter_context(open(args.input, newline="", encoding="utf-8"))
+        dst = sys.stdout if args.output == "-" else stack.enter_context(open(args.output, "w", encoding="utf-8"))
+
+        records = read_records(src, fmt)
+        for rid, top in score_records(records, args.top, args.workers, args.chunk_size):
+            results = [{"disease": d, "score": sc} for d, sc in top]
+            dst.write(json.dumps({"id": rid, "results": results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
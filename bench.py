@@ -0,0 +1,320 @@
+"""
+Benchmark suite for the knowledge base and chat hot paths
+Generates synthetic dataset.csv / disease_description.csv /
+disease_precaution.csv files at a given edge count, with a skewed symptom
+popularity (a few symptoms like "fever" appear everywhere, most are rare)
+and log-normal disease sizes like the bundled dataset, then times each hot
+path headlessly and reports percentiles and memory.
+
+Usage:
+    python bench.py                                   # 10k, 100k and 1M edges
+    python bench.py --sizes 10k 100k -o results.json
+    python bench.py --sizes 10k --compare baseline.json --tolerance 0.25   # exit 1 on regression
+    python bench.py --generate-only --sizes 1m --data-dir ./synthetic
+"""
+
+import argparse
+import contextlib
+import csv
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from bisect import bisect
+from itertools import accumulate
+
+import snapshot
+from shared import memory_kib
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Generated datasets are cached here between runs
+DATA_DIR = os.path.join(tempfile.gettempdir(), "symptom-bench")
+
+SYLLABLES = ["ab", "ac", "al", "an", "ar", "ba", "ce", "co", "de", "di", "el", "en", "fa", "ga",
+             "he", "id", "il", "in", "ka", "la", "lo", "ma", "me", "mi", "na", "ne", "no", "or",
+             "pa", "pe", "ra", "re", "ri", "ro", "sa", "se", "si", "ta", "te", "ti", "to", "ul",
+             "um", "ur", "va", "ve", "xi", "za"]
+FILLER = ["i", "have", "a", "and", "my", "really", "since", "yesterday", "some", "bad", "feel", "with"]
+
+# Share of symptom names with 1, 2, 3 and 4 words in the bundled dataset
+WORDS_PER_SYMPTOM = [0.45, 0.36, 0.15, 0.04]
+
+
+def parse_size(text):
+    """'100k' / '1m' / '2500' -> edge count"""
+    text = text.lower()
+    if text in SIZES:
+        return SIZES[text]
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1])
+    return int(float(text[:-1]) * scale) if scale else int(text)
+
+
+# ----------------------------------------------------------
+# SYNTHETIC KNOWLEDGE BASE
+# ----------------------------------------------------------
+
+def _word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _unique(rng, n, make):
+    names, seen = [], set()
+    while len(names) < n:
+        name = make()
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def generate(directory, edges, seed=0):
+    """Writes the three CSVs for about `edges` disease-symptom pairs; returns their paths"""
+    rng = random.Random(seed)
+    n_diseases = max(2, edges // 13)
+    n_symptoms = max(50, int(4 * edges ** 0.66))
+
+    def symptom():
+        words = rng.choices(range(1, 5), WORDS_PER_SYMPTOM)[0]
+        return " ".join(_word(rng) for _ in range(words))
+
+    symptoms = _unique(rng, n_symptoms, symptom)
+    diseases = _unique(rng, n_diseases, lambda: f"{_word(rng)} {_word(rng)}".title())
+
+    # Zipf-like symptom popularity, log-normal disease sizes (median ~12, long tail)
+    cum = list(accumulate(1 / (rank + 1) ** 0.9 for rank in range(n_symptoms)))
+    sizes = [min(n_symptoms, max(2, int(rng.lognormvariate(math.log(12), 0.6)))) for _ in diseases]
+    scale = edges / sum(sizes)
+    sizes = [min(n_symptoms, max(2, round(s * scale))) for s in sizes]
+
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, name) for name in
+             ("dataset.csv", "disease_description.csv", "disease_precaution.csv")]
+
+    with open(paths[0], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Source", "Target", "Weight"])
+        for disease, size in zip(diseases, sizes):
+            chosen = set()
+            while len(chosen) < size:
+                chosen.add(bisect(cum, rng.random() * cum[-1]))
+            weight = rng.randint(1, 1500)
+            writer.writerows((disease.lower(), symptoms[s], weight) for s in chosen)
+
+    with open(paths[1], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Disease", "Description"])
+        for disease in diseases:
+            words = [_word(rng) for _ in range(rng.randint(15, 45))]
+            writer.writerow([disease, f"{disease} is " + " ".join(words) + "."])
+
+    with open(paths[2], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Disease"] + [f"Precaution_{i}" for i in range(1, 5)])
+        for disease in diseases:
+            writer.writerow([disease] + [f"{_word(rng)} {_word(rng)}" for _ in range(4)])
+    return paths
+
+
+def dataset(directory, edges, seed=0):
+    """Paths of a generated dataset, generating it only if missing"""
+    sub = os.path.join(directory, f"edges-{edges}-seed-{seed}")
+    paths = [os.path.join(sub, name) for name in
+             ("dataset.csv", "disease_description.csv", "disease_precaution.csv")]
+    if not all(os.path.exists(p) for p in paths):
+        generate(sub, edges, seed)
+    return paths
+
+
+# ----------------------------------------------------------
+# TIMING
+# ----------------------------------------------------------
+
+def summarize(samples):
+    """Percentiles (ms) of a list of durations in seconds"""
+    samples = sorted(samples)
+    pct = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"n": len(samples), "mean_ms": round(sum(samples) / len(samples) * 1000, 4),
+            "p50_ms": round(pct(0.5), 4), "p90_ms": round(pct(0.9), 4), "p95_ms": round(pct(0.95), 4),
+            "p99_ms": round(pct(0.99), 4), "max_ms": round(samples[-1] * 1000, 4)}
+
+
+def timed(func, inputs):
+    """Duration of func(x) for each x in inputs"""
+    clock = time.perf_counter
+    samples = []
+    for x in inputs:
+        start = clock()
+        func(x)
+        samples.append(clock() - start)
+    return samples
+
+
+def _messages(rng, kb, n):
+    """Chat lines mentioning 1-3 symptoms, some with a typo"""
+    vocab = list(kb.symptom_to_diseases)
+    out = []
+    for _ in range(n):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(2, 6))]
+        for s in rng.sample(vocab, rng.randint(1, 3)):
+            if rng.random() < 0.3 and len(s) > 5:
+                i = rng.randrange(1, len(s) - 1)
+                s = s[:i] + s[i + 1] + s[i] + s[i + 2:]
+            words.insert(rng.randrange(len(words) + 1), s)
+        out.append(" ".join(words))
+    return out
+
+
+def _disease_queries(rng, kb, n):
+    """Exact, lower-case, partial, misspelt and unknown disease names"""
+    names = list(kb.disease_to_symptoms)
+    out = []
+    for _ in range(n):
+        name = rng.choice(names)
+        kind = rng.randrange(5)
+        if kind == 1:
+            name = name.lower()
+        elif kind == 2:
+            name = name.split()[0][:5]
+        elif kind == 3 and len(name) > 4:
+            name = name[:2] + name[3:]
+        elif kind == 4:
+            name = _word(rng)
+        out.append(name)
+    return out
+
+
+def run(paths, samples=2000, load_repeats=3, seed=0):
+    """Times every hot path on one dataset; returns {stage: summary, "memory": {...}}"""
+    import knowledge
+    from chatbot import MedicalChatbot
+
+    rng = random.Random(seed)
+    results = {}
+    csv_file, desc_file, prec_file = paths
+
+    # Loading: CSV parsing, building the derived indexes, and the snapshot path
+    parse, build, snap_load = [], [], []
+    for _ in range(load_repeats):
+        kb = tables = None
+        gc.collect()
+        rss_before = memory_kib()[0]
+        start = time.perf_counter()
+        tables = (knowledge.read_symptoms(csv_file), knowledge.read_descriptions(desc_file),
+                  knowledge.read_treatments(prec_file))
+        parse.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        kb = knowledge.KnowledgeBase(*tables)
+        build.append(time.perf_counter() - start)
+        rss_after = memory_kib()[0]
+
+    snap_path = os.path.join(os.path.dirname(csv_file), "knowledge.snapshot")
+    snapshot.write_snapshot(snap_path, *tables)
+    for _ in range(load_repeats):
+        start = time.perf_counter()
+        snapshot.read_snapshot(snap_path)
+        snap_load.append(time.perf_counter() - start)
+
+    results["load.parse_csv"] = summarize(parse)
+    results["load.build_indexes"] = summarize(build)
+    results["load.snapshot"] = summarize(snap_load)
+
+    # Chat: the bot normally picks up knowledge.store.current; point it at this kb
+    bot = MedicalChatbot()
+    bot.kb = kb
+    start = time.perf_counter()
+    bot.matcher, bot.name_index
+    results["chat.build_matchers"] = summarize([time.perf_counter() - start])
+
+    def extract(text):
+        bot.context["mentioned_symptoms"] = []
+        return bot.extract_symptoms(text)
+
+    results["chat.extract_symptoms"] = summarize(timed(extract, _messages(rng, kb, samples)))
+    results["chat.get_disease_info"] = summarize(timed(bot.get_disease_info, _disease_queries(rng, kb, samples)))
+
+    # Scoring, as the GUI's Analyze button uses it
+    vocab = list(kb.symptom_to_diseases)
+    sets = [rng.sample(vocab, rng.randint(1, 6)) for _ in range(samples)]
+    engine = kb.scoring_engine
+    results["score.compute_certainty"] = summarize(timed(engine.certainty, sets))
+    results["score.diagnose"] = summarize(timed(engine.diagnose, sets))
+
+    results["memory"] = {"kb_rss_kib": rss_after - rss_before, "rss_kib": memory_kib()[0],
+                         "diseases": len(kb.disease_to_symptoms), "symptoms": len(vocab),
+                         "edges": sum(len(s) for s in kb.disease_to_symptoms.values())}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing p50 changes vs baseline; second value is True if any regressed"""
+    lines, regressed = [], False
+    for size, stages in results.items():
+        for stage, summary in stages.items():
+            old = baseline.get(size, {}).get(stage)
+            if stage == "memory" or not old or not old.get("p50_ms"):
+                continue
+            ratio = summary["p50_ms"] / old["p50_ms"]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag, regressed = "  REGRESSION", True
+            lines.append(f"{size:>5} {stage:26} {old['p50_ms']:>10.4f} -> {summary['p50_ms']:>10.4f} ms"
+                         f"  x{ratio:.2f}{flag}")
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite on synthetic knowledge bases")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k", "1m"], help="edge counts (10k, 100k, 1m, 2500, ...)")
+    parser.add_argument("--samples", type=int, default=2000, help="calls timed per hot path")
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="where generated datasets are cached")
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown with --compare")
+    parser.add_argument("--generate-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label in args.sizes:
+        edges = parse_size(label)
+        paths = dataset(args.data_dir, edges, args.seed)
+        if args.generate_only:
+            print(os.path.dirname(paths[0]))
+            continue
+        with contextlib.redirect_stdout(sys.stderr):
+            results[label] = run(paths, args.samples, args.load_repeats, args.seed)
+
+        mem = results[label]["memory"]
+        print(f"{label}: {mem['diseases']} diseases, {mem['symptoms']} symptoms, {mem['edges']} edges, "
+              f"knowledge base +{mem['kb_rss_kib']} KiB RSS")
+        for stage, s in results[label].items():
+            if stage != "memory":
+                print(f"  {stage:26} p50 {s['p50_ms']:>10.4f}  p90 {s['p90_ms']:>10.4f}  "
+                      f"p99 {s['p99_ms']:>10.4f} ms  (n={s['n']})")
+    if args.generate_only:
+        return
+
+    if args.output:
+        meta = {"python": platform.python_version(), "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "samples": args.samples, "seed": args.seed}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        lines, regressed = compare(results, baseline, args.tolerance)
+        print("\n".join(lines))
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+LRU cache of diagnosis results, shared by the GUI and the chatbot
+Keys are the canonical symptom set plus the knowledge base version, so the
+same symptoms in any order (or repeated) hit one entry, and a reload never
+serves scores from an older version.
+
+Usage:
+    knowledge.store.diagnoses.get(kb, symptoms)                  # GUI ranking
+    knowledge.store.diagnoses.get(kb, symptoms, "coverage", 3)   # chatbot ranking
+    knowledge.store.diagnoses.warm(kb, read_log("intake.jsonl"))
+
+    python cache.py intake.jsonl --maxsize 1024   # replay a log, report hit rate
+"""
+
+import argparse
+import contextlib
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from batch import normalize, read_records
+
+
+def compute(engine, symptoms, method="diagnose", k=3):
+    """Uncached ranking for a symptom set; method is diagnose/certainty/coverage"""
+    # Sorted so ties between equal scores break the same way for every ordering
+    symptoms = sorted(symptoms)
+    if method == "diagnose":
+        return engine.diagnose(symptoms, k)
+    return engine.rank(symptoms, k, method)
+
+
+class DiagnosisCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        # (version, method, k, frozenset) -> tuple of (disease, score); oldest first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Frequent symptom sets from warm(), recomputed after each reload
+        self._hot = []
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, kb, symptoms, method="diagnose", k=3):
+        """Top k (disease, score) pairs for symptoms under kb, computed at most once"""
+        key = (kb.version, method, k, frozenset(symptoms))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry)
+            self.misses += 1
+
+        result = compute(kb.scoring_engine, key[3], method, k)
+        self._put(key, result)
+        return result
+
+    def _put(self, key, result):
+        with self._lock:
+            self._entries[key] = tuple(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def warm(self, kb, symptom_sets, method="diagnose", k=3, limit=None):
+        """Precomputes the most frequent symptom sets (up to limit, default maxsize)
+        without touching the hit/miss counters; returns how many were added"""
+        counts = Counter(frozenset(normalize(s)) for s in symptom_sets)
+        counts.pop(frozenset(), None)
+        hot = [(s, method, k) for s, _ in counts.most_common(limit or self.maxsize)]
+        self._hot = (hot + self._hot)[:self.maxsize]
+        return self._fill(kb, hot)
+
+    def _fill(self, kb, hot):
+        added = 0
+        # Least frequent first, so the most frequent end up most recently used
+        for symptoms, method, k in reversed(hot):
+            key = (kb.version, method, k, symptoms)
+            if key not in self._entries:
+                self._put(key, compute(kb.scoring_engine, symptoms, method, k))
+                added += 1
+        return added
+
+    def invalidate(self, kb):
+        """Drops entries from other versions and re-warms the hot sets for kb
+        (subscribed to knowledge reloads)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] != kb.version]:
+                del self._entries[key]
+        self._fill(kb, self._hot)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+def read_log(path, fmt=None):
+    """Symptom lists from a CSV/JSONL intake log (same formats as batch.py)"""
+    fmt = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+    with open(path, encoding="utf-8") as f:
+        return [symptoms for _, symptoms in read_records(f, fmt)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay an intake log through the diagnosis cache")
+    parser.add_argument("log", help="CSV or JSONL intake log (see batch.py)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--maxsize", type=int, default=4096)
+    parser.add_argument("--warm", action="store_true", help="pre-warm from the same log first")
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        import knowledge
+        kb = knowledge.store.current
+    sets = [normalize(s) for s in read_log(args.log, args.format)]
+
+    start = time.perf_counter()
+    for symptoms in sets:
+        compute(kb.scoring_engine, symptoms)
+    uncached = time.perf_counter() - start
+
+    cache = DiagnosisCache(args.maxsize)
+    if args.warm:
+        cache.warm(kb, sets)
+    start = time.perf_counter()
+    for symptoms in sets:
+        cache.get(kb, symptoms)
+    cached = time.perf_counter() - start
+
+    print(f"{len(sets)} diagnoses: uncached {uncached * 1000:.1f} ms, cached {cached * 1000:.1f} ms")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,156 +5,228 @@ Uses pattern matching and knowledge base for responses
 
 import random
 import re
-import difflib
-from knowledge import symptom_to_diseases, disease_to_symptoms, disease_info, disease_treatments
+import knowledge
+import metrics
+import related
+import router
+import triage
+from matcher import SymptomMatcher
+from names import NameIndex
+
+# Mapping slang terms to the official dataset symptom names
+SYNONYMS = {
+    "belly ache": "pain abdominal", "stomach ache": "pain abdominal", "stomach pain": "pain abdominal",
+    "head hurts": "headache", "puking": "vomiting", "throw up": "vomiting", 
+    "high temp": "fever", "hot": "fever", "shaking": "tremor", "cant sleep": "sleeplessness",
+    "hard to breathe": "shortness of breath", "cant breathe": "shortness of breath",
+    "runny nose": "snuffle", "stuffy nose": "snuffle"
+}
+
+# Mapping common disease names to official dataset names
+DISEASE_ALIASES = {
+    "flu": "Influenza",
+    "cold": "Common Cold",
+    "piles": "Dimorphic hemmorhoids(piles)",
+    "heart attack": "Heart attack",
+}
+
+# Intent -> method for follow-ups on a diagnosis, in priority order
+CONTEXT_HANDLERS = [
+    ("severity", "get_severity_advice"),
+    ("treatment", "get_treatment_advice"),
+    ("action", "get_action_advice"),
+    ("related", "get_related_conditions"),
+    ("explain", "explain_diagnosis"),
+]
+
+SOCIAL_REPLIES = [
+    ("hello", "Hello! I'm your medical assistant. How can I help?"),
+    ("bye", "Take care! Consult a doctor for serious concerns."),
+    ("thanks", "You're welcome! Stay healthy."),
+]
+
+def build_matcher(kb):
+    """Slang + symptom scanner, built once per knowledge version and shared"""
+    if getattr(kb, "database", None) is not None:
+        return kb.database.matcher(SYNONYMS)
+    return SymptomMatcher(kb.symptom_to_diseases, SYNONYMS)
+
+def build_name_index(kb):
+    """Disease-name resolver over every known disease, plus the common aliases"""
+    if getattr(kb, "database", None) is not None:
+        return kb.database.name_index(DISEASE_ALIASES)
+    return NameIndex(list(kb.disease_info) + list(kb.disease_to_symptoms), DISEASE_ALIASES)
 
 class MedicalChatbot:
-    def __init__(self):
+    def __init__(self, context=None):
         # Memory to store the current thread of conversation
         # 'last_disease': The specific disease currently being discussed
         # 'mentioned_symptoms': List of symptoms user has typed in chat
-        self.context = {"mentioned_symptoms": [], "last_disease": None, "last_diagnosis": None, "severity": None}
+        # 'denied_symptoms' / 'pending_question': answers to, and the symptom of, the bot's questions
+        # (pass an existing context to resume a stored conversation)
+        self.context = context if context is not None else {"mentioned_symptoms": [], "last_disease": None, "last_diagnosis": None, "severity": None,
+                                                            "denied_symptoms": [], "pending_question": None}
         
         # Mapping slang terms to the official dataset symptom names
-        self.synonyms = {
-            "belly ache": "pain abdominal", "stomach ache": "pain abdominal", "stomach pain": "pain abdominal",
-            "head hurts": "headache", "puking": "vomiting", "throw up": "vomiting", 
-            "high temp": "fever", "hot": "fever", "shaking": "tremor", "cant sleep": "sleeplessness",
-            "hard to breathe": "shortness of breath", "cant breathe": "shortness of breath",
-            "runny nose": "snuffle", "stuffy nose": "snuffle"
-        }
+        self.synonyms = SYNONYMS
+
+        # Knowledge version used for the current turn (refreshed on each message)
+        self.kb = knowledge.store.current
 
         # Mapping common disease names to official dataset names
-        self.disease_aliases = {
-            "flu": "Influenza",
-            "cold": "Common Cold",
-            "piles": "Dimorphic hemmorhoids(piles)",
-            "heart attack": "Heart attack",
-        }
+        self.disease_aliases = DISEASE_ALIASES
+
+        # Intent that handled the latest message (see replay.py)
+        self.last_intent = None
 
     def get_response(self, text):
         """Main routing function: Decides which logic to use based on user input"""
+        with metrics.request("chat.get_response"):
+            return self._respond(text)
+
+    def _respond(self, text):
+        # Pick up a reloaded knowledge base; the whole turn uses this one version
+        self.kb = knowledge.store.current
+        self.last_intent = None
         text = text.lower().strip()
 
+        # Every intent keyword in one scan (see router.py)
+        with metrics.stage("chat.route"):
+            found = router.classify(text)
+
+        # A question from the last turn is only answered by this message
+        pending, self.context["pending_question"] = self.context.get("pending_question"), None
+
         # 1. Direct Disease Info (Priority)
         # Allows user to ask "What is Malaria?" at any time, overriding context.
-        match = re.search(r"(?:what is|tell me about|info(?:rmation)? (?:on|about)) (.+)", text)
-        if match:
-            q = match.group(1).strip()
+        if "info" in found:
+            q = router.info_query(text, found)
             # Ensure they aren't referring to 'it' (the current context disease)
             curr = (self.context.get("last_disease") or "").lower()
             if q not in ["it", "this", "the condition"] and q != curr:
+                self._handled("info")
                 return self.get_disease_info(q)
 
-        # 2. Context-Aware Commands
+        # 2. Answer to the bot's last question (see triage.py)
+        if pending and ("yes" in found or "no" in found):
+            self._handled("answer")
+            return self.answer_question(pending, text, found)
+
+        # 3. Context-Aware Commands
         # Only runs if we have a diagnosis from the main app or previous chat analysis
         if self.context["last_diagnosis"]:
-            patterns = [
-                # Regex for Severity questions -> calls get_severity_advice
-                (r"serious|severe|bad|dangerous|worry", self.get_severity_advice),
-                # Regex for Treatment questions -> calls get_treatment_advice
-                (r"treat|cure|remedy|medicine", self.get_treatment_advice),
-                # Regex for Action questions -> calls get_action_advice
-                (r"what (?:should|do) i do|next steps|help", self.get_action_advice),
-                # Regex for Explanation questions -> calls explain_diagnosis
-                (r"what is|explain|more info", self.explain_diagnosis)
-            ]
-            for p, func in patterns:
-                # 'p' is the regex string (e.g., "treat|cure")
-                # 'func' is the actual function object (e.g., self.get_treatment_advice)
-                
-                # re.search checks if the pattern 'p' exists anywhere in 'text'
-                if re.search(p, text): 
-                    # If match found, execute the stored function immediately and return its result
-                    return func()
-
-        # 3. General Conversation (Social)
-        if re.search(r"hi|hello|hey", text): return "Hello! I'm your medical assistant. How can I help?"
-        if re.search(r"bye|quit", text): return "Take care! Consult a doctor for serious concerns."
-        if re.search(r"thank", text): return "You're welcome! Stay healthy."
+            for intent, handler in CONTEXT_HANDLERS:
+                if intent in found:
+                    self._handled(intent)
+                    return getattr(self, handler)()
+
+        # 4. General Conversation (Social)
+        for intent, reply in SOCIAL_REPLIES:
+            if intent in found:
+                self._handled(intent)
+                return reply
         
-        # 4. Analyze Symptoms from text
+        # 5. Analyze Symptoms from text
         # If no other command matched, check if the user is describing symptoms
         symptoms = self.extract_symptoms(text)
-        if symptoms: return self.analyze_symptoms(symptoms)
+        if symptoms:
+            self._handled("symptoms")
+            return self.analyze_symptoms(symptoms)
 
+        self._handled("fallback")
         return "I can help explain results, suggest treatments, or analyze symptoms. Try 'I have a headache' or 'What is Flu?'"
 
+    def _handled(self, intent):
+        self.last_intent = intent
+        metrics.count(f"chat.intent.{intent}")
+
+    @property
+    def matcher(self):
+        """Shared scanner for the knowledge version in use"""
+        return self.kb.derived("symptom_matcher", build_matcher)
+
+    @property
+    def name_index(self):
+        """Shared disease-name resolver for the knowledge version in use"""
+        return self.kb.derived("name_index", build_name_index)
+
+    @metrics.timed("chat.extract_symptoms")
     def extract_symptoms(self, text):
         """Finds symptom keywords in text, using synonyms and fuzzy matching"""
-        found = set()
         # Replace slang with official terms first
-        for slang, medical in self.synonyms.items(): 
-            text = text.replace(slang, medical)
-        
-        # Scan for every known symptom
-        for s in symptom_to_diseases:
-            readable = s.replace("_", " ")
-            # Check exact match
-            if readable in text or s in text: 
-                found.add(s)
-            # Check fuzzy match (handle typos like 'hedache')
-            for word in text.split():
-                if difflib.get_close_matches(word, [readable], n=1, cutoff=0.85):
-                    found.add(s)
+        with metrics.stage("chat.slang"):
+            text = self.matcher.replace_slang(text)
+
+        # Exact matches for every known symptom in one pass
+        with metrics.stage("chat.exact_scan"):
+            found = self.matcher.scan(text)
+
+        # Check fuzzy match (handle typos like 'hedache' or 'pian abdominal')
+        with metrics.stage("chat.fuzzy_scan"):
+            found |= self.kb.symptom_index.search(text)
         
-        # Update memory with found symptoms            
+        # Update memory with found symptoms (sorted: replies must not depend on set order)
         if found: 
-            self.context["mentioned_symptoms"] = list(set(self.context["mentioned_symptoms"]) | found)
-        return list(found)
+            self.context["mentioned_symptoms"] = sorted(set(self.context["mentioned_symptoms"]) | found)
+        return sorted(found)
 
+    @metrics.timed("chat.analyze_symptoms")
     def analyze_symptoms(self, symptoms):
         """Mini-diagnosis engine for chat-based extraction"""
-        matches = {}
-        # Count "votes" for each disease based on symptoms
-        for s in symptoms:
-            for d in symptom_to_diseases.get(s, []): 
-                matches[d] = matches.get(d, 0) + 1
-        
-        if not matches: return "I couldn't identify a condition. Please describe more symptoms."
-
         # Calculate scores: (matched_symptoms / total_symptoms_for_disease) * 100
-        scores = {d: round((c / len(disease_to_symptoms[d])) * 100, 1) for d, c in matches.items() if disease_to_symptoms.get(d)}
-        top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:3]
+        with metrics.stage("chat.score"):
+            top = knowledge.store.diagnoses.get(self.kb, symptoms, "coverage", 3)
+        
+        if not top: return "I couldn't identify a condition. Please describe more symptoms."
         
         # Update context so follow-up questions work
         self.context["last_disease"] = top[0][0]
         self.context["last_diagnosis"] = top 
+
+        question = self.next_question([d for d, _ in top])
         
-        res = f"Based on {', '.join([s.replace('_',' ') for s in symptoms])}:\n\n"
-        for d, sc in top: 
-            res += f"• {d} ({sc}%)\n  {disease_info.get(d, '')[:150]}...\n\n"
-        return res + "⚠️ Consult a healthcare professional."
+        with metrics.stage("chat.format"):
+            res = f"Based on {', '.join([self.kb.label(s) for s in symptoms])}:\n\n"
+            for d, sc in top: 
+                res += f"• {d} ({sc}%)\n  {self.kb.disease_info.get(d, '')[:150]}...\n\n"
+            res += "⚠️ Consult a healthcare professional."
+            if question:
+                res += f"\n\n❓ To narrow it down: do you also have {self.kb.label(question[0])}? (yes/no)"
+            return res
+
+    @metrics.timed("chat.next_question")
+    def next_question(self, among=()):
+        """Picks the symptom that best splits the remaining candidates and remembers it as asked"""
+        best = triage.index(self.kb).ask(self.context["mentioned_symptoms"],
+                                         self.context.get("denied_symptoms", []), among)
+        self.context["pending_question"] = best[0] if best else None
+        return best
+
+    def answer_question(self, symptom, text, found):
+        """Records a yes/no answer about symptom, then re-analyzes everything mentioned so far"""
+        # Whichever answer comes first
+        if found.get("yes", len(text) + 1) < found.get("no", len(text) + 1):
+            self.context["mentioned_symptoms"] = sorted(set(self.context["mentioned_symptoms"]) | {symptom})
+        else:
+            self.context["denied_symptoms"] = self.context.get("denied_symptoms", []) + [symptom]
+        # Symptoms named alongside the answer count too ("yes, and a headache")
+        self.extract_symptoms(text)
+        return self.analyze_symptoms(self.context["mentioned_symptoms"])
 
+    @metrics.timed("chat.get_disease_info")
     def get_disease_info(self, query):
         """Lookup specific disease description in database"""
-        # 1. Check aliases first
-        clean_query = query.lower().strip()
-        target_disease = self.disease_aliases.get(clean_query)
-        
-        if target_disease:
-             # If alias matched, verify we have info for it
-             if target_disease in disease_info:
-                 return self._format_disease_response(target_disease)
-
-        # 2. Search in database with stricter matching
-        for d in disease_info.keys():
-            # Check for exact case-insensitive match
-            if d.lower() == clean_query:
-                return self._format_disease_response(d)
-            
-            # Check for word boundary match (so "flu" matches "Bird Flu" but NOT "Reflux")
-            # re.escape(clean_query) ensures special regex chars in query don't break things
-            pattern = r'\b' + re.escape(clean_query) + r'\b'
-            if re.search(pattern, d.lower()):
-                 return self._format_disease_response(d)
+        # Aliases, exact names, whole words, then prefixes and typos (see names.py)
+        name = self.name_index.best(query)
+        if name:
+            return self._format_disease_response(name)
 
         return f"I don't have information on '{query}'."
 
     def _format_disease_response(self, disease_name):
         """Helper to format the output string"""
-        desc = disease_info.get(disease_name, "No description available.")
-        symptoms = ", ".join([x.replace("_", " ") for x in disease_to_symptoms.get(disease_name, [])[:5]])
+        desc = self.kb.disease_info.get(disease_name, "No description available.")
+        symptoms = ", ".join(self.kb.symptom_labels(disease_name)[:5])
         return f"**{disease_name}**\n{desc}\n\nCommon Symptoms: {symptoms}..."
 
     def set_diagnosis_context(self, diseases, symptoms, severity):
@@ -163,7 +235,8 @@ class MedicalChatbot:
 
     def get_severity_advice(self):
         """Returns advice string based on severity level"""
-        sev, d = self.context.get("severity", ""), self.context.get("last_disease", "this condition")
+        # Chat-only diagnoses have no severity yet (None)
+        sev, d = self.context.get("severity") or "", self.context.get("last_disease") or "this condition"
         if "Severe" in sev: return f"⚠️ URGE: Seek medical attention for {d} immediately."
         if "Moderate" in sev: return f"Caution: {d} may require a doctor. Monitor closely."
         return f"{d} appears mild. Rest and hydration recommended."
@@ -171,15 +244,30 @@ class MedicalChatbot:
     def get_treatment_advice(self):
         """Returns treatment steps from usage of disease_precaution.csv"""
         d = self.context.get("last_disease")
-        treats = disease_treatments.get(d, {}).get("precautions", ["Rest", "Hydrate", "Consult doctor"])
+        treatment = self.kb.disease_treatments.get(d)
+        treats = treatment.precautions if treatment else ["Rest", "Hydrate", "Consult doctor"]
         return f"💊 Treatment for {d}:\n" + "\n".join([f"• {t}" for t in treats])
 
     def get_action_advice(self):
         """Wrapper to provide general action advice"""
         return f"For {self.context.get('last_disease')}: \n" + self.get_treatment_advice()
 
+    @metrics.timed("chat.get_related_conditions")
+    def get_related_conditions(self):
+        """Conditions whose symptom sets overlap most with the current one (see related.py)"""
+        d = self.context.get("last_disease")
+        found = related.index(self.kb).related(d)
+        if not found:
+            return f"I don't know of conditions commonly confused with {d}."
+        mine = set(self.kb.disease_to_symptoms.get(d, ()))
+        lines = []
+        for other, jaccard in found:
+            shared = [self.kb.label(s) for s in self.kb.disease_to_symptoms.get(other, ()) if s in mine]
+            lines.append(f"• {other} ({jaccard:.0%} symptom overlap: {', '.join(shared[:3])})")
+        return f"🔎 Conditions often confused with {d}:\n" + "\n".join(lines)
+
     def explain_diagnosis(self):
         """Explains why a specific diagnosis was given"""
         d = self.context.get("last_disease")
         score = self.context["last_diagnosis"][0][1]
-        return f"Diagnosis: {d} ({score}% match)\n{disease_info.get(d, 'No details.')}\n\nSymptoms: {', '.join([x.replace('_',' ') for x in disease_to_symptoms.get(d, [])])}"
+        return f"Diagnosis: {d} ({score}% match)\n{self.kb.disease_info.get(d, 'No details.')}\n\nSymptoms: {', '.join(self.kb.symptom_labels(d))}"
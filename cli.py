@@ -0,0 +1,94 @@
+"""
+Terminal front end for the symptom checker (no GUI needed)
+
+Usage:
+    python cli.py                                  # interactive chat
+    python cli.py "I have a fever and a cough"     # one reply
+    python cli.py --diagnose fever cough headache  # ranking as the Analyze button shows it
+
+Chat commands:
+    /diagnose fever, cough   rank symptoms and let the bot discuss the result
+    /reset                   forget the conversation
+    /quit                    exit (or Ctrl-D)
+"""
+
+import argparse
+import contextlib
+import sys
+
+import core
+
+
+def load_quietly():
+    """Loads the knowledge base with its status messages on stderr"""
+    with contextlib.redirect_stdout(sys.stderr):
+        return core.store.current
+
+
+def format_diagnosis(symptoms, top):
+    lines = [f"• {disease} ({score}%)" for disease, score in top] or ["No matching conditions."]
+    lines.append(f"⚠️ Severity Estimate: {core.severity(len(symptoms))}")
+    return "\n".join(lines)
+
+
+def diagnose_command(bot, arg):
+    symptoms = [s.strip().lower() for s in arg.split(",") if s.strip()]
+    if not symptoms:
+        return "Usage: /diagnose fever, cough"
+    top = core.diagnose(symptoms)
+    bot.set_diagnosis_context(top, symptoms, core.severity(len(symptoms)))
+    return format_diagnosis(symptoms, top)
+
+
+def repl(bot, stdin=sys.stdin):
+    interactive = stdin.isatty()
+    if interactive:
+        try:
+            import readline  # noqa: F401  (line editing and history for input())
+        except ImportError:
+            pass
+        print("Hi! Describe your symptoms or ask about a condition. /quit to exit.")
+
+    while True:
+        try:
+            line = input("you> " if interactive else "")
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            print()
+            break
+        line = line.strip()
+        if not line:
+            continue
+        command, _, arg = line.partition(" ")
+        if command == "/quit":
+            break
+        if command == "/reset":
+            bot = core.MedicalChatbot()
+            reply = "Conversation cleared."
+        elif command == "/diagnose":
+            reply = diagnose_command(bot, arg)
+        else:
+            reply = bot.get_response(line)
+        print(f"bot> {reply}\n" if interactive else reply)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Symptom Checker in the terminal")
+    parser.add_argument("message", nargs="*", help="reply to one message and exit")
+    parser.add_argument("--diagnose", nargs="+", metavar="SYMPTOM", help="rank these symptoms and exit")
+    parser.add_argument("-k", type=int, default=3, help="results for --diagnose")
+    args = parser.parse_args(argv)
+
+    load_quietly()
+    if args.diagnose:
+        symptoms = [s.strip().lower() for s in args.diagnose]
+        print(format_diagnosis(symptoms, core.diagnose(symptoms, args.k)))
+    elif args.message:
+        print(core.MedicalChatbot().get_response(" ".join(args.message)))
+    else:
+        repl(core.MedicalChatbot())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+GUI-free core of the symptom checker
+Everything the Tk app computes (diagnosis, severity, live ranking, chat)
+without tkinter or matplotlib, for scripts, servers and the terminal CLI.
+Importing this module reads no files; the knowledge base loads on first use.
+"""
+
+import related
+import triage
+from chatbot import MedicalChatbot
+from knowledge import store
+from scoring import LiveRanking
+
+# Illustrative recovery curve shown by the GUI's graph button
+RECOVERY_DAYS = [1, 2, 3, 4, 5, 6, 7]
+RECOVERY_PERCENT = [20, 35, 50, 65, 75, 85, 95]
+
+
+def all_symptoms():
+    """Every known symptom, sorted"""
+    return sorted(store.current.symptom_to_diseases)
+
+
+def diagnose(symptoms, k=3):
+    """Top k (disease, certainty) with the confidence floor, as the Analyze button shows"""
+    return store.diagnoses.get(store.current, symptoms, "diagnose", k)
+
+
+def severity(count):
+    """Severity estimate from the number of selected symptoms"""
+    if count <= 2:
+        return "Mild — Home care recommended."
+    elif count <= 4:
+        return "Moderate — Consider seeing a doctor."
+    else:
+        return "Severe — Seek medical attention."
+
+
+def describe(disease):
+    return store.current.disease_info.get(disease, "No description available.")
+
+
+def related_conditions(disease, k=3):
+    """Up to k (disease, jaccard) most often confused with disease (see related.py)"""
+    return related.index(store.current).related(disease, k)
+
+
+def next_question(symptoms, among=(), denied=()):
+    """(symptom, gain in bits) that best tells the remaining candidates apart, or None (see triage.py)"""
+    return triage.index(store.current).ask(symptoms, denied, among)
+
+
+def live_ranking(symptoms=()):
+    """Incremental ranker over the current knowledge version (see scoring.LiveRanking)"""
+    return LiveRanking(store.current.scoring_engine, symptoms)
+
@@ -0,0 +1,674 @@
+"""
+SQLite-backed knowledge base for vocabularies too large to keep in dicts
+The three CSVs are streamed into an indexed SQLite file once; afterwards a
+process keeps only the connection, a few small caches and the slang table in
+memory. Lookups go through the same mappings and indexes the in-memory
+knowledge base offers (disease_to_symptoms, scoring_engine, symptom_index,
+the chatbot's matcher and name resolver), so chatbot.py and apps.py work
+unchanged.
+
+Usage:
+    SYMPTOM_CHECKER_DB=knowledge.db python cli.py    # knowledge.store uses (and builds) the database
+    python database.py build knowledge.db            # ingest the CSVs if they changed
+    python database.py search knowledge.db "mosquito bite"   # full-text search of descriptions
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from itertools import islice
+
+from fuzzy import FuzzyIndex, deletes, edit_distance
+from graph import Treatment
+from matcher import Automaton
+from names import MIN_PREFIX, TOKEN, NameIndex
+from scoring import ScoringEngine, certainty_score
+
+SCHEMA_VERSION = 1
+
+# Postings lists held in memory at once (most recently used)
+HOT_POSTINGS = 2048
+
+# Rows per executemany() batch while ingesting
+BATCH = 5000
+
+# Host parameters per IN (...) query, below SQLite's limit on older builds
+MAX_PARAMS = 900
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+
+-- Diseases in dataset.csv order; id is the scoring engine's disease ID
+CREATE TABLE diseases (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, size INTEGER NOT NULL DEFAULT 0);
+
+-- postings: int32 (disease ID, disease size) pairs in disease ID order
+-- pos: first-seen order walking the diseases (as knowledge.reverse_mapping)
+CREATE TABLE symptoms (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, phrase TEXT NOT NULL,
+                       pos INTEGER, postings BLOB);
+CREATE INDEX symptoms_phrase ON symptoms (phrase);
+
+-- rowid keeps each disease's symptoms in file order
+CREATE TABLE edges (disease_id INTEGER NOT NULL, symptom_id INTEGER NOT NULL, UNIQUE (disease_id, symptom_id));
+CREATE INDEX edges_symptom ON edges (symptom_id, disease_id);
+
+CREATE TABLE descriptions (id INTEGER PRIMARY KEY, disease TEXT NOT NULL UNIQUE, description TEXT NOT NULL);
+CREATE VIRTUAL TABLE descriptions_fts USING fts5 (disease, description, content='descriptions', content_rowid='id');
+
+CREATE TABLE treatments (id INTEGER PRIMARY KEY, disease TEXT NOT NULL UNIQUE);
+CREATE TABLE precautions (treatment_id INTEGER NOT NULL, pos INTEGER NOT NULL, text TEXT NOT NULL,
+                          PRIMARY KEY (treatment_id, pos)) WITHOUT ROWID;
+
+-- Disease-name resolver: descriptions first, then diseases (as chatbot.build_name_index)
+CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, lower TEXT NOT NULL, tokens INTEGER NOT NULL);
+CREATE INDEX names_lower ON names (lower);
+CREATE VIRTUAL TABLE names_fts USING fts5 (lower, content='names', content_rowid='id');
+
+-- Typo index (see fuzzy.py): kind 0 = symptom phrases, kind 1 = disease names
+CREATE TABLE deletes (kind INTEGER NOT NULL, key TEXT NOT NULL, phrase TEXT NOT NULL,
+                      PRIMARY KEY (kind, key, phrase)) WITHOUT ROWID;
+"""
+
+
+def _chunks(items, size=MAX_PARAMS):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _marks(n):
+    return ",".join("?" * n)
+
+
+# ----------------------------------------------------------
+# INGEST (streaming)
+# ----------------------------------------------------------
+
+def _ingest_symptoms(db, path):
+    diseases, symptoms = {}, {}
+
+    def rows():
+        with open(path, mode="r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                # Same normalisation as knowledge.read_symptoms
+                disease = row["Source"].strip().title()
+                symptom = row["Target"].strip().lower()
+                if disease and symptom:
+                    did = diseases.get(disease)
+                    if did is None:
+                        did = diseases[disease] = len(diseases)
+                        db.execute("INSERT INTO diseases (id, name) VALUES (?, ?)", (did, disease))
+                    sid = symptoms.get(symptom)
+                    if sid is None:
+                        sid = symptoms[symptom] = len(symptoms)
+                        db.execute("INSERT INTO symptoms (id, name, phrase) VALUES (?, ?, ?)",
+                                   (sid, symptom, symptom.replace("_", " ")))
+                    yield did, sid
+
+    for chunk in _chunks(rows(), BATCH):
+        db.executemany("INSERT OR IGNORE INTO edges (disease_id, symptom_id) VALUES (?, ?)", chunk)
+
+    db.execute("UPDATE diseases SET size = (SELECT COUNT(*) FROM edges WHERE disease_id = diseases.id)")
+    db.execute("UPDATE symptoms SET pos = (SELECT MIN(disease_id * 4294967296 + rowid) FROM edges "
+               "WHERE symptom_id = symptoms.id)")
+    db.execute("CREATE UNIQUE INDEX symptoms_pos ON symptoms (pos)")
+
+    # Pack each symptom's postings into one blob, streaming in symptom order
+    current, pairs = None, array("i")
+    cur = db.execute("SELECT e.symptom_id, e.disease_id, d.size FROM edges e JOIN diseases d ON d.id = e.disease_id "
+                     "ORDER BY e.symptom_id, e.disease_id")
+    updates = []
+    for sid, did, size in cur:
+        if sid != current:
+            if current is not None:
+                updates.append((pairs.tobytes(), current))
+            current, pairs = sid, array("i")
+        pairs.extend((did, size))
+    if current is not None:
+        updates.append((pairs.tobytes(), current))
+    for chunk in _chunks(updates, BATCH):
+        db.executemany("UPDATE symptoms SET postings = ? WHERE id = ?", chunk)
+
+
+def _ingest_descriptions(db, path):
+    with open(path, mode="r", encoding="utf-8") as f:
+        rows = ((row["Disease"].strip().title(), row["Description"].strip())
+                for row in csv.DictReader(f) if "Disease" in row and "Description" in row)
+        for chunk in _chunks(rows, BATCH):
+            # A repeated disease keeps its first position and its last description
+            db.executemany("INSERT INTO descriptions (disease, description) VALUES (?, ?) "
+                           "ON CONFLICT (disease) DO UPDATE SET description = excluded.description", chunk)
+    db.execute("INSERT INTO descriptions_fts (descriptions_fts) VALUES ('rebuild')")
+
+
+def _ingest_treatments(db, path):
+    with open(path, mode="r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if "Disease" not in row:
+                continue
+            disease = row["Disease"].strip().title()
+            precautions = [row[c].strip().capitalize() for c in (f"Precaution_{i}" for i in range(1, 5))
+                           if row.get(c) and row[c].strip()]
+            if precautions:
+                db.execute("INSERT OR IGNORE INTO treatments (disease) VALUES (?)", (disease,))
+                (tid,) = db.execute("SELECT id FROM treatments WHERE disease = ?", (disease,)).fetchone()
+                db.execute("DELETE FROM precautions WHERE treatment_id = ?", (tid,))
+                db.executemany("INSERT INTO precautions VALUES (?, ?, ?)",
+                               [(tid, i, p) for i, p in enumerate(precautions)])
+
+
+def _index_names(db):
+    db.execute("INSERT OR IGNORE INTO names (name, lower, tokens) "
+               "SELECT disease, '', 0 FROM descriptions ORDER BY id")
+    db.execute("INSERT OR IGNORE INTO names (name, lower, tokens) SELECT name, '', 0 FROM diseases ORDER BY id")
+    rows = db.execute("SELECT id, name FROM names").fetchall()
+    db.executemany("UPDATE names SET lower = ?, tokens = ? WHERE id = ?",
+                   [(name.lower(), len(TOKEN.findall(name.lower())), nid) for nid, name in rows])
+    db.execute("INSERT INTO names_fts (names_fts) VALUES ('rebuild')")
+
+
+def _index_deletes(db, kind, phrases, max_distance=2, prefix_length=7):
+    rows = ((kind, d, p) for p in phrases for d in deletes(p[:prefix_length], max_distance))
+    for chunk in _chunks(rows, BATCH):
+        db.executemany("INSERT OR IGNORE INTO deletes VALUES (?, ?, ?)", chunk)
+
+
+def build(path, csv_file, desc_file, prec_file):
+    """Ingests the three CSVs into a new SQLite file at path (atomically replaced)"""
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(SCHEMA)
+        with db:
+            _ingest_symptoms(db, csv_file)
+            _ingest_descriptions(db, desc_file)
+            _ingest_treatments(db, prec_file)
+            _index_names(db)
+            phrases = (p for (p,) in db.execute("SELECT DISTINCT phrase FROM symptoms"))
+            _index_deletes(db, 0, list(phrases))
+            lowers = (n.replace("_", " ") for (n,) in db.execute("SELECT DISTINCT lower FROM names"))
+            _index_deletes(db, 1, list(lowers))
+            max_words = max((len(p.split()) for (p,) in db.execute("SELECT phrase FROM symptoms")), default=1)
+            lengths = db.execute("SELECT MIN(LENGTH(name)), MAX(LENGTH(name)) FROM symptoms").fetchone()
+            db.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("schema", SCHEMA_VERSION), ("max_words", max_words),
+                ("min_length", lengths[0] or 1), ("max_length", lengths[1] or 0)])
+        db.execute("ANALYZE")
+    finally:
+        db.close()
+    os.replace(tmp, path)
+
+
+# ----------------------------------------------------------
+# READ SIDE
+# ----------------------------------------------------------
+
+class Database:
+    """Read-only connection shared by every view; queries are serialized"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.meta = dict(self.query("SELECT key, value FROM meta"))
+        if self.meta.get("schema") != SCHEMA_VERSION:
+            raise ValueError(f"{path}: unsupported schema {self.meta.get('schema')}")
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def one(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def count(self, table):
+        return self.one(f"SELECT COUNT(*) FROM {table}")[0]
+
+    def pages(self, sql, size=1000):
+        """Rows of `sql` (which must select id first and take an id > ? bound), page by page"""
+        last = -1
+        while True:
+            rows = self.query(sql + " LIMIT ?", (last, size))
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def search_descriptions(self, text, limit=5):
+        """Diseases whose name or description best match text (full-text, BM25 ranked)"""
+        terms = " ".join(f'"{t}"' for t in TOKEN.findall(text.lower()))
+        if not terms:
+            return []
+        return [d for (d,) in self.query(
+            "SELECT disease FROM descriptions_fts WHERE descriptions_fts MATCH ? ORDER BY rank LIMIT ?",
+            (terms, limit))]
+
+    def graph(self):
+        """KnowledgeGraph.from_rows over the edges table, for whole-graph indexes
+        (triage, related): int32 IDs and CSR rows in memory, names left here.
+        Symptoms are numbered by pos, as the in-memory graph numbers them"""
+        from graph import KnowledgeGraph
+
+        order = array("i", (sid for _, sid in self.pages("SELECT pos, id FROM symptoms WHERE pos > ? ORDER BY pos")))
+        rank = array("i", bytes(4 * len(order)))
+        for r, sid in enumerate(order):
+            rank[sid] = r
+        indptr = array("i", [0])
+        for _, size in self.pages("SELECT id, size FROM diseases WHERE id > ? ORDER BY id"):
+            indptr.append(indptr[-1] + size)
+        indices = array("i")
+        for start in range(0, len(indptr) - 1, BATCH):
+            indices.extend(rank[sid] for (sid,) in self.query(
+                "SELECT symptom_id FROM edges WHERE disease_id >= ? AND disease_id < ? ORDER BY disease_id, rowid",
+                (start, start + BATCH)))
+        diseases, symptoms = _Lookup(self, "diseases"), _Lookup(self, "symptoms", order, rank)
+        return KnowledgeGraph.from_rows(diseases, diseases, symptoms, symptoms, indptr, indices)
+
+    # Backend hooks used by chatbot.build_matcher / build_name_index
+    def matcher(self, synonyms):
+        return SQLiteMatcher(self, synonyms)
+
+    def name_index(self, aliases=None):
+        return SQLiteNameIndex(self, aliases)
+
+
+class _Table(Mapping):
+    order = "id"
+
+    def __init__(self, db):
+        self.db = db
+
+    def __len__(self):
+        return self.db.count(self.table)
+
+    def __iter__(self):
+        sql = f"SELECT {self.order}, {self.key} FROM {self.table} WHERE {self.order} > ? ORDER BY {self.order}"
+        return (row[1] for row in self.db.pages(sql))
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._id(key) is not None
+
+    def __getitem__(self, key):
+        rid = self._id(key) if isinstance(key, str) else None
+        if rid is None:
+            raise KeyError(key)
+        return self._value(rid)
+
+    def _id(self, key):
+        row = self.db.one(f"SELECT id FROM {self.table} WHERE {self.key} = ?", (key,))
+        return row[0] if row else None
+
+
+class DiseaseSymptoms(_Table):
+    table, key = "diseases", "name"
+
+    def _value(self, did):
+        return [s for (s,) in self.db.query(
+            "SELECT s.name FROM edges e JOIN symptoms s ON s.id = e.symptom_id WHERE e.disease_id = ? "
+            "ORDER BY e.rowid", (did,))]
+
+
+class SymptomDiseases(_Table):
+    table, key, order = "symptoms", "name", "pos"
+
+    def _value(self, sid):
+        return [d for (d,) in self.db.query(
+            "SELECT d.name FROM edges e JOIN diseases d ON d.id = e.disease_id WHERE e.symptom_id = ? "
+            "ORDER BY e.disease_id", (sid,))]
+
+
+class DiseaseInfo(_Table):
+    table, key = "descriptions", "disease"
+
+    def _value(self, rid):
+        return self.db.one("SELECT description FROM descriptions WHERE id = ?", (rid,))[0]
+
+    def search(self, text, limit=5):
+        return self.db.search_descriptions(text, limit)
+
+
+class DiseaseTreatments(_Table):
+    table, key = "treatments", "disease"
+
+    def _value(self, tid):
+        return Treatment([p for (p,) in self.db.query(
+            "SELECT text FROM precautions WHERE treatment_id = ? ORDER BY pos", (tid,))])
+
+
+class _Cached:
+    """key -> value through a bounded LRU in front of a loader; thread-safe
+    (one engine serves the GUI's runner, service executors and replay workers)"""
+
+    def __init__(self, load, maxsize):
+        self.load = load
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        # Loaded outside the lock; two threads missing together both load, one entry is kept
+        value = self.load(key)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+
+class _Column:
+    """Sequence-style access to one column by integer ID, e.g. disease sizes"""
+
+    def __init__(self, db, sql):
+        self.db = db
+        self.sql = sql
+
+    def __getitem__(self, i):
+        row = self.db.one(self.sql, (int(i),))
+        if row is None:
+            raise IndexError(i)
+        return row[0]
+
+
+class _Lookup:
+    """ID -> name ([]) and name -> ID (.get) over one table, for KnowledgeGraph.from_rows;
+    order / rank renumber the table's IDs (new ID -> table ID and back)"""
+
+    def __init__(self, db, table, order=None, rank=None):
+        self.db = db
+        self.table = table
+        self.order, self.rank = order, rank
+        self.length = db.count(table)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        row = self.db.one(f"SELECT name FROM {self.table} WHERE id = ?",
+                          (int(i if self.order is None else self.order[i]),))
+        if row is None:
+            raise IndexError(i)
+        return row[0]
+
+    def get(self, name, default=None):
+        row = self.db.one(f"SELECT id FROM {self.table} WHERE name = ?", (name,))
+        if row is None:
+            return default
+        return row[0] if self.rank is None else self.rank[row[0]]
+
+
+class SQLiteScoringEngine(ScoringEngine):
+    """ScoringEngine whose postings live in the database behind a small LRU;
+    scores, ordering and ties are identical to the in-memory engine"""
+
+    def __init__(self, db, hot=HOT_POSTINGS):
+        self.db = db
+        self.hot = _Cached(self._load_postings, hot)
+        self.diseases = _Column(db, "SELECT name FROM diseases WHERE id = ?")
+        self.sizes = _Column(db, "SELECT size FROM diseases WHERE id = ?")
+        self.symptoms = None
+
+    def _load_postings(self, symptom):
+        row = self.db.one("SELECT postings FROM symptoms WHERE name = ?", (symptom,))
+        pairs = array("i")
+        if row and row[0]:
+            pairs.frombytes(row[0])
+        return pairs
+
+    def pairs(self, symptom):
+        """(disease ID, disease size) pairs, interleaved"""
+        return self.hot[symptom]
+
+    def postings(self, symptom):
+        return self.pairs(symptom)[0::2]
+
+    def _names(self, ids):
+        names = {}
+        for chunk in _chunks(ids):
+            names.update(self.db.query(f"SELECT id, name FROM diseases WHERE id IN ({_marks(len(chunk))})", chunk))
+        return names
+
+    def _tally(self, symptoms):
+        """(Counter of disease ID -> shared symptoms, disease ID -> size)"""
+        counts, sizes = Counter(), {}
+        for s in symptoms:
+            pairs = self.pairs(s)
+            ids = pairs[0::2]
+            counts.update(ids)
+            sizes.update(zip(ids, pairs[1::2]))
+        return counts, sizes
+
+    def _scores(self, symptoms, method):
+        """Disease ID -> score, in the same order as the in-memory engine"""
+        if method == "certainty":
+            symptoms = list(dict.fromkeys(symptoms))
+            n = len(symptoms)
+            counts, sizes = self._tally(symptoms)
+            return {d: certainty_score(c, n, sizes[d]) for d, c in counts.items()}
+        if method == "coverage":
+            counts, sizes = self._tally(symptoms)
+            return {d: round((c / sizes[d]) * 100, 1) for d, c in counts.items()}
+        raise ValueError(f"Unknown scoring method: {method}")
+
+    def _named(self, scores):
+        names = self._names([d for d, _ in scores])
+        return [(names[d], s) for d, s in scores]
+
+    def match(self, symptoms):
+        counts, _ = self._tally(symptoms)
+        return dict(self._named(counts.items()))
+
+    def certainty(self, symptoms, matches=None):
+        if matches is None:
+            return dict(self._named(self._scores(symptoms, "certainty").items()))
+
+        n = len(dict.fromkeys(symptoms))
+        if not n:
+            return {}
+        scores = {}
+        for chunk in _chunks(list(matches)):
+            sizes = dict(self.db.query(f"SELECT name, size FROM diseases WHERE name IN ({_marks(len(chunk))})", chunk))
+            for d in chunk:
+                scores[d] = certainty_score(matches[d], n, sizes[d])
+        return scores
+
+    def coverage(self, symptoms):
+        return dict(self._named(self._scores(symptoms, "coverage").items()))
+
+    def rank(self, symptoms, k=3, method="certainty"):
+        # Ranked on IDs (ties keep the same order); only the top k names are looked up
+        return self._named(self.top_k(self._scores(symptoms, method), k))
+
+
+class _Phrases:
+    """Readable phrase -> raw key, as FuzzyIndex.phrases"""
+
+    def __init__(self, db, sql):
+        self.db = db
+        self.sql = sql
+
+    def __getitem__(self, phrase):
+        row = self.db.one(self.sql, (phrase,))
+        if row is None:
+            raise KeyError(phrase)
+        return row[0]
+
+
+class SQLiteFuzzyIndex(FuzzyIndex):
+    """FuzzyIndex ("edit" mode) reading its delete dictionary from the database"""
+
+    def __init__(self, db, kind, phrases, max_words, max_distance=2, prefix_length=7):
+        self.db = db
+        self.kind = kind
+        self.mode = "edit"
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.cutoff = 0.85
+        self.phrases = phrases
+        self.max_words = max_words
+
+    def lookup(self, term):
+        limit = self.budget(term)
+        keys = list(deletes(term[:self.prefix_length], limit))
+        results = []
+        for chunk in _chunks(keys):
+            for (p,) in self.db.query(f"SELECT DISTINCT phrase FROM deletes WHERE kind = ? AND key IN "
+                                      f"({_marks(len(chunk))})", [self.kind] + chunk):
+                dist = edit_distance(term, p, limit)
+                if dist <= limit:
+                    results.append((p, dist))
+        results = list(dict.fromkeys(results))
+        results.sort(key=lambda x: (x[1], x[0]))
+        return results
+
+
+class SQLiteMatcher:
+    """SymptomMatcher with the symptom vocabulary left in the database: every
+    substring of the message that could be a symptom name is looked up"""
+
+    def __init__(self, db, synonyms):
+        self.db = db
+        self.slang = Automaton(dict(synonyms))
+        self.min_length = int(db.meta["min_length"])
+        self.max_length = int(db.meta["max_length"])
+
+    def replace_slang(self, text):
+        return self.slang.replace(text)
+
+    def scan(self, text):
+        # Names are stripped, so grams starting or ending with a space can't match
+        grams = {g for n in range(self.min_length, min(self.max_length, len(text)) + 1)
+                 for g in (text[i:i + n] for i in range(len(text) - n + 1))
+                 if not (g[0].isspace() or g[-1].isspace())}
+        if not grams:
+            return set()
+        # One query per message, however many grams (json_each instead of chunked IN lists)
+        return {s for (s,) in self.db.query(
+            "SELECT name FROM symptoms WHERE name IN (SELECT value FROM json_each(?1)) "
+            "OR phrase IN (SELECT value FROM json_each(?1))", (json.dumps(sorted(grams)),))}
+
+
+class SQLiteNameIndex(NameIndex):
+    """NameIndex with exact, token and prefix lookups answered by the database
+    (names_fts) and the typo fallback by the deletes table"""
+
+    def __init__(self, db, aliases=None, fuzzy=True):
+        self.db = db
+        self.names = _Column(db, "SELECT name FROM names WHERE id = ?")
+        self.lower = _Column(db, "SELECT lower FROM names WHERE id = ?")
+        self.token_counts = _Column(db, "SELECT tokens FROM names WHERE id = ?")
+        self.exact = _Exact(db)
+        self.aliases = {}
+        for alias, target in (aliases or {}).items():
+            i = self.exact.get(target.lower())
+            if i is not None:
+                self.aliases[alias.lower()] = i
+        phrases = _Phrases(db, "SELECT lower FROM names WHERE REPLACE(lower, '_', ' ') = ? ORDER BY id LIMIT 1")
+        self.fuzzy = SQLiteFuzzyIndex(db, 1, phrases, 1) if fuzzy else None
+
+    def _fts(self, query):
+        return [i for (i,) in self.db.query("SELECT rowid FROM names_fts WHERE names_fts MATCH ? ORDER BY rowid",
+                                            (query,))]
+
+    def _with_tokens(self, toks):
+        # FTS tokens are a superset of \w+ tokens; the caller re-checks with a regex
+        candidates = self._fts(" AND ".join(f'"{t}"' for t in set(toks)))
+        return [i for i in candidates if all(t in TOKEN.findall(self.lower[i]) for t in toks)]
+
+    def _with_prefix(self, prefix):
+        return {i for i in self._fts(f'"{prefix}"*')
+                if any(t.startswith(prefix) for t in TOKEN.findall(self.lower[i]))}
+
+
+class _Exact:
+    """Lower-cased name -> first name ID"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, lower, default=None):
+        row = self.db.one("SELECT MIN(id) FROM names WHERE lower = ?", (lower,))
+        return default if row is None or row[0] is None else row[0]
+
+    def __contains__(self, lower):
+        return self.get(lower) is not None
+
+    def __getitem__(self, lower):
+        i = self.get(lower)
+        if i is None:
+            raise KeyError(lower)
+        return i
+
+
+def attach(path, version=1):
+    """KnowledgeBase whose tables, postings and indexes are served from the SQLite file"""
+    from knowledge import KnowledgeBase
+
+    db = Database(path)
+    phrases = _Phrases(db, "SELECT name FROM symptoms WHERE phrase = ? ORDER BY id LIMIT 1")
+    kb = KnowledgeBase(DiseaseSymptoms(db), DiseaseInfo(db), DiseaseTreatments(db), version=version,
+                       symptom_to_diseases=SymptomDiseases(db),
+                       symptom_index=SQLiteFuzzyIndex(db, 0, phrases, int(db.meta["max_words"])),
+                       scoring_engine=SQLiteScoringEngine(db))
+    kb.database = db
+    return kb
+
+
+def load(path, sources, version=1):
+    """Attaches to the database at path, re-ingesting sources first if any is newer"""
+    import snapshot
+
+    if not snapshot.is_fresh(path, sources):
+        build(path, *sources)
+        print(f"Built knowledge database {path}")
+    return attach(path, version)
+
+
+def main(argv=None):
+    import knowledge
+
+    parser = argparse.ArgumentParser(description="SQLite knowledge base tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="ingest the CSVs")
+    b.add_argument("path")
+    b.add_argument("--csv", default=knowledge.csv_path)
+    b.add_argument("--descriptions", default=knowledge.desc_path)
+    b.add_argument("--precautions", default=knowledge.prec_path)
+    s = sub.add_parser("search", help="full-text search of descriptions")
+    s.add_argument("path")
+    s.add_argument("text")
+    s.add_argument("-n", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        load(args.path, [args.csv, args.descriptions, args.precautions])
+        print(f"{args.path}: {os.path.getsize(args.path) // 1024} KiB")
+    else:
+        for disease in Database(args.path).search_descriptions(args.text, args.n):
+            print(disease)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Typo-tolerant symptom lookup
+SymSpell-style delete dictionary over symptom names, so a misspelt word or
+phrase is matched without comparing it to every symptom in the vocabulary
+"""
+
+from difflib import SequenceMatcher
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein (optimal string alignment) distance, capped at limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        curr = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                curr[j] = min(curr[j], prev2[j - 2] + 1)
+        if min(curr) > limit:
+            return limit + 1
+        prev2, prev = prev, curr
+    return prev[-1]
+
+
+def deletes(term, depth):
+    """All strings reachable from term by removing up to depth characters"""
+    found = {term}
+    frontier = {term}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+class FuzzyIndex:
+    """Symptom name index with two lookup modes
+
+    mode="edit"  - edit distance up to max_distance (scaled down for short
+                   words), matched against single words and word n-grams so
+                   multi-word symptoms like "pian abdominal" are found too
+    mode="ratio" - reproduces difflib.get_close_matches(word, [symptom],
+                   cutoff=cutoff) per word, for comparing with the old scan
+    """
+
+    def __init__(self, symptoms, max_distance=2, mode="edit", cutoff=0.85, prefix_length=7):
+        if mode not in ("edit", "ratio"):
+            raise ValueError(f"Unknown fuzzy mode: {mode}")
+        self.mode = mode
+        self.max_distance = max_distance
+        self.cutoff = cutoff
+        self.prefix_length = prefix_length
+
+        # Readable phrase -> raw symptom key
+        self.phrases = {}
+        for s in symptoms:
+            self.phrases.setdefault(s.replace("_", " "), s)
+        self.max_words = max((len(p.split()) for p in self.phrases), default=1)
+
+        if mode == "edit":
+            # Deletes of each phrase prefix -> phrases sharing that delete
+            self.deletes = {}
+            for p in self.phrases:
+                for d in deletes(p[:prefix_length], max_distance):
+                    self.deletes.setdefault(d, []).append(p)
+        else:
+            # Phrases grouped by length; ratio >= cutoff bounds the length gap
+            self.by_length = {}
+            for p in self.phrases:
+                self.by_length.setdefault(len(p), []).append(p)
+
+    def patched(self, symptoms):
+        """Index over a new vocabulary, equal to FuzzyIndex(symptoms, ...) with the
+        same settings; only the deletes of added or dropped phrases are redone.
+        Lists this index still uses are copied, never changed"""
+        if self.mode != "edit":
+            return FuzzyIndex(symptoms, self.max_distance, self.mode, self.cutoff, self.prefix_length)
+        index = FuzzyIndex.__new__(FuzzyIndex)
+        index.mode, index.max_distance, index.cutoff = self.mode, self.max_distance, self.cutoff
+        index.prefix_length = self.prefix_length
+        index.phrases = {}
+        for s in symptoms:
+            index.phrases.setdefault(s.replace("_", " "), s)
+        index.max_words = max((len(p.split()) for p in index.phrases), default=1)
+
+        index.deletes = dict(self.deletes)
+        for p in self.phrases.keys() - index.phrases.keys():
+            for d in deletes(p[:self.prefix_length], self.max_distance):
+                kept = [q for q in index.deletes[d] if q != p]
+                if kept:
+                    index.deletes[d] = kept
+                else:
+                    del index.deletes[d]
+        for p in index.phrases.keys() - self.phrases.keys():
+            for d in deletes(p[:self.prefix_length], self.max_distance):
+                index.deletes[d] = index.deletes.get(d, []) + [p]
+        return index
+
+    def budget(self, term):
+        """Edits allowed for a term: none for 1-3 chars, one for 4-7, then max_distance"""
+        return min(self.max_distance, len(term) // 4)
+
+    def lookup(self, term):
+        """Returns [(phrase, score)] best first; score is a distance or a ratio"""
+        if self.mode == "ratio":
+            return self._lookup_ratio(term)
+
+        limit = self.budget(term)
+        seen = set()
+        results = []
+        for d in deletes(term[:self.prefix_length], limit):
+            for p in self.deletes.get(d, ()):
+                if p in seen:
+                    continue
+                seen.add(p)
+                dist = edit_distance(term, p, limit)
+                if dist <= limit:
+                    results.append((p, dist))
+        results.sort(key=lambda x: (x[1], x[0]))
+        return results
+
+    def _lookup_ratio(self, term):
+        n, c = len(term), self.cutoff
+        lo, hi = int(n * c / (2 - c)), int(n * (2 - c) / c) + 1
+
+        # Same checks, in the same order, as difflib.get_close_matches
+        s = SequenceMatcher()
+        s.set_seq2(term)
+        results = []
+        for length in range(lo, hi + 1):
+            for p in self.by_length.get(length, ()):
+                s.set_seq1(p)
+                if s.real_quick_ratio() >= c and s.quick_ratio() >= c and s.ratio() >= c:
+                    results.append((p, s.ratio()))
+        results.sort(key=lambda x: (-x[1], x[0]))
+        return results
+
+    def search(self, text):
+        """Returns the set of symptom keys fuzzily mentioned in text"""
+        words = text.split()
+        found = set()
+        if self.mode == "ratio":
+            grams = set(words)
+        else:
+            grams = {" ".join(words[i:i + n])
+                     for n in range(1, self.max_words + 1)
+                     for i in range(len(words) - n + 1)}
+        for gram in grams:
+            for p, _ in self.lookup(gram):
+                found.add(self.phrases[p])
+        return found
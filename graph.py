@@ -0,0 +1,322 @@
+"""
+Compact knowledge graph: diseases and symptoms interned to dense integer IDs
+Each edge is stored once per direction as an int32 in array-backed CSR
+postings instead of as Python strings in per-key lists. The
+disease_to_symptoms / symptom_to_diseases mappings and the scoring engine are
+all views of the same arrays, and readable symptom names are computed once.
+
+Usage:
+    graph = KnowledgeGraph(knowledge.read_symptoms())
+    graph.labels[graph.symptom_ids["skin_rash"]]   # "skin rash"
+
+    python graph.py                   # memory report for dataset.csv
+    python graph.py --edges 100000    # ... for a generated dataset (see bench.py)
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate
+
+from scoring import ScoringEngine
+from topk import ImpactIndex
+
+# Graphs at least this big also get impact-ordered postings for pruned top-k
+# (see topk.py); below it, scoring every candidate is already fast
+IMPACT_MIN_EDGES = 50_000
+
+
+class Treatment:
+    """Precautions for one disease (disease_precaution.csv row)"""
+
+    __slots__ = ("precautions",)
+
+    def __init__(self, precautions):
+        self.precautions = tuple(precautions)
+
+    def __eq__(self, other):
+        return isinstance(other, Treatment) and self.precautions == other.precautions
+
+    def __hash__(self):
+        return hash(self.precautions)
+
+    def __repr__(self):
+        return f"Treatment({list(self.precautions)!r})"
+
+
+class KnowledgeGraph:
+    def __init__(self, disease_to_symptoms):
+        intern = sys.intern
+        # Dense IDs in knowledge base order; symptom IDs in first-seen order
+        self.diseases = []
+        self.disease_ids = {}
+        self.symptoms = []
+        self.symptom_ids = {}
+
+        # Disease -> symptom IDs (file order, deduplicated)
+        self.indptr = array("i", [0])
+        self.indices = array("i")
+        symptom_ids, symptoms, indices = self.symptom_ids, self.symptoms, self.indices
+        for disease, names in disease_to_symptoms.items():
+            disease = intern(disease)
+            self.disease_ids[disease] = len(self.diseases)
+            self.diseases.append(disease)
+            row = {}
+            for s in names:
+                sid = symptom_ids.get(s)
+                if sid is None:
+                    s = intern(s)
+                    sid = symptom_ids[s] = len(symptoms)
+                    symptoms.append(s)
+                row[sid] = None
+            indices.extend(row)
+            self.indptr.append(len(indices))
+        self._transpose()
+
+        # Readable names ("skin_rash" -> "skin rash"); replace() returns the
+        # same object when there is nothing to replace
+        self.labels = [s.replace("_", " ") for s in symptoms]
+
+    @classmethod
+    def from_rows(cls, diseases, disease_ids, symptoms, symptom_ids, indptr, indices):
+        """Graph over ready-made ID rows, e.g. streamed from a database or a
+        shared snapshot; the name tables only need len(), [] and .get(), so
+        they can be lookups that keep the names out of memory (labels is None)"""
+        graph = cls.__new__(cls)
+        graph.diseases, graph.disease_ids = diseases, disease_ids
+        graph.symptoms, graph.symptom_ids = symptoms, symptom_ids
+        graph.indptr, graph.indices = indptr, indices
+        graph._transpose()
+        graph.labels = None
+        return graph
+
+    def _transpose(self):
+        indptr, indices, n_symptoms = self.indptr, self.indices, len(self.symptoms)
+        self.sizes = array("i", (indptr[i + 1] - indptr[i] for i in range(len(self.diseases))))
+
+        # Transpose: diseases of symptom i are post_indices[post_ptr[i]:post_ptr[i + 1]], in ID order
+        counts = array("i", bytes(4 * (n_symptoms + 1)))
+        for sid in indices:
+            counts[sid + 1] += 1
+        for i in range(n_symptoms):
+            counts[i + 1] += counts[i]
+        self.post_ptr = array("i", counts)
+        self.post_indices = array("i", bytes(4 * len(indices)))
+        fill, post = counts, self.post_indices
+        for did in range(len(self.diseases)):
+            for sid in indices[indptr[did]:indptr[did + 1]]:
+                post[fill[sid]] = did
+                fill[sid] += 1
+
+    def patched(self, disease_to_symptoms):
+        """(graph, moves) for an edited disease_to_symptoms, equal to
+        KnowledgeGraph(disease_to_symptoms) but built from this graph: unchanged
+        rows and postings are copied as array slices, only the changed rows and
+        the postings of their symptoms are redone. None when a disease was
+        removed or reordered (disease IDs would shift; rebuild instead).
+        moves is what ImpactIndex.patched needs: (old symptom ID of each new
+        one, old IDs whose postings changed); IDs past the old vocabulary are new"""
+        n_diseases, n_symptoms = len(self.diseases), len(self.symptoms)
+        names = list(disease_to_symptoms)
+        if names[:n_diseases] != self.diseases:
+            return None
+        intern = sys.intern
+        indptr, indices, post_ptr, post = self.indptr, self.indices, self.post_ptr, self.post_indices
+
+        # Changed rows (and every new disease), in old symptom IDs plus new ones past them
+        symptom_ids, symptoms = dict(self.symptom_ids), list(self.symptoms)
+        changed = {}
+        for did, disease in enumerate(names):
+            row = list(map(symptom_ids.get, disease_to_symptoms[disease]))
+            if did < n_diseases and row == indices[indptr[did]:indptr[did + 1]].tolist():
+                continue
+            if None in row:
+                for s in disease_to_symptoms[disease]:
+                    if s not in symptom_ids:
+                        symptom_ids[intern(s)] = len(symptoms)
+                        symptoms.append(intern(s))
+                row = list(map(symptom_ids.get, disease_to_symptoms[disease]))
+            changed[did] = list(dict.fromkeys(row))
+
+        # Rows: runs of unchanged diseases are single slice copies
+        rows, sizes, run = array("i"), array("i", self.sizes), 0
+        sizes.extend(array("i", [0]) * (len(names) - n_diseases))
+        for did in sorted(changed):
+            if run < did <= n_diseases:
+                rows.extend(indices[indptr[run]:indptr[did]])
+            rows.extend(changed[did])
+            sizes[did] = len(changed[did])
+            run = did + 1
+        if run < n_diseases:
+            rows.extend(indices[indptr[run]:])
+
+        # Symptoms are numbered in first-seen order, which an edit can change
+        # (and a symptom no disease lists any more drops out)
+        order = array("i", dict.fromkeys(rows))
+        if len(order) == len(symptoms) and order == array("i", range(len(order))):
+            new_symptoms, new_ids = symptoms, symptom_ids
+        else:
+            renumber = array("i", bytes(4 * len(symptoms)))
+            for sid, old in enumerate(order):
+                renumber[old] = sid
+            rows = array("i", map(renumber.__getitem__, rows))
+            new_symptoms = [symptoms[old] for old in order]
+            new_ids = {s: sid for sid, s in enumerate(new_symptoms)}
+
+        # Postings: only the symptoms of changed rows (before or after) differ
+        touched = {}
+        for did, row in changed.items():
+            if did < n_diseases:
+                for old in indices[indptr[did]:indptr[did + 1]]:
+                    touched.setdefault(old, set()).add(did)
+            for old in row:
+                touched.setdefault(old, set()).add(did)
+        graph = KnowledgeGraph.__new__(KnowledgeGraph)
+        graph.diseases = self.diseases + [intern(d) for d in names[n_diseases:]]
+        graph.disease_ids = dict(self.disease_ids)
+        graph.disease_ids.update((d, i) for i, d in enumerate(graph.diseases[n_diseases:], n_diseases))
+        graph.symptoms, graph.symptom_ids = new_symptoms, new_ids
+        graph.indptr, graph.indices, graph.sizes = array("i", accumulate(sizes, initial=0)), rows, sizes
+        graph.post_ptr, graph.post_indices = array("i", [0]), array("i")
+        rows_of = {did: set(row) for did, row in changed.items()}
+        for old in order:
+            dids = touched.get(old)
+            if dids is None:
+                graph.post_indices.extend(post[post_ptr[old]:post_ptr[old + 1]])
+            else:
+                kept = [] if old >= n_symptoms else [d for d in post[post_ptr[old]:post_ptr[old + 1]] if d not in dids]
+                kept.extend(d for d in dids if old in rows_of[d])
+                kept.sort()
+                graph.post_indices.extend(kept)
+            graph.post_ptr.append(len(graph.post_indices))
+        graph.labels = [self.labels[old] if old < n_symptoms else symptoms[old].replace("_", " ") for old in order]
+        return graph, (order, set(touched))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def symptoms_of(self, did):
+        """Symptom IDs of a disease"""
+        return self.indices[self.indptr[did]:self.indptr[did + 1]]
+
+    def diseases_of(self, sid):
+        """Disease IDs that list a symptom"""
+        return self.post_indices[self.post_ptr[sid]:self.post_ptr[sid + 1]]
+
+    def scoring_engine(self, previous=None, moves=None):
+        """ScoringEngine over this graph's postings (no copy). previous and moves:
+        the engine of the graph this one was patched() from, and the moves it
+        returned; its impact-ordered postings are then patched, not rebuilt"""
+        engine = ScoringEngine.from_csr(self.diseases, self.disease_ids, self.symptom_ids,
+                                        self.sizes, self.post_ptr, self.post_indices)
+        engine.symptoms = self.symptoms
+        if len(self) >= IMPACT_MIN_EDGES:
+            if previous is not None and previous.impact is not None and moves is not None:
+                engine.impact = previous.impact.patched(self, *moves)
+            else:
+                engine.impact = ImpactIndex(self)
+        return engine
+
+    def label(self, symptom):
+        sid = self.symptom_ids.get(symptom)
+        return symptom.replace("_", " ") if sid is None else self.labels[sid]
+
+
+class DiseaseSymptoms(Mapping):
+    """disease -> [symptom] view of a KnowledgeGraph"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph.diseases)
+
+    def __iter__(self):
+        return iter(self.graph.diseases)
+
+    def __contains__(self, disease):
+        return disease in self.graph.disease_ids
+
+    def __getitem__(self, disease):
+        g = self.graph
+        symptoms = g.symptoms
+        return [symptoms[s] for s in g.symptoms_of(g.disease_ids[disease])]
+
+
+class SymptomDiseases(Mapping):
+    """symptom -> [disease] view of a KnowledgeGraph"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph.symptoms)
+
+    def __iter__(self):
+        return iter(self.graph.symptoms)
+
+    def __contains__(self, symptom):
+        return symptom in self.graph.symptom_ids
+
+    def __getitem__(self, symptom):
+        g = self.graph
+        diseases = g.diseases
+        return [diseases[d] for d in g.diseases_of(g.symptom_ids[symptom])]
+
+
+# ----------------------------------------------------------
+# MEMORY REPORT
+# ----------------------------------------------------------
+
+def measure(build):
+    """(result, bytes still allocated by build())"""
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    return result, tracemalloc.get_traced_memory()[0] - before
+
+
+def main(argv=None):
+    import knowledge
+
+    parser = argparse.ArgumentParser(description="Memory of the dict-of-lists vs interned graph representation")
+    parser.add_argument("csv", nargs="?", default=knowledge.csv_path)
+    parser.add_argument("--edges", type=int, help="use a generated dataset of this size instead")
+    parser.add_argument("--data-dir", help="where generated datasets are cached (default: bench.DATA_DIR)")
+    args = parser.parse_args(argv)
+
+    path = args.csv
+    if args.edges:
+        import bench
+        path = bench.dataset(args.data_dir or bench.DATA_DIR, args.edges)[0]
+
+    tracemalloc.start()
+
+    def lists():
+        d2s = knowledge.read_symptoms(path)
+        return d2s, knowledge.reverse_mapping(d2s), ScoringEngine(d2s)
+
+    legacy, legacy_bytes = measure(lists)
+    del legacy
+
+    def compact():
+        graph = KnowledgeGraph(knowledge.read_symptoms(path))
+        return graph, graph.scoring_engine()
+
+    (graph, _), graph_bytes = measure(compact)
+    tracemalloc.stop()
+
+    edges = len(graph)
+    per = 100_000 / edges if edges else 0
+    print(f"{len(graph.diseases)} diseases, {len(graph.symptoms)} symptoms, {edges} edges")
+    print(f"dict of lists + reverse lists + engine: {legacy_bytes / 2**20:8.1f} MiB")
+    print(f"interned graph + engine:                {graph_bytes / 2**20:8.1f} MiB")
+    print(f"saved per 100k edges:                   {(legacy_bytes - graph_bytes) * per / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,84 +6,114 @@
 
 import csv
 import os
+import sys
+import threading
+import time
+from cache import DiagnosisCache
+from fuzzy import FuzzyIndex
+from graph import DiseaseSymptoms, KnowledgeGraph, SymptomDiseases, Treatment
+import metrics
+import snapshot
+from scoring import ScoringEngine
 
 # ===============================
 #  knowledge.py (Dynamic from CSV)
 #  Powered by Kaggle/GitHub Dataset
 # ===============================
 
-disease_to_symptoms = {}
 csv_path = os.path.join(os.path.dirname(__file__), 'dataset.csv')
+desc_path = os.path.join(os.path.dirname(__file__), 'disease_description.csv')
+prec_path = os.path.join(os.path.dirname(__file__), 'disease_precaution.csv')
+
+# Compiled by `python snapshot.py`; used while newer than all three CSVs
+snapshot_path = os.path.join(os.path.dirname(__file__), 'knowledge.snapshot')
+
+# Set by shared.publish() so child processes mmap the parent's knowledge base
+SHARED_ENV = 'SYMPTOM_CHECKER_SHARED_KB'
+
+# Path of a SQLite knowledge database (see database.py) to serve lookups from
+# instead of in-memory dicts; built from the CSVs when missing or stale
+DATABASE_ENV = 'SYMPTOM_CHECKER_DB'
 
-try:
-    with open(csv_path, mode='r', encoding='utf-8') as f:
+
+def read_symptoms(path=csv_path):
+    """Parses dataset.csv into {disease: [symptoms]}; raises on I/O errors"""
+    disease_to_symptoms = {}
+    # Per-disease sets make the duplicate check O(1) instead of a list scan
+    seen = {}
+
+    with open(path, mode='r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             # The dataset uses 'Source' for Disease and 'Target' for Symptom
             disease = row['Source'].strip().title() # e.g. "Influenza"
             symptom = row['Target'].strip().lower() # e.g. "fever"
-            
+
             if disease and symptom:
                 if disease not in disease_to_symptoms:
                     disease_to_symptoms[disease] = []
-                if symptom not in disease_to_symptoms[disease]:
+                    seen[disease] = set()
+                if symptom not in seen[disease]:
+                    seen[disease].add(symptom)
                     disease_to_symptoms[disease].append(symptom)
-                    
-    print(f"Successfully loaded {len(disease_to_symptoms)} diseases from dataset.csv")
-
-except FileNotFoundError:
-    print("Error: dataset.csv not found. Please ensure the file exists.")
-    # Fallback or empty initialization
-    disease_to_symptoms = {
-        "Example Disease": ["fever", "cough"]
-    }
-except Exception as e:
-    print(f"Error loading dataset: {e}")
 
-# ----------------------------------------------------------
-# REVERSE MAPPING (symptom → diseases)
-# ----------------------------------------------------------
+    return disease_to_symptoms
 
-symptom_to_diseases = {}
-for disease, symptoms in disease_to_symptoms.items():
-    for symptom in symptoms:
-        symptom_to_diseases.setdefault(symptom, []).append(disease)
 
-# ----------------------------------------------------------
-# DISEASE DESCRIPTIONS
-# ----------------------------------------------------------
+def load_symptoms(path=csv_path):
+    disease_to_symptoms = {}
+    try:
+        disease_to_symptoms = read_symptoms(path)
+        print(f"Successfully loaded {len(disease_to_symptoms)} diseases from dataset.csv")
+
+    except FileNotFoundError:
+        print("Error: dataset.csv not found. Please ensure the file exists.")
+        # Fallback or empty initialization
+        disease_to_symptoms = {
+            "Example Disease": ["fever", "cough"]
+        }
+    except Exception as e:
+        print(f"Error loading dataset: {e}")
 
+    return disease_to_symptoms
 
 # ----------------------------------------------------------
 # DISEASE DESCRIPTIONS
 # ----------------------------------------------------------
 
-disease_info = {}
-desc_path = os.path.join(os.path.dirname(__file__), 'disease_description.csv')
-
-try:
-    with open(desc_path, mode='r', encoding='utf-8') as f:
+def read_descriptions(path=desc_path):
+    """Parses disease_description.csv into {disease: description}; raises on I/O errors"""
+    disease_info = {}
+    with open(path, mode='r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             if 'Disease' in row and 'Description' in row:
                 disease = row['Disease'].strip().title()
                 desc = row['Description'].strip()
                 disease_info[disease] = desc
-    print(f"Successfully loaded {len(disease_info)} descriptions.")
-except FileNotFoundError:
-    print("Error: disease_description.csv not found.")
-except Exception as e:
-    print(f"Error loading descriptions: {e}")
+    return disease_info
+
+
+def load_descriptions(path=desc_path):
+    disease_info = {}
+    try:
+        disease_info = read_descriptions(path)
+        print(f"Successfully loaded {len(disease_info)} descriptions.")
+    except FileNotFoundError:
+        print("Error: disease_description.csv not found.")
+    except Exception as e:
+        print(f"Error loading descriptions: {e}")
+
+    return disease_info
 
 # ----------------------------------------------------------
 # TREATMENT INFORMATION
 # ----------------------------------------------------------
 
-disease_treatments = {}
-prec_path = os.path.join(os.path.dirname(__file__), 'disease_precaution.csv')
-
-try:
-    with open(prec_path, mode='r', encoding='utf-8') as f:
+def read_treatments(path=prec_path):
+    """Parses disease_precaution.csv into {disease: Treatment}; raises on I/O errors"""
+    disease_treatments = {}
+    with open(path, mode='r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             if 'Disease' in row:
@@ -95,14 +125,295 @@ try:
                     if row.get(col):
                         p = row[col].strip()
                         if p:
-                            precautions.append(p.capitalize())
-                
+                            # The same few precautions repeat across diseases
+                            precautions.append(sys.intern(p.capitalize()))
+
                 if precautions:
-                    disease_treatments[disease] = {
-                        "precautions": precautions
-                    }
-    print(f"Successfully loaded {len(disease_treatments)} treatments.")
-except FileNotFoundError:
-    print("Error: disease_precaution.csv not found.")
-except Exception as e:
-    print(f"Error loading treatments: {e}")
\ No newline at end of file
+                    disease_treatments[disease] = Treatment(precautions)
+    return disease_treatments
+
+
+def load_treatments(path=prec_path):
+    disease_treatments = {}
+    try:
+        disease_treatments = read_treatments(path)
+        print(f"Successfully loaded {len(disease_treatments)} treatments.")
+    except FileNotFoundError:
+        print("Error: disease_precaution.csv not found.")
+    except Exception as e:
+        print(f"Error loading treatments: {e}")
+
+    return disease_treatments
+
+
+def parse_csvs():
+    """Parses all three CSVs: (disease_to_symptoms, disease_info, disease_treatments)"""
+    return load_symptoms(), load_descriptions(), load_treatments()
+
+
+def load_knowledge():
+    """Uses the compiled snapshot when it is up to date, otherwise parses the CSVs"""
+    if snapshot.is_fresh(snapshot_path, [csv_path, desc_path, prec_path]):
+        try:
+            kb = snapshot.read_snapshot(snapshot_path)
+            print(f"Successfully loaded {len(kb[0])} diseases from knowledge.snapshot")
+            return kb
+        except Exception as e:
+            print(f"Error loading snapshot, falling back to CSV: {e}")
+    return parse_csvs()
+
+
+# ----------------------------------------------------------
+# REVERSE MAPPING (symptom → diseases)
+# ----------------------------------------------------------
+
+def reverse_mapping(disease_to_symptoms):
+    symptom_to_diseases = {}
+    for disease, symptoms in disease_to_symptoms.items():
+        for symptom in symptoms:
+            symptom_to_diseases.setdefault(symptom, []).append(disease)
+    return symptom_to_diseases
+
+# ----------------------------------------------------------
+# VERSIONED KNOWLEDGE BASE
+# ----------------------------------------------------------
+
+class KnowledgeBase:
+    """One version of the knowledge base. Never mutated once built, so a
+    caller holding a reference keeps a consistent view across a reload."""
+
+    def __init__(self, disease_to_symptoms, disease_info, disease_treatments,
+                 version=1, symptom_to_diseases=None, symptom_index=None, scoring_engine=None):
+        """disease_to_symptoms may be a ready KnowledgeGraph (e.g. kept across a reload)"""
+        self.version = version
+        self.disease_info = disease_info
+        self.disease_treatments = disease_treatments
+
+        # COMPACT GRAPH (interned IDs + CSR postings)
+        # Both mappings and the scoring engine are views of it; backends that
+        # pass their own symptom_to_diseases (shared memory, SQLite) keep theirs
+        self.graph = None
+        if symptom_to_diseases is None:
+            graph = disease_to_symptoms
+            if not isinstance(graph, KnowledgeGraph):
+                graph = KnowledgeGraph(disease_to_symptoms)
+            disease_to_symptoms, symptom_to_diseases = DiseaseSymptoms(graph), SymptomDiseases(graph)
+            if scoring_engine is None:
+                scoring_engine = graph.scoring_engine()
+            self.graph = graph
+        self.disease_to_symptoms = disease_to_symptoms
+        self.symptom_to_diseases = symptom_to_diseases
+
+        # FUZZY SYMPTOM INDEX (typo-tolerant lookup)
+        # Built once here so chat turns never scan the whole vocabulary.
+        # Use FuzzyIndex(symptom_to_diseases, mode="ratio") to get the old
+        # difflib 0.85 cutoff behaviour for comparison.
+        if symptom_index is None:
+            symptom_index = FuzzyIndex(symptom_to_diseases, max_distance=2)
+        self.symptom_index = symptom_index
+
+        # SCORING ENGINE (shared by the GUI and the chatbot)
+        if scoring_engine is None:
+            scoring_engine = ScoringEngine(disease_to_symptoms)
+        self.scoring_engine = scoring_engine
+
+        # Indexes other modules build from this version (see derived())
+        self._derived = {}
+
+    def label(self, symptom):
+        """Readable symptom name ("skin_rash" -> "skin rash"), precomputed per version"""
+        if self.graph is not None:
+            return self.graph.label(symptom)
+        return symptom.replace("_", " ")
+
+    def symptom_labels(self, disease):
+        """Readable names of a disease's symptoms, in file order"""
+        if self.graph is not None:
+            g = self.graph
+            did = g.disease_ids.get(disease)
+            return [] if did is None else [g.labels[s] for s in g.symptoms_of(did)]
+        return [s.replace("_", " ") for s in self.disease_to_symptoms.get(disease, ())]
+
+    def id_graph(self):
+        """The KnowledgeGraph behind this version, for indexes over every
+        disease (triage, related). Backends that keep their tables out of
+        memory stream one with only the integer arrays in memory, once"""
+        if self.graph is not None:
+            return self.graph
+        return self.derived("id_graph", _build_id_graph)
+
+    def derived(self, name, factory):
+        """Returns factory(self), built at most once per version"""
+        value = self._derived.get(name)
+        if value is None:
+            value = self._derived.setdefault(name, factory(self))
+        return value
+
+
+def _build_id_graph(kb):
+    if getattr(kb, "database", None) is not None:
+        return kb.database.graph()
+    if getattr(kb, "snapshot", None) is not None:
+        return kb.snapshot.graph()
+    return KnowledgeGraph(kb.disease_to_symptoms)
+
+
+def _reuse_equal(old, new):
+    """New dict that keeps the old value objects for unchanged keys"""
+    return {k: old[k] if old.get(k) == v else v for k, v in new.items()}
+
+
+class KnowledgeStore:
+    """Holds the current KnowledgeBase and swaps in a new version when the
+    CSVs change. Readers grab `store.current` once per request/turn.
+    Nothing is loaded until `current` is first read."""
+
+    def __init__(self):
+        self.paths = [csv_path, desc_path, prec_path]
+        self._mtimes = None
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._watcher = None
+
+        # Diagnosis results, keyed by version and dropped on each reload
+        self.diagnoses = DiagnosisCache()
+        self.subscribe(self.diagnoses.invalidate)
+        self.reload_failures = 0
+
+    @property
+    def current(self):
+        """The live KnowledgeBase, loaded on first access"""
+        kb = self._current
+        if kb is None:
+            kb = self._load()
+        return kb
+
+    @property
+    def loaded(self):
+        return self._current is not None
+
+    def _load(self):
+        with self._load_lock:
+            if self._current is not None:
+                return self._current
+            start = time.perf_counter()
+            self._mtimes = self._stat()
+            # Worker processes attach to a knowledge base published by their parent
+            shared_path = os.environ.get(SHARED_ENV)
+            database_path = os.environ.get(DATABASE_ENV)
+            if shared_path:
+                import shared
+                self._current = shared.attach(shared_path)
+                print(f"Attached shared knowledge base {shared_path}")
+            elif database_path:
+                import database
+                self._current = database.load(database_path, self.paths)
+                print(f"Attached knowledge database {database_path}")
+            else:
+                self._current = KnowledgeBase(*load_knowledge())
+            self._record("knowledge.load", time.perf_counter() - start)
+            return self._current
+
+    def _record(self, stage, seconds):
+        # Recorded even while metrics are disabled: loads are rare, and the
+        # first one may run before anything enables them
+        kb = self.current
+        metrics.registry.observe(stage, seconds)
+        metrics.registry.gauge("knowledge.version", kb.version)
+        metrics.registry.gauge("knowledge.diseases", len(kb.disease_to_symptoms))
+        metrics.registry.gauge("knowledge.symptoms", len(kb.symptom_to_diseases))
+        metrics.registry.gauge("knowledge.reload_failures", self.reload_failures)
+
+    def _stat(self):
+        return [os.path.getmtime(p) if os.path.exists(p) else None for p in self.paths]
+
+    def subscribe(self, callback):
+        """callback(kb) runs (on the reloading thread) after each new version"""
+        self._listeners.append(callback)
+
+    def _rebuild(self, old, changed):
+        """Next in-memory version, re-reading only the changed CSVs"""
+        graph = old.graph if old.graph is not None else old.disease_to_symptoms
+        index, engine = old.symptom_index, None
+        if csv_path in changed:
+            # One pass over the file, then only the changed rows are applied
+            # to the graph and scoring postings (see KnowledgeGraph.patched)
+            disease_to_symptoms = read_symptoms()
+            patch = old.graph.patched(disease_to_symptoms) if old.graph is not None else None
+            if patch is None:
+                graph = KnowledgeGraph(disease_to_symptoms)
+            else:
+                graph, moves = patch
+                engine = graph.scoring_engine(old.scoring_engine, moves)
+            # The typo index only depends on the symptom vocabulary
+            if graph.symptom_ids.keys() != old.symptom_to_diseases.keys():
+                index = index.patched(graph.symptoms) if isinstance(index, FuzzyIndex) else None
+        info = _reuse_equal(old.disease_info, read_descriptions()) if desc_path in changed else old.disease_info
+        treatments = _reuse_equal(old.disease_treatments, read_treatments()) if prec_path in changed else old.disease_treatments
+
+        return KnowledgeBase(graph, info, treatments, version=old.version + 1, symptom_index=index,
+                             scoring_engine=engine)
+
+    def reload(self, force=False):
+        """Rebuilds from the changed files and swaps atomically; True if swapped"""
+        if not self.loaded:
+            # The first access will read the files as they are now
+            return False
+        with self._lock:
+            mtimes = self._stat()
+            changed = [p for p, old, new in zip(self.paths, self._mtimes, mtimes) if old != new or force]
+            if not changed:
+                return False
+
+            old = self.current
+            start = time.perf_counter()
+            try:
+                if getattr(old, "database", None) is not None:
+                    # Re-ingested into a new file; the old version keeps its connection
+                    import database
+                    kb = database.load(old.database.path, self.paths, version=old.version + 1)
+                else:
+                    kb = self._rebuild(old, changed)
+            except Exception as e:
+                print(f"Error reloading knowledge base, keeping version {old.version}: {e}")
+                self.reload_failures += 1
+                metrics.registry.gauge("knowledge.reload_failures", self.reload_failures)
+                return False
+
+            self._mtimes = mtimes
+            # Single reference assignment: readers see either version, never a mix
+            self._current = kb
+            self._record("knowledge.reload", time.perf_counter() - start)
+
+        print(f"Reloaded knowledge base (version {kb.version}: {len(kb.disease_to_symptoms)} diseases)")
+        for callback in self._listeners:
+            callback(kb)
+        return True
+
+    def start_watching(self, interval=2.0):
+        """Polls the CSVs' modification times on a daemon thread"""
+        if self._watcher:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                self.reload()
+
+        self._watcher = threading.Thread(target=watch, name="knowledge-watcher", daemon=True)
+        self._watcher.start()
+
+
+store = KnowledgeStore()
+
+# Old module-level names (knowledge.disease_info, ...) resolve to the current version
+_KB_ATTRS = {"disease_to_symptoms", "symptom_to_diseases", "disease_info",
+             "disease_treatments", "symptom_index", "scoring_engine"}
+
+
+def __getattr__(name):
+    if name in _KB_ATTRS:
+        return getattr(store.current, name)
+    raise AttributeError(f"module 'knowledge' has no attribute '{name}'")
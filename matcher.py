@@ -0,0 +1,112 @@
+"""
+Multi-pattern symptom scanner
+Aho-Corasick automaton that finds every symptom phrase (and slang term)
+in a message with one linear pass, instead of testing each symptom in turn
+"""
+
+from collections import deque
+
+
+class Automaton:
+    """Aho-Corasick automaton over characters: pattern string -> value"""
+
+    def __init__(self, patterns):
+        # Each state is a dict of {char: next_state}; state 0 is the root
+        self.goto = [{}]
+        self.fail = [0]
+        # Patterns ending at each state, longest first: (pattern, value)
+        self.out = [[]]
+        # Insertion order of each pattern, used to settle overlapping replacements
+        self.rank = {}
+
+        for pattern, value in patterns.items():
+            if pattern:
+                self._add(pattern, value)
+        self._link()
+
+    def _add(self, pattern, value):
+        self.rank.setdefault(pattern, len(self.rank))
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append((pattern, value))
+
+    def _link(self):
+        """Breadth-first pass that fills failure links and merges outputs"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                # Outputs of the fail state are suffixes, so they are never longer
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter_matches(self, text):
+        """Yields (end_index, pattern, value) for every occurrence, overlaps included"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern, value in out[state]:
+                yield i + 1, pattern, value
+
+    def replace(self, text):
+        """Replaces non-overlapping matches, earlier patterns taking precedence
+
+        Mirrors calling str.replace once per pattern in insertion order, as long
+        as no replacement value itself contains another pattern.
+        """
+        hits = sorted((self.rank[pattern], end - len(pattern), end, value)
+                      for end, pattern, value in self.iter_matches(text))
+        if not hits:
+            return text
+
+        taken = bytearray(len(text))
+        chosen = []
+        for _, start, end, value in hits:
+            if not any(taken[start:end]):
+                taken[start:end] = b"\x01" * (end - start)
+                chosen.append((start, end, value))
+
+        parts, pos = [], 0
+        for start, end, value in sorted(chosen):
+            parts.append(text[pos:start])
+            parts.append(value)
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+
+class SymptomMatcher:
+    """Precompiled scanner for slang substitution + exact symptom lookup"""
+
+    def __init__(self, symptoms, synonyms):
+        self.slang = Automaton(dict(synonyms))
+
+        # Both the raw key and its readable form point back to the raw key
+        patterns = {}
+        for s in symptoms:
+            patterns.setdefault(s, s)
+            patterns.setdefault(s.replace("_", " "), s)
+        self.symptoms = Automaton(patterns)
+
+    def replace_slang(self, text):
+        """Swaps slang for official symptom names in a single pass"""
+        return self.slang.replace(text)
+
+    def scan(self, text):
+        """Returns the set of symptoms whose name occurs anywhere in text"""
+        return {value for _, _, value in self.symptoms.iter_matches(text)}
@@ -0,0 +1,283 @@
+"""
+Low-overhead instrumentation for the chat and diagnosis pipeline
+Per-stage timers (count / total / max / latency histogram), counters and
+gauges in one process-wide registry, exportable as Prometheus text or a JSON
+snapshot. Off by default: while disabled, stage() hands back a shared no-op
+context manager, so instrumented code pays one attribute check per stage.
+
+Usage:
+    import metrics
+    metrics.enable()                       # or SYMPTOM_CHECKER_METRICS=1
+    with metrics.stage("chat.route"):
+        ...
+    metrics.count("chat.intent.hello")
+    print(metrics.registry.prometheus())   # or metrics.registry.snapshot()
+
+    # Sample the stacks of requests slower than 50 ms and hand them to a hook
+    metrics.registry.profile_slow(0.05, hook=print_slow_request)
+"""
+
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+ENV = "SYMPTOM_CHECKER_METRICS"
+PREFIX = "symptom_checker"
+
+# Histogram upper bounds, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullStage()
+
+
+class _Stage:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _Request(_Stage):
+    """A stage whose thread is sampled by the slow-request profiler"""
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        self.samples = self.registry._profiler.begin(self.thread)
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.registry.observe(self.name, elapsed)
+        self.registry._profiler.end(self.thread, self.name, elapsed, self.samples)
+        return False
+
+
+class Timer:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.buckets[i] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS + (self.max,), self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+# ----------------------------------------------------------
+# SLOW-REQUEST PROFILER
+# ----------------------------------------------------------
+
+def print_slow_request(name, seconds, samples):
+    """Default hook: the most sampled stacks of a slow request, on stderr"""
+    print(f"[metrics] slow {name}: {seconds * 1000:.1f} ms, {sum(samples.values())} samples", file=sys.stderr)
+    for stack, n in samples.most_common(3):
+        print(f"  {n} x {stack}", file=sys.stderr)
+
+
+class SlowRequestProfiler:
+    """Samples the stacks of threads inside a request every `interval`
+    seconds; requests slower than `threshold` are passed to hook(name,
+    seconds, Counter(stack -> samples))"""
+
+    def __init__(self):
+        self.threshold = None
+        self.interval = 0.005
+        self.hook = print_slow_request
+        self._active = {}
+        self._thread = None
+
+    def start(self, threshold, interval=0.005, hook=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.hook = hook or print_slow_request
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sample, name="metrics-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self.threshold = None
+
+    def begin(self, thread):
+        if self.threshold is None:
+            return None
+        samples = self._active[thread] = Counter()
+        return samples
+
+    def end(self, thread, name, seconds, samples):
+        if samples is None:
+            return
+        self._active.pop(thread, None)
+        if self.threshold is not None and seconds >= self.threshold:
+            self.hook(name, seconds, samples)
+
+    def _sample(self):
+        import traceback
+
+        while True:
+            time.sleep(self.interval)
+            if self.threshold is None or not self._active:
+                continue
+            frames = sys._current_frames()
+            for thread, samples in list(self._active.items()):
+                frame = frames.get(thread)
+                if frame is not None:
+                    stack = traceback.extract_stack(frame, limit=8)
+                    samples[" <- ".join(f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})"
+                                        for f in reversed(stack))] += 1
+
+
+# ----------------------------------------------------------
+# REGISTRY
+# ----------------------------------------------------------
+
+class Registry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.timers = {}
+        self.counters = Counter()
+        self.gauges = {}
+        self._lock = threading.Lock()
+        self._profiler = SlowRequestProfiler()
+
+    def stage(self, name):
+        """Context manager timing one stage (no-op while disabled)"""
+        return _Stage(self, name) if self.enabled else _NULL
+
+    def request(self, name):
+        """Like stage(), and also sampled by the slow-request profiler"""
+        return _Request(self, name) if self.enabled else _NULL
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer()
+            timer.observe(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def gauge(self, name, value):
+        """Gauges are kept while disabled, since they are set rarely (e.g. on reload)"""
+        self.gauges[name] = value
+
+    def profile_slow(self, threshold, interval=0.005, hook=None):
+        """Samples requests and reports those slower than threshold seconds (None stops)"""
+        if threshold is None:
+            self._profiler.stop()
+        else:
+            self._profiler.start(threshold, interval, hook)
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """JSON-serializable view of every metric"""
+        with self._lock:
+            stages = {name: {"count": t.count, "total_ms": round(t.total * 1000, 3),
+                             "mean_ms": round(t.total / t.count * 1000, 4) if t.count else 0.0,
+                             "max_ms": round(t.max * 1000, 3),
+                             "p50_ms": round(t.quantile(0.5) * 1000, 3),
+                             "p99_ms": round(t.quantile(0.99) * 1000, 3)}
+                      for name, t in sorted(self.timers.items())}
+            counters = dict(sorted(self.counters.items()))
+        return {"enabled": self.enabled, "stages": stages, "counters": counters, "gauges": dict(self.gauges)}
+
+    def prometheus(self):
+        """Prometheus text exposition format"""
+        lines = [f"# TYPE {PREFIX}_stage_seconds histogram"]
+        with self._lock:
+            for name, t in sorted(self.timers.items()):
+                label = f'stage="{name}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS, t.buckets):
+                    cumulative += n
+                    lines.append(f'{PREFIX}_stage_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{{label},le="+Inf"}} {t.count}')
+                lines.append(f"{PREFIX}_stage_seconds_sum{{{label}}} {t.total:.6f}")
+                lines.append(f"{PREFIX}_stage_seconds_count{{{label}}} {t.count}")
+            lines.append(f"# TYPE {PREFIX}_events_total counter")
+            for name, n in sorted(self.counters.items()):
+                lines.append(f'{PREFIX}_events_total{{event="{name}"}} {n}')
+        for name, value in sorted(self.gauges.items()):
+            metric = f"{PREFIX}_{name.replace('.', '_')}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(enabled=os.environ.get(ENV, "") not in ("", "0"))
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
+
+
+def stage(name):
+    return registry.stage(name)
+
+
+def request(name):
+    return registry.request(name)
+
+
+def count(name, n=1):
+    registry.count(name, n)
+
+
+def timed(name):
+    """Decorator timing every call of a function as stage `name`"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            with _Stage(registry, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
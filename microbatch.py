@@ -0,0 +1,373 @@
+"""
+Micro-batching scheduler for diagnosis requests
+Concurrent callers submit symptom sets. A worker thread collects them until
+max_delay has passed since the oldest one (2 ms) or max_batch (64) are
+waiting, scores the whole batch at once and resolves each caller's future.
+When max_queue requests are already waiting, new ones are rejected
+(Overloaded) instead of letting latency grow without bound.
+
+A batch is scored as one sparse query x disease product. Each distinct
+symptom in the batch becomes a disease bitset (a Python int) once. A query's
+shared-symptom counts are its columns added up bit-sliced, and its top k
+is read off by walking (shared count, disease size) classes in descending
+score order. Results, including tie order, equal ScoringEngine.rank /
+diagnose.
+
+Usage:
+    batcher = MicroBatcher(diagnose_batch)
+    batcher.submit((["fever", "cough"], 3)).result()    # [(disease, score), ...]
+
+    python microbatch.py --clients 64 --edges 100000    # batched vs one at a time, under load
+"""
+
+import argparse
+import collections
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+from scoring import CONFIDENCE_FLOOR, certainty_score
+
+# Below this many diseases, ranking queries one at a time is as fast
+BITSET_MIN_DISEASES = 1000
+
+# Symptoms listed by at least 1/DENSE_FRACTION of all diseases keep their
+# bitset between batches (at most DENSE_FRACTION / 8 bytes per edge)
+DENSE_FRACTION = 64
+
+
+class BatchScorer:
+    def __init__(self, engine):
+        self.engine = engine
+        # Needs in-memory CSR postings (not the SQLite engine) and enough diseases to pay off
+        self.bitsets = getattr(engine, "indptr", None) is not None and len(engine.diseases) >= BITSET_MIN_DISEASES
+        if not self.bitsets:
+            return
+        self.nbytes = (len(engine.diseases) + 7) // 8
+
+        # Diseases of each size, sizes ascending
+        by_size = {}
+        for d, z in enumerate(engine.sizes):
+            by_size.setdefault(z, []).append(d)
+        self.size_bits = {z: self.bitset(by_size[z]) for z in sorted(by_size)}
+
+        # Symptom ID -> bitset of the common symptoms; walks the CSR pointers
+        # because symptom_ids may be a lookup that can't be listed (shared memory)
+        threshold = max(1, len(engine.diseases) // DENSE_FRACTION)
+        indptr, indices = engine.indptr, engine.indices
+        self.columns = {sid: self.bitset(indices[indptr[sid]:indptr[sid + 1]]) for sid in range(len(indptr) - 1)
+                        if indptr[sid + 1] - indptr[sid] >= threshold}
+
+        # (method, query size) -> [(score, [(shared count, disease size), ...])], best first
+        self.orders = {}
+
+    def bitset(self, dids):
+        """Int with bit d set for each disease ID d"""
+        bits = bytearray(self.nbytes)
+        for d in dids:
+            bits[d >> 3] |= 1 << (d & 7)
+        return int.from_bytes(bits, "little")
+
+    def rank_batch(self, symptom_sets, k=3, method="certainty"):
+        """[ScoringEngine.rank(symptoms, k, method) for symptoms in symptom_sets], computed together"""
+        if method not in ("certainty", "coverage"):
+            raise ValueError(f"Unknown scoring method: {method}")
+        if not self.bitsets or k <= 0:
+            return [self.engine.rank(list(symptoms), k, method) for symptoms in symptom_sets]
+
+        # Each distinct query once, each distinct symptom's column once
+        columns, results, out = {}, {}, []
+        for symptoms in symptom_sets:
+            key = tuple(symptoms)
+            top = results.get(key)
+            if top is None:
+                for s in key:
+                    if s not in columns:
+                        bits = self.columns.get(self.engine.symptom_ids.get(s))
+                        columns[s] = self.bitset(self.engine.postings(s)) if bits is None else bits
+                top = results[key] = self._rank(key, columns, k, method)
+            out.append(list(top))
+        return out
+
+    def diagnose_batch(self, symptom_sets, k=3):
+        """[ScoringEngine.diagnose(symptoms, k) ...]: certainty with the confidence floor"""
+        tops = self.rank_batch(symptom_sets, k)
+        for top in tops:
+            if top and top[0][1] < CONFIDENCE_FLOOR:
+                top[0] = (top[0][0], CONFIDENCE_FLOOR)
+        return tops
+
+    def _order(self, method, n):
+        order = self.orders.get((method, n))
+        if order is None:
+            if method == "certainty":
+                score = lambda c, z: certainty_score(c, n, z)
+            else:
+                score = lambda c, z: round((c / z) * 100, 1)
+            order = []
+            for sc, c, z in sorted(((score(c, z), c, z) for c in range(1, n + 1) for z in self.size_bits),
+                                   key=lambda t: -t[0]):
+                if order and order[-1][0] == sc:
+                    order[-1][1].append((c, z))
+                else:
+                    order.append((sc, [(c, z)]))
+            order = self.orders.setdefault((method, n), order)
+        return order
+
+    def _rank(self, symptoms, columns, k, method):
+        # Certainty counts each distinct symptom once, coverage every mention
+        query = list(dict.fromkeys(symptoms)) if method == "certainty" else list(symptoms)
+
+        # Bit-sliced counters: bit d of planes[i] is bit i of disease d's shared count.
+        # firsts[f]: diseases first reached by query symptom f (ties break on it, then on ID)
+        planes, firsts, seen = [], [], 0
+        for s in query:
+            x = columns[s]
+            firsts.append(x & ~seen)
+            seen |= x
+            for i, p in enumerate(planes):
+                planes[i] = p ^ x
+                x &= p
+                if not x:
+                    break
+            else:
+                if x:
+                    planes.append(x)
+        if not seen:
+            return []
+
+        # Diseases by shared count
+        groups = {}
+        for c in range(1, min(len(query), (1 << len(planes)) - 1) + 1):
+            g = seen
+            for i, p in enumerate(planes):
+                g &= p if c >> i & 1 else ~p
+            if g:
+                groups[c] = g
+
+        top, diseases, size_bits = [], self.engine.diseases, self.size_bits
+        for score, classes in self._order(method, len(query)):
+            tied = 0
+            for c, z in classes:
+                g = groups.get(c)
+                if g:
+                    tied |= g & size_bits[z]
+            if not tied:
+                continue
+            for first in firsts:
+                part = tied & first
+                while part:
+                    low = part & -part
+                    top.append((diseases[low.bit_length() - 1], score))
+                    if len(top) == k:
+                        return top
+                    part ^= low
+        return top
+
+
+def scorer(kb):
+    """The BatchScorer of a knowledge version, built on first use"""
+    return kb.derived("batch_scorer", lambda kb: BatchScorer(kb.scoring_engine))
+
+
+def diagnose_batch(requests):
+    """Scores a batch of (symptoms, k) requests like core.diagnose (the Analyze button)"""
+    import knowledge
+
+    if not requests:
+        return []
+    # Canonical order, as the diagnosis cache scores them, and one pass at the largest k
+    k = max(k for _, k in requests)
+    tops = scorer(knowledge.store.current).diagnose_batch([sorted(set(s)) for s, _ in requests], k)
+    return [top[:want] for top, (_, want) in zip(tops, requests)]
+
+
+# ----------------------------------------------------------
+# SCHEDULER
+# ----------------------------------------------------------
+
+class Overloaded(Exception):
+    """The scheduler's queue is full; the caller should back off and retry"""
+
+
+class MicroBatcher:
+    def __init__(self, score_batch, max_batch=64, max_delay=0.002, max_queue=1024, name="batch"):
+        # score_batch: list of requests -> list of results, in the same order
+        self.score_batch = score_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.name = name
+        # (request, future, enqueue time); oldest first
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+        self._thread = None
+        self._closed = False
+        self.submitted = self.rejected = self.batches = self.max_depth = 0
+
+    def submit(self, request, timeout=0.0):
+        """Future for this request's result. Waits up to timeout seconds for
+        queue space, then raises Overloaded"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            if len(self._queue) >= self.max_queue:
+                deadline = time.monotonic() + timeout
+                while len(self._queue) >= self.max_queue:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        self.rejected += 1
+                        metrics.count(f"{self.name}.rejected")
+                        raise Overloaded(f"{len(self._queue)} requests already queued")
+                    self._space.wait(remaining)
+            self._queue.append((request, future, time.perf_counter()))
+            self.submitted += 1
+            self._depth()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-scheduler", daemon=True)
+                self._thread.start()
+            self._ready.notify()
+        return future
+
+    def close(self):
+        """Scores what is queued, then stops the worker"""
+        with self._lock:
+            self._closed = True
+            self._ready.notify()
+            self._space.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {"queue_depth": len(self._queue), "max_queue_depth": self.max_depth,
+                    "submitted": self.submitted, "rejected": self.rejected, "batches": self.batches,
+                    "mean_batch": round((self.submitted - len(self._queue)) / self.batches, 2) if self.batches else 0.0}
+
+    def _depth(self):
+        # Caller holds the lock
+        depth = len(self._queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        metrics.registry.gauge(f"{self.name}.queue_depth", depth)
+
+    def _next_batch(self):
+        """Blocks until a batch is due; [] once closed and drained"""
+        with self._lock:
+            while not self._queue and not self._closed:
+                self._ready.wait()
+            # The window opens with the oldest request
+            if self._queue:
+                deadline = self._queue[0][2] + self.max_delay
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            self.batches += bool(batch)
+            self._depth()
+            self._space.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            if metrics.registry.enabled:
+                now = time.perf_counter()
+                for _, _, queued in batch:
+                    metrics.registry.observe(f"{self.name}.wait", now - queued)
+                metrics.count(f"{self.name}.batches")
+                metrics.count(f"{self.name}.requests", len(batch))
+            try:
+                with metrics.stage(f"{self.name}.score"):
+                    results = self.score_batch([request for request, _, _ in batch])
+            except Exception as exc:
+                for _, future, _ in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+
+# ----------------------------------------------------------
+# LOAD TEST
+# ----------------------------------------------------------
+
+def load_test(score_one, batcher, queries, clients):
+    """(seconds, per-request latencies) for `clients` threads splitting the queries,
+    each calling score_one directly, or going through batcher if given"""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(mine):
+        clock, local = time.perf_counter, []
+        for q in mine:
+            start = clock()
+            if batcher is None:
+                score_one(q)
+            else:
+                batcher.submit((q, 3), timeout=60).result()
+            local.append(clock() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(queries[i::clients],)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+
+def main(argv=None):
+    import contextlib
+    import sys
+
+    import bench
+    import knowledge
+    import topk
+    from graph import KnowledgeGraph
+
+    parser = argparse.ArgumentParser(description="Micro-batched vs one-at-a-time diagnosis under concurrent load")
+    parser.add_argument("--edges", type=int, help="generated dataset size (default: dataset.csv)")
+    parser.add_argument("--clients", type=int, default=64, help="concurrent client threads")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batch-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    path = bench.dataset(bench.DATA_DIR, args.edges)[0] if args.edges else knowledge.csv_path
+    graph = KnowledgeGraph(knowledge.read_symptoms(path))
+    engine = graph.scoring_engine()
+    batch_scorer = BatchScorer(engine)
+    queries = [sorted(set(q)) for q in topk.patient_queries(random.Random(0), graph, args.requests)]
+
+    mismatches = sum(a != b for a, b in zip(batch_scorer.diagnose_batch(queries), map(engine.diagnose, queries)))
+    print(f"{len(graph.diseases)} diseases, {len(graph)} edges, {args.clients} clients, "
+          f"{len(queries)} requests | batched results differ in {mismatches}")
+
+    batcher = MicroBatcher(lambda reqs: batch_scorer.diagnose_batch([s for s, _ in reqs], 3),
+                           args.batch_size, args.batch_ms / 1000, max_queue=args.requests)
+    with contextlib.redirect_stdout(sys.stderr):
+        runs = {"one at a time": load_test(engine.diagnose, None, queries, args.clients),
+                "micro-batched": load_test(None, batcher, queries, args.clients)}
+    for label, (elapsed, latencies) in runs.items():
+        s = bench.summarize(latencies)
+        print(f"{label:14} {len(latencies) / elapsed:8.0f} req/s | p50 {s['p50_ms']:8.3f} "
+              f"p95 {s['p95_ms']:8.3f} p99 {s['p99_ms']:8.3f} ms")
+    batcher.close()
+    print(batcher.stats())
+
+
+if __name__ == "__main__":
+    main()
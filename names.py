@@ -0,0 +1,101 @@
+"""
+Disease-name resolver for "what is X" questions
+Exact, alias, token-boundary and prefix lookups over a token index built
+once per knowledge version, with a typo-tolerant fallback, so a query never
+scans every disease name.
+"""
+
+import re
+from bisect import bisect_left
+
+from fuzzy import FuzzyIndex
+
+TOKEN = re.compile(r"\w+")
+
+# Shortest partial word that is completed by prefix lookup ("mala" -> "Malaria")
+MIN_PREFIX = 3
+
+
+class NameIndex:
+    def __init__(self, names, aliases=None, fuzzy=True):
+        # Canonical names in knowledge base order; IDs are list positions
+        self.names = list(dict.fromkeys(names))
+        self.lower = [n.lower() for n in self.names]
+        self.exact = {}
+        self.tokens = {}
+        self.token_counts = []
+        for i, low in enumerate(self.lower):
+            self.exact.setdefault(low, i)
+            toks = TOKEN.findall(low)
+            self.token_counts.append(len(toks))
+            for t in dict.fromkeys(toks):
+                self.tokens.setdefault(t, []).append(i)
+        self.sorted_tokens = sorted(self.tokens)
+
+        # Aliases resolve case-insensitively to a known name
+        self.aliases = {}
+        for alias, target in (aliases or {}).items():
+            i = self.exact.get(target.lower())
+            if i is not None:
+                self.aliases[alias.lower()] = i
+
+        self.fuzzy = FuzzyIndex(self.exact) if fuzzy else None
+
+    def _with_tokens(self, toks):
+        """IDs of names containing every token, in ID order"""
+        postings = sorted((self.tokens.get(t, []) for t in set(toks)), key=len)
+        if not postings or not postings[0]:
+            return []
+        rest = [set(p) for p in postings[1:]]
+        return [i for i in postings[0] if all(i in s for s in rest)]
+
+    def _with_prefix(self, prefix):
+        """IDs of names with a token starting with prefix"""
+        ids = set()
+        pos = bisect_left(self.sorted_tokens, prefix)
+        while pos < len(self.sorted_tokens) and self.sorted_tokens[pos].startswith(prefix):
+            ids.update(self.tokens[self.sorted_tokens[pos]])
+            pos += 1
+        return ids
+
+    def _rank(self, ids, q):
+        # Name starting with the query first, then shorter names, then KB order
+        return sorted(ids, key=lambda i: (not self.lower[i].startswith(q), self.token_counts[i], i))
+
+    def resolve(self, query, limit=5, fuzzy=True):
+        """Ranked [(name, how)] for a query; how is alias/exact/token/prefix/fuzzy"""
+        q = query.lower().strip()
+        ranked, seen = [], set()
+
+        def add(ids, how):
+            for i in ids:
+                if i not in seen:
+                    seen.add(i)
+                    ranked.append((self.names[i], how))
+
+        if q in self.aliases:
+            add([self.aliases[q]], "alias")
+        if q in self.exact:
+            add([self.exact[q]], "exact")
+
+        toks = TOKEN.findall(q)
+        if toks and len(ranked) < limit:
+            # Whole-word match (so "flu" matches "Bird Flu" but NOT "Reflux")
+            pattern = re.compile(r"\b" + re.escape(q) + r"\b")
+            add(self._rank([i for i in self._with_tokens(toks) if pattern.search(self.lower[i])], q), "token")
+
+            if len(ranked) < limit and len(toks[-1]) >= MIN_PREFIX and q.endswith(toks[-1]):
+                ids = self._with_prefix(toks[-1])
+                if len(toks) > 1:
+                    ids &= set(self._with_tokens(toks[:-1]))
+                pattern = re.compile(r"\b" + re.escape(q))
+                add(self._rank([i for i in ids if pattern.search(self.lower[i])], q), "prefix")
+
+        if not ranked and fuzzy and self.fuzzy:
+            add([self.exact[self.fuzzy.phrases[p]] for p, _ in self.fuzzy.lookup(q)], "fuzzy")
+        return ranked[:limit]
+
+    def best(self, query, fuzzy=True):
+        """Top-ranked name for a query, or None"""
+        found = self.resolve(query, limit=1, fuzzy=fuzzy)
+        return found[0][0] if found else None
@@ -0,0 +1,176 @@
+"""
+Related conditions ("what else could it be?") via MinHash + LSH
+Each disease's symptom set gets a MinHash signature, cut into bands; diseases
+sharing any band land in the same bucket. Only bucket-mates are compared, by
+exact Jaccard similarity, instead of every disease against every other one.
+Built once per knowledge version, on first use.
+
+Usage:
+    related.index(kb).related("Influenza")   # [(disease, jaccard)] best first
+    python related.py Influenza Malaria      # related conditions from the command line
+    python related.py --check --edges 100000 # build time and recall vs exact all-pairs
+"""
+
+import argparse
+import random
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Signature = BANDS x ROWS min-hashes. Pairs with Jaccard s become candidates
+# with probability 1 - (1 - s^ROWS)^BANDS. Related diseases here typically
+# overlap by 0.1-0.3, so single-row bands: ~0.97 at 0.1, ~0.999 at 0.2
+BANDS = 32
+ROWS = 1
+
+PRIME = (1 << 61) - 1
+
+# Bucket-mates read per band; caps the work for symptoms nearly every disease has
+MAX_BUCKET = 1024
+
+# Weaker overlaps than this are not worth mentioning
+MIN_JACCARD = 0.1
+
+
+class RelatedIndex:
+    def __init__(self, graph, bands=BANDS, rows=ROWS, seed=1):
+        """graph: the knowledge version's KnowledgeGraph (kb.id_graph()); its IDs
+        and disease rows are used in place, not copied"""
+        rng = random.Random(seed)
+        perms = [(rng.randrange(1, PRIME), rng.randrange(PRIME)) for _ in range(bands * rows)]
+        self.bands, self.rows = bands, rows
+        self.diseases, self.disease_ids = graph.diseases, graph.disease_ids
+        self.indptr, self.indices = graph.indptr, graph.indices
+
+        # crc32 of each symptom name, not hash(): signatures must not depend on
+        # PYTHONHASHSEED (nor on how a backend numbers its symptoms)
+        base = [zlib.crc32(graph.symptoms[sid].encode("utf-8")) for sid in range(len(graph.symptoms))]
+
+        # Each symptom under every hash function; a signature is then the
+        # column-wise min over the disease's symptoms
+        hashed = [tuple((a * x + b) % PRIME for a, b in perms) for x in base]
+
+        # Per band: the band key of each disease, plus disease IDs sorted by key
+        # (32-bit keys: a rare collision only adds a candidate the re-rank drops)
+        self.keys = [array("I", bytes(4 * len(self.diseases))) for _ in range(bands)]
+        for did in range(len(self.diseases)):
+            row = self.indices[self.indptr[did]:self.indptr[did + 1]]
+            if not row:
+                continue
+            sig = list(map(min, zip(*map(hashed.__getitem__, row))))
+            for b in range(bands):
+                self.keys[b][did] = hash(tuple(sig[b * rows:(b + 1) * rows])) & 0xFFFFFFFF
+        self.order = [array("i", sorted(range(len(self.diseases)), key=keys.__getitem__)) for keys in self.keys]
+        self.sorted_keys = [array("I", (keys[i] for i in order)) for keys, order in zip(self.keys, self.order)]
+
+    def row(self, did):
+        return self.indices[self.indptr[did]:self.indptr[did + 1]]
+
+    def candidates(self, did):
+        """Disease IDs sharing at least one band with did"""
+        found = set()
+        for keys, order, sorted_keys in zip(self.keys, self.order, self.sorted_keys):
+            key = keys[did]
+            pos = bisect_left(sorted_keys, key)
+            end = bisect_right(sorted_keys, key, pos, min(len(sorted_keys), pos + MAX_BUCKET))
+            found.update(order[pos:end])
+        found.discard(did)
+        return found
+
+    def related(self, disease, k=3, min_jaccard=MIN_JACCARD):
+        """Up to k (disease, jaccard) with the most similar symptom sets, best first"""
+        did = self.disease_ids.get(disease)
+        if did is None:
+            return []
+        mine = set(self.row(did))
+        scored = []
+        for c in self.candidates(did):
+            theirs = self.row(c)
+            shared = len(mine.intersection(theirs))
+            j = shared / (len(mine) + len(theirs) - shared)
+            if j >= min_jaccard:
+                scored.append((j, c))
+        # Knowledge base order breaks ties
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [(self.diseases[c], round(j, 3)) for j, c in scored[:k]]
+
+
+def index(kb):
+    """The RelatedIndex of a knowledge version, built on first use"""
+    return kb.derived("related_index", lambda kb: RelatedIndex(kb.id_graph()))
+
+
+# ----------------------------------------------------------
+# CHECK (recall vs exact all-pairs)
+# ----------------------------------------------------------
+
+def exact_related(disease_to_symptoms, disease, k=3, min_jaccard=MIN_JACCARD):
+    """The O(D) scan the index avoids, for comparison"""
+    mine = set(disease_to_symptoms[disease])
+    scored = []
+    for i, (other, symptoms) in enumerate(disease_to_symptoms.items()):
+        if other == disease:
+            continue
+        theirs = set(symptoms)
+        j = len(mine & theirs) / len(mine | theirs)
+        if j >= min_jaccard:
+            scored.append((-j, i, other))
+    scored.sort()
+    return [other for _, _, other in scored[:k]]
+
+
+def check(disease_to_symptoms, samples=300, k=3, seed=0):
+    from graph import KnowledgeGraph
+
+    start = time.perf_counter()
+    idx = RelatedIndex(KnowledgeGraph(disease_to_symptoms))
+    build = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    names = rng.sample(list(disease_to_symptoms), min(samples, len(disease_to_symptoms)))
+    hits = total = 0
+    fast = slow = 0.0
+    for name in names:
+        start = time.perf_counter()
+        got = {d for d, _ in idx.related(name, k)}
+        fast += time.perf_counter() - start
+        start = time.perf_counter()
+        want = exact_related(disease_to_symptoms, name, k)
+        slow += time.perf_counter() - start
+        hits += len(got & set(want))
+        total += len(want)
+    print(f"{len(disease_to_symptoms)} diseases: build {build:.2f} s, "
+          f"lookup {fast / len(names) * 1000:.3f} ms vs exact scan {slow / len(names) * 1000:.3f} ms, "
+          f"recall@{k} {hits / total if total else 1.0:.3f}")
+
+
+def main(argv=None):
+    import contextlib
+    import sys
+
+    parser = argparse.ArgumentParser(description="Related conditions by symptom overlap")
+    parser.add_argument("diseases", nargs="*")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="build time and recall vs exact all-pairs")
+    parser.add_argument("--edges", type=int, help="with --check: use a generated dataset (see bench.py)")
+    args = parser.parse_args(argv)
+
+    import knowledge
+    if args.check:
+        if args.edges:
+            import bench
+            d2s = knowledge.read_symptoms(bench.dataset(bench.DATA_DIR, args.edges)[0])
+        else:
+            d2s = knowledge.read_symptoms()
+        check(d2s, k=args.k)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        kb = knowledge.store.current
+    for name in args.diseases:
+        name = name.title()
+        print(f"{name}: " + (", ".join(f"{d} ({j:.0%})" for d, j in index(kb).related(name, args.k)) or "none"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Replay chat transcripts through many concurrent MedicalChatbot sessions
+A load test and a behavior regression test in one. Every session of a JSONL
+transcript is replayed turn by turn on its own bot, many sessions at once
+(threads or processes), and the run reports throughput and per-intent
+latency. --record saves the responses and latencies as a baseline;
+--baseline diffs a later run against it and exits 1 on any changed
+response or on a p50 slowdown beyond --tolerance.
+
+Usage:
+    python replay.py --generate 200 > transcripts.jsonl
+    python replay.py transcripts.jsonl --record baseline.json
+    python replay.py transcripts.jsonl --workers 16 --baseline baseline.json
+    python replay.py transcripts.jsonl --mode processes --workers 4 --repeat 10
+
+Transcript lines (each session's events run in file order):
+    {"session": "a", "text": "I have a fever"}
+    {"session": "a", "event": "set_diagnosis_context", "diseases": [["Malaria", 62.5]],
+     "symptoms": ["chills"], "severity": "Mild — Home care recommended."}
+"""
+
+import argparse
+import contextlib
+import difflib
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+from bench import summarize
+
+
+def read_transcripts(f):
+    """session -> [event], sessions in order of first appearance"""
+    sessions = {}
+    for n, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        event = json.loads(line)
+        if "event" not in event and "text" not in event:
+            raise ValueError(f"line {n}: neither 'text' nor 'event'")
+        sessions.setdefault(str(event.get("session", "")), []).append(event)
+    return sessions
+
+
+def load_knowledge():
+    """Loads the knowledge base, keeping its status messages off stdout"""
+    import knowledge
+    with contextlib.redirect_stdout(sys.stderr):
+        return knowledge.store.current
+
+
+def replay_session(events, think=0.0):
+    """[(intent, seconds, response)] for each message of one session, on a fresh bot"""
+    from chatbot import MedicalChatbot
+
+    bot = MedicalChatbot()
+    clock = time.perf_counter
+    turns = []
+    for event in events:
+        if event.get("event", "message") == "set_diagnosis_context":
+            diseases = [tuple(d) for d in event.get("diseases", [])]
+            bot.set_diagnosis_context(diseases, event.get("symptoms", []), event.get("severity", ""))
+            continue
+        if think:
+            time.sleep(think)
+        start = clock()
+        try:
+            response = bot.get_response(event["text"])
+        except Exception as exc:
+            # Crashes are behavior too: they show up as diffs and in the error count
+            response = f"error: {type(exc).__name__}: {exc}"
+        turns.append((bot.last_intent or "error", clock() - start, response))
+    return turns
+
+
+def run(sessions, mode="threads", workers=8, think=0.0):
+    """({session: turns}, elapsed seconds), replaying up to `workers` sessions at once"""
+    load_knowledge()  # before any worker starts, so forked processes share it
+    pool = ThreadPoolExecutor if mode == "threads" else ProcessPoolExecutor
+    ids = list(sessions)
+    chunk = max(1, len(ids) // (workers * 4))
+    start = time.perf_counter()
+    with pool(workers) as executor:
+        results = executor.map(replay_session, (sessions[s] for s in ids), repeat(think), chunksize=chunk)
+        results = dict(zip(ids, results))
+    return results, time.perf_counter() - start
+
+
+# ----------------------------------------------------------
+# REPORT / BASELINE
+# ----------------------------------------------------------
+
+def summary(results, elapsed):
+    """Throughput plus latency percentiles per intent (and "all")"""
+    by_intent = {}
+    for turns in results.values():
+        for intent, seconds, _ in turns:
+            by_intent.setdefault(intent, []).append(seconds)
+    every = [s for samples in by_intent.values() for s in samples]
+    intents = {"all": summarize(every)} if every else {}
+    intents.update((intent, summarize(samples)) for intent, samples in sorted(by_intent.items()))
+    return {"sessions": len(results), "messages": len(every), "elapsed_s": round(elapsed, 3),
+            "messages_per_s": round(len(every) / elapsed, 1) if elapsed else 0.0,
+            "errors": sum(r.startswith("error: ") for turns in results.values() for _, _, r in turns),
+            "intents": intents}
+
+
+def report(stats, label):
+    print(f"{stats['messages']} messages in {stats['sessions']} sessions, {label}: "
+          f"{stats['elapsed_s']:.2f} s ({stats['messages_per_s']:.0f} msg/s), {stats['errors']} errors")
+    print(f"{'intent':12} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for intent, s in stats["intents"].items():
+        print(f"{intent:12} {s['n']:>7} {s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} {s['p99_ms']:>9.3f} {s['max_ms']:>9.3f}")
+
+
+def record(results, stats):
+    """Baseline document: the summary plus every response, per session"""
+    return {"summary": stats,
+            "responses": {sid: [[intent, response] for intent, _, response in turns]
+                          for sid, turns in results.items()}}
+
+
+def compare(results, stats, baseline, tolerance, max_diffs=10):
+    """Lines describing changed responses and per-intent p50 changes; second value is True on any"""
+    lines, failed = [], False
+    changed = 0
+    old_responses = baseline.get("responses", {})
+    for sid, turns in results.items():
+        old = old_responses.get(sid)
+        if old is None:
+            continue
+        for turn, ((intent, _, response), before) in enumerate(zip(turns, old), 1):
+            if [intent, response] == before:
+                continue
+            changed += 1
+            if changed <= max_diffs:
+                lines.append(f"session {sid} turn {turn}: {before[0]} -> {intent}")
+                lines.extend("  " + d for d in difflib.unified_diff(
+                    before[1].splitlines(), response.splitlines(), "baseline", "now", lineterm="", n=1))
+        if len(turns) != len(old):
+            changed += 1
+            lines.append(f"session {sid}: {len(old)} -> {len(turns)} turns")
+    missing = [sid for sid in old_responses if sid not in results]
+    if changed or missing:
+        failed = True
+        lines.append(f"{changed} changed responses" + (f", {len(missing)} baseline sessions not replayed" if missing else ""))
+
+    old_intents = baseline.get("summary", {}).get("intents", {})
+    for intent, s in stats["intents"].items():
+        old = old_intents.get(intent)
+        if not old or not old.get("p50_ms"):
+            continue
+        ratio = s["p50_ms"] / old["p50_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag, failed = "  REGRESSION", True
+        lines.append(f"{intent:12} p50 {old['p50_ms']:>9.3f} -> {s['p50_ms']:>9.3f} ms  x{ratio:.2f}{flag}")
+    return lines, failed
+
+
+# ----------------------------------------------------------
+# SYNTHETIC TRANSCRIPTS
+# ----------------------------------------------------------
+
+OPENERS = ["hi", "hello there", "hey"]
+FOLLOW_UPS = ["is it serious", "how do i treat it", "what should i do", "what else could it be",
+              "explain", "yes", "no", "not really"]
+CLOSERS = ["thanks", "thank you, bye", "bye"]
+
+
+def generate(kb, sessions, seed=0):
+    """Yields transcript events: patients describing a disease's symptoms, answering
+    the bot's questions and asking follow-ups; some first run a GUI diagnosis"""
+    import core
+
+    rng = random.Random(seed)
+    diseases = [d for d in kb.disease_to_symptoms if len(kb.disease_to_symptoms[d]) >= 2]
+    for n in range(sessions):
+        sid = f"s{n}"
+        disease = rng.choice(diseases)
+        labels = kb.symptom_labels(disease)
+        picked = rng.sample(labels, min(len(labels), rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            yield {"session": sid, "text": rng.choice(OPENERS)}
+        if rng.random() < 0.3:
+            symptoms = [s for s in kb.disease_to_symptoms[disease] if kb.label(s) in picked]
+            yield {"session": sid, "event": "set_diagnosis_context",
+                   "diseases": core.diagnose(symptoms, 3), "symptoms": symptoms,
+                   "severity": core.severity(len(symptoms))}
+        yield {"session": sid, "text": "i have " + " and ".join(picked)}
+        for _ in range(rng.randint(1, 4)):
+            yield {"session": sid, "text": rng.choice(FOLLOW_UPS)}
+        if rng.random() < 0.3:
+            yield {"session": sid, "text": f"what is {rng.choice(diseases).lower()}"}
+        yield {"session": sid, "text": rng.choice(CLOSERS)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent chat transcript replay and regression check")
+    parser.add_argument("transcripts", nargs="?", help="JSONL transcript file, or - for stdin")
+    parser.add_argument("--mode", choices=["threads", "processes"], default="threads")
+    parser.add_argument("--workers", type=int, default=8, help="sessions replayed at once")
+    parser.add_argument("--repeat", type=int, default=1, help="replay every session this many times (as new sessions)")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause before each message, per session")
+    parser.add_argument("--record", metavar="BASELINE", help="write responses and latencies as a baseline")
+    parser.add_argument("--baseline", metavar="BASELINE", help="diff responses and p50 latencies against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown with --baseline")
+    parser.add_argument("--max-diffs", type=int, default=10, help="changed responses shown")
+    parser.add_argument("--generate", type=int, metavar="SESSIONS", help="write synthetic transcripts to stdout instead")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        for event in generate(load_knowledge(), args.generate, args.seed):
+            print(json.dumps(event, ensure_ascii=False))
+        return
+    if not args.transcripts:
+        parser.error("a transcript file is required (or --generate)")
+
+    with contextlib.ExitStack() as stack:
+        src = sys.stdin if args.transcripts == "-" else stack.enter_context(open(args.transcripts, encoding="utf-8"))
+        sessions = read_transcripts(src)
+    originals = list(sessions.items())
+    for i in range(1, args.repeat):
+        sessions.update((f"{sid}#{i}", events) for sid, events in originals)
+
+    results, elapsed = run(sessions, args.mode, args.workers, args.think_ms / 1000)
+    stats = summary(results, elapsed)
+    report(stats, f"{args.workers} {args.mode}")
+
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump(record(results, stats), f, ensure_ascii=False, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, failed = compare(results, stats, baseline, args.tolerance, args.max_diffs)
+        print(f"\nvs {args.baseline}:")
+        print("\n".join(lines))
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Intent router for chat messages
+Every intent keyword is one branch of a single precompiled pattern, so one
+scan of the message finds every intent present (including overlapping
+keywords such as "more info on ..."). The chatbot then dispatches on the
+first intent in priority order, as before.
+
+Usage:
+    python router.py --bench       # per-message routing cost, old vs new
+"""
+
+import argparse
+import re
+import time
+
+# (intent, keywords) in priority order
+INTENTS = [
+    # "what is X" / "tell me about X" / "info on X" -- X is the rest of the line
+    ("info", ["what is ", "tell me about ", "info on ", "info about ", "information on ", "information about "]),
+    # Follow-ups on a diagnosis
+    ("related", ["what else could", "what else might", "something else", "confused with", "similar",
+                 "related", "other conditions", "alternative"]),
+    ("severity", ["serious", "severe", "bad", "dangerous", "worry"]),
+    ("treatment", ["treat", "cure", "remedy", "medicine"]),
+    ("action", ["what should i do", "what do i do", "next steps", "help"]),
+    ("explain", ["what is", "explain", "more info"]),
+    # Social
+    ("hello", ["hi", "hello", "hey"]),
+    ("bye", ["bye", "quit"]),
+    ("thanks", ["thank"]),
+    # Answers to the bot's last question ("nope" / "not really" before "no", or "no" hides them)
+    ("yes", ["yes", "yeah", "yep", "yup"]),
+    ("no", ["nope", "not really", "no"]),
+]
+
+# Social keywords are matched as words, so "hi" no longer fires inside
+# "this" or "chills" (nor "quit" inside "quite"); "goodbye" and "thanks" still count.
+# The same goes for answers: "no" is not in "nose" or "know"
+WORD_START = {"hi", "hello", "hey", "quit", "thank", "yes", "yeah", "yep", "yup", "nope", "no"}
+WORD_END = {"hi", "hello", "hey", "bye", "quit", "yes", "yeah", "yep", "yup", "nope", "no"}
+
+KEYWORDS = {}
+for _intent, _words in INTENTS:
+    for _word in _words:
+        KEYWORDS.setdefault(_word, _intent)
+
+# Plain literal alternation: the regex engine skips straight to candidate characters
+PATTERN = re.compile("|".join(re.escape(word) for word in KEYWORDS))
+
+
+def _is_word_char(c):
+    return c.isalnum() or c == "_"
+
+
+def classify(text):
+    """Intent -> end offset of its first keyword, for every intent in text"""
+    found = {}
+    m = PATTERN.search(text)
+    while m:
+        word, (start, end) = m.group(), m.span()
+        intent = KEYWORDS[word]
+        if word in WORD_START and start and _is_word_char(text[start - 1]):
+            intent = None
+        elif word in WORD_END and end < len(text) and _is_word_char(text[end]):
+            intent = None
+        elif intent == "info" and text[end:end + 1] in ("", "\n"):
+            # Nothing to look up on this line
+            intent = None
+        if intent and intent not in found:
+            found[intent] = end
+        # "what is X" also contains the explain keyword "what is"
+        if word == "what is " and "explain" not in found:
+            found["explain"] = end - 1
+        # Resume one character on, so keywords overlapping this one are found too
+        m = PATTERN.search(text, start + 1)
+    return found
+
+
+def info_query(text, found):
+    """Text after the first info keyword, up to the end of the line"""
+    return text[found["info"]:].split("\n", 1)[0].strip()
+
+
+# ----------------------------------------------------------
+# MICROBENCHMARK
+# ----------------------------------------------------------
+
+MESSAGES = [
+    "hi", "hello there", "I have chills and a headache", "this cough is bad",
+    "what is malaria", "tell me about the flu", "how do i treat it", "what should i do",
+    "is it serious", "explain", "thanks", "bye", "I feel quite sick with a fever and nausea",
+    "my stomach hurts and I keep throwing up", "can you give me more info on asthma",
+]
+
+_LEGACY = [r"(?:what is|tell me about|info(?:rmation)? (?:on|about)) (.+)",
+           r"serious|severe|bad|dangerous|worry", r"treat|cure|remedy|medicine",
+           r"what (?:should|do) i do|next steps|help", r"what is|explain|more info",
+           r"hi|hello|hey", r"bye|quit", r"thank"]
+
+
+def _legacy_route(text):
+    """The previous routing: one re.search per pattern until one matches"""
+    for p in _LEGACY:
+        if re.search(p, text):
+            return p
+    return None
+
+
+def bench(rounds=20000):
+    messages = [m.lower() for m in MESSAGES]
+    for label, route in (("sequential re.search", _legacy_route), ("single-pass router", classify)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for m in messages:
+                route(m)
+        per = (time.perf_counter() - start) / (rounds * len(messages))
+        print(f"{label:22} {per * 1e6:7.2f} us/message")
+
+    import contextlib
+    import sys
+    with contextlib.redirect_stdout(sys.stderr):
+        from chatbot import MedicalChatbot
+        bot = MedicalChatbot()
+    bot.set_diagnosis_context([("Influenza", 60.0)], ["fever"], "Moderate — Consider seeing a doctor.")
+    start = time.perf_counter()
+    for _ in range(rounds // 20):
+        for m in messages:
+            bot.get_response(m)
+    per = (time.perf_counter() - start) / (rounds // 20 * len(messages))
+    print(f"{'full get_response':22} {per * 1e6:7.2f} us/message")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chat intent router")
+    parser.add_argument("--bench", action="store_true", help="time routing per message")
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("text", nargs="*", help="messages to classify")
+    args = parser.parse_args(argv)
+    if args.bench:
+        bench(args.rounds)
+    for text in args.text:
+        print(f"{text!r}: {classify(text.lower().strip())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Shared scoring engine for the GUI and the chatbot
+Turns the knowledge base into CSR postings (symptom -> diseases) once at load
+time, so a diagnosis only touches the diseases that share a symptom with it
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+# The GUI never reports a top match below this certainty
+CONFIDENCE_FLOOR = 35.0
+
+
+def certainty_score(c, n, size):
+    """Jaccard * 70 + query coverage * 30 for c shared symptoms, n query symptoms
+    and a disease with size symptoms"""
+    jaccard = c / (n + size - c)
+    coverage = c / n
+    return round((jaccard * 70) + (coverage * 30), 1)
+
+
+class ScoringEngine:
+    def __init__(self, disease_to_symptoms):
+        # Dense integer IDs, in knowledge base order
+        self.diseases = list(disease_to_symptoms)
+        self.disease_ids = {d: i for i, d in enumerate(self.diseases)}
+        self.symptoms = []
+        self.symptom_ids = {}
+
+        # Disease -> symptom IDs, deduplicated
+        rows = []
+        for disease in self.diseases:
+            row = []
+            for s in disease_to_symptoms[disease]:
+                sid = self.symptom_ids.get(s)
+                if sid is None:
+                    sid = self.symptom_ids[s] = len(self.symptoms)
+                    self.symptoms.append(s)
+                row.append(sid)
+            rows.append(list(dict.fromkeys(row)))
+        self.sizes = array("i", (len(row) for row in rows))
+
+        # Transpose into CSR postings: diseases of symptom i are
+        # indices[indptr[i]:indptr[i + 1]], in knowledge base order
+        postings = [[] for _ in self.symptoms]
+        for did, row in enumerate(rows):
+            for sid in row:
+                postings[sid].append(did)
+        self.indptr = array("i", [0])
+        self.indices = array("i")
+        for plist in postings:
+            self.indices.extend(plist)
+            self.indptr.append(len(self.indices))
+
+        # Optional topk.ImpactIndex; rank() and diagnose() use it when set
+        self.impact = None
+
+    @classmethod
+    def from_csr(cls, diseases, disease_ids, symptom_ids, sizes, indptr, indices):
+        """Wraps ready-made CSR arrays (e.g. views into shared memory) without copying
+
+        Each argument only needs the indexing / .get() that the scoring methods use.
+        """
+        engine = cls.__new__(cls)
+        engine.diseases, engine.disease_ids, engine.symptom_ids = diseases, disease_ids, symptom_ids
+        engine.sizes, engine.indptr, engine.indices = sizes, indptr, indices
+        engine.symptoms = None
+        engine.impact = None
+        return engine
+
+    def postings(self, symptom):
+        """Disease IDs that list the symptom"""
+        sid = self.symptom_ids.get(symptom)
+        if sid is None:
+            return self.indices[0:0]
+        return self.indices[self.indptr[sid]:self.indptr[sid + 1]]
+
+    def counts(self, symptoms):
+        """Disease ID -> number of query symptoms it has, in first-seen order"""
+        # Counter does the tallying in C over the concatenated postings
+        return Counter(chain.from_iterable(self.postings(s) for s in symptoms))
+
+    def match(self, symptoms):
+        """Disease -> vote count (one vote per symptom in the list)"""
+        return {self.diseases[d]: c for d, c in self.counts(symptoms).items()}
+
+    # ⭐ JACCARD + COVERAGE BONUS ⭐
+    def certainty(self, symptoms, matches=None):
+        """Disease -> Jaccard * 70 + query coverage * 30, as used by the GUI
+
+        matches may be a precomputed match() result for the same (unique) symptoms.
+        """
+        user = list(dict.fromkeys(symptoms))
+        if not user:
+            return {}
+        if matches is None:
+            counts = self.counts(user).items()
+        else:
+            counts = ((self.disease_ids[d], c) for d, c in matches.items())
+
+        n, sizes, names = len(user), self.sizes, self.diseases
+        scores = {}
+        for d, c in counts:
+            scores[names[d]] = certainty_score(c, n, sizes[d])
+        return scores
+
+    def coverage(self, symptoms):
+        """Disease -> % of the disease's symptoms that were mentioned, as used by the chatbot"""
+        sizes, names = self.sizes, self.diseases
+        return {names[d]: round((c / sizes[d]) * 100, 1) for d, c in self.counts(symptoms).items()}
+
+    @staticmethod
+    def top_k(scores, k=3):
+        """Best k (disease, score) pairs; same order as a full stable sort, without sorting"""
+        return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+    def diagnose(self, symptoms, k=3):
+        """Top k certainty scores with the confidence floor, exactly as the GUI shows them"""
+        top = self.rank(symptoms, k)
+
+        # Confidence floor
+        if top and top[0][1] < CONFIDENCE_FLOOR:
+            top[0] = (top[0][0], CONFIDENCE_FLOOR)
+        return top
+
+    def rank(self, symptoms, k=3, method="certainty"):
+        """Top k (disease, score) pairs for a symptom list"""
+        if self.impact is not None:
+            top = self.impact.top(symptoms, k, method)
+            if top is not None:
+                return top
+        if method == "certainty":
+            return self.top_k(self.certainty(symptoms), k)
+        if method == "coverage":
+            return self.top_k(self.coverage(symptoms), k)
+        raise ValueError(f"Unknown scoring method: {method}")
+
+
+# ----------------------------------------------------------
+# LIVE RANKING (symptoms added / removed one at a time)
+# ----------------------------------------------------------
+
+class LiveRanking:
+    """Top-k for a symptom selection that changes one symptom at a time
+
+    Keeps the shared-symptom count of every candidate disease, so adding or
+    removing a symptom only walks that symptom's postings, and ranking only
+    scores the candidates. Results, including tie order, equal
+    ScoringEngine.rank/diagnose over the sorted selection (as Analyze and
+    the diagnosis cache score it).
+    """
+
+    def __init__(self, engine, symptoms=(), method="certainty"):
+        if method not in ("certainty", "coverage"):
+            raise ValueError(f"Unknown scoring method: {method}")
+        self.engine = engine
+        self.method = method
+        # Selected symptoms (ordered set) and disease ID -> shared count (> 0 only)
+        self.symptoms = {}
+        self.counts = {}
+        for s in symptoms:
+            self.add(s)
+
+    def __len__(self):
+        return len(self.symptoms)
+
+    def add(self, symptom):
+        """Adds a symptom; False if it was already selected"""
+        if symptom in self.symptoms:
+            return False
+        self.symptoms[symptom] = None
+        counts = self.counts
+        for d in self.engine.postings(symptom):
+            counts[d] = counts.get(d, 0) + 1
+        return True
+
+    def remove(self, symptom):
+        """Removes a symptom; False if it was not selected"""
+        if symptom not in self.symptoms:
+            return False
+        del self.symptoms[symptom]
+        counts = self.counts
+        for d in self.engine.postings(symptom):
+            c = counts[d] - 1
+            if c:
+                counts[d] = c
+            else:
+                del counts[d]
+        return True
+
+    def update(self, symptoms):
+        """Adds / removes whatever differs from the given selection"""
+        wanted = dict.fromkeys(symptoms)
+        for s in [s for s in self.symptoms if s not in wanted]:
+            self.remove(s)
+        for s in wanted:
+            self.add(s)
+
+    def clear(self):
+        self.symptoms.clear()
+        self.counts.clear()
+
+    def top(self, k=3, floor=True):
+        """Best k (disease, score) pairs; with floor, the certainty confidence
+        floor is applied as in ScoringEngine.diagnose"""
+        n, sizes = len(self.symptoms), self.engine.sizes
+        if self.method == "certainty":
+            score = lambda item: certainty_score(item[1], n, sizes[item[0]])
+        else:
+            score = lambda item: round((item[1] / sizes[item[0]]) * 100, 1)
+
+        if k <= 0 or not self.counts:
+            return []
+        # Size-k heap over the candidates for the k-th best score, then only
+        # the candidates reaching it are put in order
+        cutoff = heapq.nlargest(k, map(score, self.counts.items()))[-1]
+        best = [(sc, d) for sc, d in zip(map(score, self.counts.items()), self.counts) if sc >= cutoff]
+        order = sorted(self.symptoms)
+        best.sort(key=lambda x: (-x[0], self._first(x[1], order), x[1]))
+        top = [(self.engine.diseases[d], sc) for sc, d in best[:k]]
+        if floor and self.method == "certainty" and top and top[0][1] < CONFIDENCE_FLOOR:
+            top[0] = (top[0][0], CONFIDENCE_FLOOR)
+        return top
+
+    def _first(self, d, order):
+        """Position in order of the first symptom disease d has: ties between
+        equal scores break on it, then on disease ID, as ScoringEngine.rank"""
+        for i, s in enumerate(order):
+            plist = self.engine.postings(s)
+            j = bisect_left(plist, d)
+            if j < len(plist) and plist[j] == d:
+                return i
+        return len(order)
@@ -0,0 +1,49 @@
+"""
+Substring search over the symptom vocabulary for the GUI search box
+An n-gram index narrows a query to a few candidates instead of testing every
+symptom, and a query that extends the previous one only re-filters the
+previous matches.
+"""
+
+from array import array
+
+# Longest gram indexed; shorter grams cover 1-2 character queries
+GRAM = 3
+
+
+class SubstringIndex:
+    def __init__(self, items):
+        # Items keep their order, so results come back in the same order
+        self.items = list(items)
+        self.lowered = [item.lower() for item in self.items]
+        self.grams = {}
+        for i, text in enumerate(self.lowered):
+            grams = {text[j:j + n] for n in range(1, GRAM + 1) for j in range(len(text) - n + 1)}
+            for g in grams:
+                postings = self.grams.get(g)
+                if postings is None:
+                    postings = self.grams[g] = array("i")
+                postings.append(i)
+
+        # Last query and the IDs it matched
+        self.last_term = None
+        self.last_ids = None
+
+    def _candidates(self, term):
+        # Results for a longer query are a subset of the previous results
+        if self.last_term is not None and self.last_term in term:
+            return self.last_ids
+        n = min(GRAM, len(term))
+        grams = {term[j:j + n] for j in range(len(term) - n + 1)}
+        return min((self.grams.get(g, ()) for g in grams), key=len)
+
+    def search(self, term):
+        """Items containing term (case-insensitive), in item order"""
+        term = term.lower()
+        if not term:
+            return list(self.items)
+
+        lowered = self.lowered
+        ids = [i for i in self._candidates(term) if term in lowered[i]]
+        self.last_term, self.last_ids = term, ids
+        return [self.items[i] for i in ids]
@@ -0,0 +1,426 @@
+"""
+Multi-session chat service (asyncio, stdlib only)
+Hosts many MedicalChatbot conversations behind a small HTTP/JSON API.
+Every session shares the one knowledge base in knowledge.store and keeps
+only its own context dict; idle sessions expire (TTL) and the least recently
+used are evicted past the session or memory cap.
+
+Usage:
+    python service.py --port 8080
+    python service.py --bench 200          # load-test on localhost with 200 clients
+
+Endpoints:
+    POST   /sessions                      -> {"session_id": ...}
+    POST   /sessions/<id>/messages        {"text": ...} -> {"reply": ...}
+    POST   /sessions/<id>/diagnosis       {"diseases": [[name, score], ...], "symptoms": [...], "severity": ...}
+    POST   /diagnose                      {"symptoms": [...], "k": 3} -> {"results": [[name, score], ...]}
+                                          (micro-batched, see microbatch.py; 503 while its queue is full)
+    DELETE /sessions/<id>
+    GET    /stats, GET /health
+    GET    /metrics (Prometheus text), GET /metrics.json
+    POST   /metrics                       {"enabled": true, "slow_ms": 50} -> toggles instrumentation
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import traceback
+import uuid
+import weakref
+from collections import OrderedDict
+
+import knowledge
+import metrics
+import microbatch
+from batch import normalize
+from chatbot import MedicalChatbot
+
+MAX_BODY = 64 * 1024
+MAX_K = 50
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+def new_context():
+    return {"mentioned_symptoms": [], "last_disease": None, "last_diagnosis": None, "severity": None,
+            "denied_symptoms": [], "pending_question": None}
+
+
+def context_size(context):
+    """Rough byte size of a context: the dict plus its strings and lists"""
+    size = sys.getsizeof(context)
+    for value in context.values():
+        size += sys.getsizeof(value)
+        if isinstance(value, (list, tuple)):
+            size += sum(sys.getsizeof(v) for v in value)
+    return size
+
+
+class SessionStore:
+    """Session id -> context, kept in least-recently-used order"""
+
+    def __init__(self, max_sessions=10000, ttl=1800, max_memory=64 * 1024 * 1024, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.clock = clock
+        # id -> [context, last_seen, size]; oldest first
+        self._sessions = OrderedDict()
+        self.memory = 0
+        self.created = self.expired = self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self):
+        sid = uuid.uuid4().hex
+        context = new_context()
+        size = context_size(context)
+        self._sessions[sid] = [context, self.clock(), size]
+        self.memory += size
+        self.created += 1
+        self._enforce_limits()
+        return sid
+
+    def get(self, sid):
+        """Returns the session's context (marking it used), or None if unknown/expired"""
+        entry = self._sessions.get(sid)
+        if entry is None:
+            return None
+        now = self.clock()
+        if now - entry[1] > self.ttl:
+            self._remove(sid)
+            self.expired += 1
+            return None
+        entry[1] = now
+        self._sessions.move_to_end(sid)
+        return entry[0]
+
+    def touch(self, sid):
+        """Re-measures a session after its context changed"""
+        entry = self._sessions.get(sid)
+        if entry is not None:
+            size = context_size(entry[0])
+            self.memory += size - entry[2]
+            entry[2] = size
+            self._enforce_limits()
+
+    def delete(self, sid):
+        return self._remove(sid) is not None
+
+    def sweep(self):
+        """Drops expired sessions; they sit at the front since order is by last use"""
+        cutoff = self.clock() - self.ttl
+        while self._sessions:
+            sid, entry = next(iter(self._sessions.items()))
+            if entry[1] >= cutoff:
+                break
+            self._remove(sid)
+            self.expired += 1
+
+    def _remove(self, sid):
+        entry = self._sessions.pop(sid, None)
+        if entry is not None:
+            self.memory -= entry[2]
+        return entry
+
+    def _enforce_limits(self):
+        while self._sessions and (len(self._sessions) > self.max_sessions or self.memory > self.max_memory):
+            self._remove(next(iter(self._sessions)))
+            self.evicted += 1
+
+    def stats(self):
+        return {"sessions": len(self._sessions), "memory_bytes": self.memory,
+                "created": self.created, "expired": self.expired, "evicted": self.evicted}
+
+
+def _is_scored(pair):
+    """[name, score] as sent by the GUI (bool is not a score)"""
+    return (isinstance(pair, list) and len(pair) == 2 and isinstance(pair[0], str)
+            and isinstance(pair[1], (int, float)) and not isinstance(pair[1], bool))
+
+
+def _turn(context, text):
+    """(reply, knowledge version) for one chat turn; a bot is just a view over
+    the stored context for this one call"""
+    bot = MedicalChatbot(context)
+    return bot.get_response(text), bot.kb.version
+
+
+class ChatService:
+    def __init__(self, sessions=None, batcher=None):
+        self.sessions = sessions or SessionStore()
+        self.batcher = batcher or microbatch.MicroBatcher(microbatch.diagnose_batch, name="diagnose")
+        self.requests = 0
+        # Session id -> lock held while a request changes its context; a
+        # session's turns run one at a time, other sessions' concurrently
+        self.turns = weakref.WeakValueDictionary()
+
+    # ---------------- ROUTES ----------------
+    async def route(self, method, path, body):
+        """dispatch() or diagnose(); a bug in either becomes a 500, not a dropped connection"""
+        try:
+            if method == "POST" and path.split("?")[0].rstrip("/") == "/diagnose":
+                return await self.diagnose(body)
+            return await self.dispatch(method, path, body)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            metrics.count("service.errors")
+            return 500, {"error": "internal error"}
+
+    async def dispatch(self, method, path, body):
+        """Returns (status, payload) for one request. Chat turns run on the
+        loop's executor: a turn may load or reload the knowledge base, or
+        build an index on first use, and must not stall other sessions"""
+        self.requests += 1
+        parts = [p for p in path.split("?")[0].split("/") if p]
+
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok", "knowledge_version": knowledge.store.current.version}
+        if parts == ["stats"] and method == "GET":
+            return 200, dict(self.sessions.stats(), requests=self.requests,
+                             knowledge_version=knowledge.store.current.version,
+                             diagnosis_cache=knowledge.store.diagnoses.stats(),
+                             diagnose_batches=self.batcher.stats())
+        if parts == ["metrics"] and method == "GET":
+            return 200, metrics.registry.prometheus()
+        if parts == ["metrics.json"] and method == "GET":
+            return 200, metrics.registry.snapshot()
+        if parts == ["metrics"] and method == "POST":
+            return self.configure_metrics(body)
+        if parts == ["sessions"] and method == "POST":
+            return 201, {"session_id": self.sessions.create()}
+        if len(parts) < 2 or parts[0] != "sessions":
+            return 404, {"error": "not found"}
+
+        sid = parts[1]
+        if len(parts) == 2 and method == "DELETE":
+            return (200, {"deleted": True}) if self.sessions.delete(sid) else (404, {"error": "unknown session"})
+
+        context = self.sessions.get(sid)
+        if context is None:
+            return 404, {"error": "unknown or expired session"}
+        if len(parts) != 3 or method != "POST":
+            return 405, {"error": "method not allowed"}
+
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        if not isinstance(data, dict):
+            return 400, {"error": "expected a JSON object"}
+
+        if parts[2] == "messages":
+            text = data.get("text")
+            if not isinstance(text, str):
+                return 400, {"error": "'text' is required"}
+            async with self.turns.setdefault(sid, asyncio.Lock()):
+                reply, version = await asyncio.get_running_loop().run_in_executor(None, _turn, context, text)
+            self.sessions.touch(sid)
+            return 200, {"reply": reply, "knowledge_version": version}
+        if parts[2] == "diagnosis":
+            diseases, symptoms, severity = data.get("diseases", []), data.get("symptoms", []), data.get("severity", "")
+            if not isinstance(diseases, list) or not all(_is_scored(d) for d in diseases):
+                return 400, {"error": "'diseases' must be a list of [name, score] pairs"}
+            if not isinstance(symptoms, list) or not all(isinstance(s, str) for s in symptoms):
+                return 400, {"error": "'symptoms' must be a list of strings"}
+            if not isinstance(severity, str):
+                return 400, {"error": "'severity' must be a string"}
+            async with self.turns.setdefault(sid, asyncio.Lock()):
+                MedicalChatbot(context).set_diagnosis_context([tuple(d) for d in diseases], symptoms, severity)
+            self.sessions.touch(sid)
+            return 200, {"ok": True}
+        return 404, {"error": "not found"}
+
+    async def diagnose(self, body):
+        """POST /diagnose: one symptom set, scored in a batch with concurrent requests"""
+        self.requests += 1
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        if not isinstance(data, dict):
+            return 400, {"error": "expected a JSON object"}
+        symptoms, k = data.get("symptoms"), data.get("k", 3)
+        if not isinstance(symptoms, list) or not all(isinstance(s, str) for s in symptoms):
+            return 400, {"error": "'symptoms' must be a list of strings"}
+        if not isinstance(k, int) or not 1 <= k <= MAX_K:
+            return 400, {"error": f"'k' must be an integer from 1 to {MAX_K}"}
+        try:
+            future = self.batcher.submit((normalize(symptoms), k))
+        except microbatch.Overloaded:
+            return 503, {"error": "overloaded, retry later"}
+        results = await asyncio.wrap_future(future)
+        return 200, {"results": results, "knowledge_version": knowledge.store.current.version}
+
+    def configure_metrics(self, body):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        if not isinstance(data, dict):
+            return 400, {"error": "expected a JSON object"}
+        if "enabled" in data:
+            metrics.enable() if data["enabled"] else metrics.disable()
+        if "slow_ms" in data:
+            slow = data["slow_ms"]
+            metrics.registry.profile_slow(slow / 1000 if slow else None)
+        return 200, {"enabled": metrics.registry.enabled}
+
+    # ---------------- HTTP ----------------
+    async def handle(self, reader, writer):
+        """Serves HTTP/1.1 requests (keep-alive) on one connection"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    status, payload, body = 413, {"error": "body too large"}, None
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.route(method, target, body)
+
+                keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                              and body is not None)
+                if isinstance(payload, str):
+                    data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                        f"Content-Type: {content_type}\r\nContent-Length: {len(data)}\r\n")
+                if not keep_alive:
+                    head += "Connection: close\r\n"
+                writer.write(head.encode("latin-1") + b"\r\n" + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def sweep_forever(self):
+        while True:
+            await asyncio.sleep(max(self.sessions.ttl / 4, 1))
+            self.sessions.sweep()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        sweeper = asyncio.create_task(self.sweep_forever())
+        return server, sweeper
+
+
+# ----------------------------------------------------------
+# LOCALHOST LOAD TEST
+# ----------------------------------------------------------
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+                 .encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        if h.lower().startswith(b"content-length:"):
+            length = int(h.split(b":")[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def bench(clients, turns, host="127.0.0.1", port=0):
+    # Loaded up front, as the server does, so the first turns are not timed loading it
+    knowledge.store.current
+    service = ChatService()
+    server, sweeper = await service.serve(host, port)
+    port = server.sockets[0].getsockname()[1]
+    messages = ["hi", "I have a fever and a cough", "hedache and nausea",
+                "what is malaria", "how do i treat it", "thanks"]
+    latencies = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        _, created = await _request(reader, writer, "POST", "/sessions")
+        path = f"/sessions/{created['session_id']}/messages"
+        for i in range(turns):
+            start = time.perf_counter()
+            await _request(reader, writer, "POST", path, {"text": messages[i % len(messages)]})
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    sweeper.cancel()
+    server.close()
+    await server.wait_closed()
+
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{len(latencies)} messages from {clients} sessions in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} msg/s)")
+    print(f"latency p50 {pct(0.5):.2f} ms, p95 {pct(0.95):.2f} ms, p99 {pct(0.99):.2f} ms")
+    print(service.sessions.stats())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-session medical chat service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--ttl", type=float, default=1800, help="idle seconds before a session expires")
+    parser.add_argument("--max-memory", type=int, default=64, help="session memory cap in MiB")
+    parser.add_argument("--batch-size", type=int, default=64, help="most /diagnose requests scored together")
+    parser.add_argument("--batch-ms", type=float, default=2.0, help="longest a /diagnose request waits for its batch")
+    parser.add_argument("--max-queue", type=int, default=1024, help="queued /diagnose requests before 503s")
+    parser.add_argument("--metrics", action="store_true", help="enable instrumentation at startup")
+    parser.add_argument("--slow-ms", type=float, help="profile requests slower than this")
+    parser.add_argument("--bench", type=int, metavar="CLIENTS", help="run a localhost load test instead")
+    parser.add_argument("--turns", type=int, default=20, help="messages per client in --bench")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    if args.slow_ms:
+        metrics.registry.profile_slow(args.slow_ms / 1000)
+
+    if args.bench:
+        asyncio.run(bench(args.bench, args.turns, args.host))
+        return
+
+    async def run():
+        # Loaded before the first request, not by it (see dispatch)
+        version = knowledge.store.current.version
+        batcher = microbatch.MicroBatcher(microbatch.diagnose_batch, args.batch_size, args.batch_ms / 1000,
+                                          args.max_queue, name="diagnose")
+        service = ChatService(SessionStore(args.max_sessions, args.ttl, args.max_memory * 1024 * 1024), batcher)
+        server, _ = await service.serve(args.host, args.port)
+        knowledge.store.start_watching()
+        print(f"Serving knowledge version {version} on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Shared-memory knowledge base for multi-process worker pools
+The parent writes the knowledge base once as a flat snapshot (snapshot.py
+layout) in shared memory; every worker mmaps it read-only. Lookups decode
+strings straight from the mapping, so the big tables are never copied into
+per-process dicts and reference counting never dirties their pages.
+
+Usage:
+    path = shared.publish()          # in the parent, before starting workers
+    # workers: `import knowledge` attaches automatically (env var), or
+    kb = shared.attach(path)
+
+    python shared.py --bench 1 2 4 8   # RSS / startup per worker, private vs shared
+"""
+
+import argparse
+import mmap
+import os
+import tempfile
+import time
+from array import array
+from collections.abc import Mapping
+
+import snapshot
+from graph import Treatment
+
+
+class SharedSnapshot:
+    """Read-only mmap of a snapshot file with string and binary-search helpers"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header, self.a, blob = snapshot.parse_layout(memoryview(self.mm))
+        self.blob_start = len(self.mm) - self.header["blob_len"]
+        blob.release()
+
+    def raw(self, sid):
+        offsets = self.a["offsets"]
+        return self.mm[self.blob_start + offsets[sid]:self.blob_start + offsets[sid + 1]]
+
+    def string(self, sid):
+        return self.raw(sid).decode("utf-8")
+
+    def graph(self):
+        """KnowledgeGraph.from_rows over the mapped disease rows, for whole-graph
+        indexes (triage, related): int32 IDs in process memory, names decoded
+        from the mapping on demand. Symptoms are numbered by first appearance
+        walking the diseases, as the in-memory graph numbers them"""
+        from graph import KnowledgeGraph
+
+        a = self.a
+        # String ID -> symptom ID, and back
+        rank = {}
+        indices = array("i", (rank.setdefault(j, len(rank)) for j in a["edges"]))
+        order = array("I", rank)
+        symptom_table = a["symptoms"]
+        d2s, s2d = DiseaseSymptoms(self), SymptomDiseases(self)
+
+        def symptom_id(name):
+            i = s2d._find(name) if isinstance(name, str) else None
+            return None if i is None else rank.get(symptom_table[i])
+
+        return KnowledgeGraph.from_rows(_View(d2s._key, len(d2s)), _View(d2s._find),
+                                        _View(lambda r: self.string(order[r]), len(order)), _View(symptom_id),
+                                        array("i", a["indptr"]), indices)
+
+    def bisect(self, key, order, sid_at):
+        """Position in order whose string equals key, or None (order is sorted by bytes)"""
+        target = key.encode("utf-8")
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(sid_at(order[mid])) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and self.raw(sid_at(order[lo])) == target:
+            return order[lo]
+        return None
+
+
+class _Identity:
+    """order[i] == i, for tables that are already sorted"""
+
+    def __init__(self, n):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return i
+
+
+class _View:
+    """Read-only sequence/lookup backed by a function"""
+
+    def __init__(self, getter, length=0):
+        self.getter = getter
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        value = self.getter(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self.getter(key)
+        return default if value is None else value
+
+
+# ----------------------------------------------------------
+# MAPPING VIEWS (same interface as the knowledge dicts)
+# ----------------------------------------------------------
+
+class _FlatMapping(Mapping):
+    def __init__(self, snap, n):
+        self.snap = snap
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return (self._key(i) for i in range(self.n))
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            raise KeyError(key)
+        i = self._find(key)
+        if i is None:
+            raise KeyError(key)
+        return self._value(i)
+
+
+class DiseaseSymptoms(_FlatMapping):
+    def __init__(self, snap):
+        super().__init__(snap, snap.header["n_diseases"])
+        self.names, self.indptr, self.edges = snap.a["names"], snap.a["indptr"], snap.a["edges"]
+
+    def _key(self, i):
+        return self.snap.string(self.names[i])
+
+    def _find(self, disease):
+        return self.snap.bisect(disease, self.snap.a["disease_order"], self.names.__getitem__)
+
+    def _value(self, i):
+        return [self.snap.string(j) for j in self.edges[self.indptr[i]:self.indptr[i + 1]]]
+
+
+class SymptomDiseases(_FlatMapping):
+    def __init__(self, snap):
+        super().__init__(snap, snap.header["n_symptoms"])
+        self.symptoms, self.ptr, self.postings = snap.a["symptoms"], snap.a["post_ptr"], snap.a["postings"]
+        self.names = snap.a["names"]
+
+    def _key(self, i):
+        return self.snap.string(self.symptoms[i])
+
+    def _find(self, symptom):
+        return self.snap.bisect(symptom, _Identity(self.n), self.symptoms.__getitem__)
+
+    def _value(self, i):
+        return [self.snap.string(self.names[d]) for d in self.postings[self.ptr[i]:self.ptr[i + 1]]]
+
+
+class DiseaseInfo(_FlatMapping):
+    def __init__(self, snap):
+        super().__init__(snap, snap.header["n_info"])
+        self.info = snap.a["info"]
+
+    def _key(self, i):
+        return self.snap.string(self.info[2 * i])
+
+    def _find(self, disease):
+        return self.snap.bisect(disease, self.snap.a["info_order"], lambda i: self.info[2 * i])
+
+    def _value(self, i):
+        return self.snap.string(self.info[2 * i + 1])
+
+
+class DiseaseTreatments(_FlatMapping):
+    def __init__(self, snap):
+        super().__init__(snap, snap.header["n_treat"])
+        self.names, self.ptr, self.precs = snap.a["treat_names"], snap.a["prec_ptr"], snap.a["precs"]
+
+    def _key(self, i):
+        return self.snap.string(self.names[i])
+
+    def _find(self, disease):
+        return self.snap.bisect(disease, self.snap.a["treat_order"], self.names.__getitem__)
+
+    def _value(self, i):
+        return Treatment([self.snap.string(j) for j in self.precs[self.ptr[i]:self.ptr[i + 1]]])
+
+
+def attach(path):
+    """KnowledgeBase whose tables and scoring postings live in the mmap'd file"""
+    from knowledge import KnowledgeBase
+    from scoring import ScoringEngine
+
+    snap = SharedSnapshot(path)
+    d2s, s2d = DiseaseSymptoms(snap), SymptomDiseases(snap)
+    indptr = snap.a["indptr"]
+
+    engine = ScoringEngine.from_csr(
+        diseases=_View(d2s._key, len(d2s)),
+        disease_ids=_View(d2s._find),
+        symptom_ids=_View(s2d._find),
+        sizes=_View(lambda d: indptr[d + 1] - indptr[d], len(d2s)),
+        indptr=snap.a["post_ptr"],
+        indices=snap.a["postings"],
+    )
+    kb = KnowledgeBase(d2s, DiseaseInfo(snap), DiseaseTreatments(snap),
+                       symptom_to_diseases=s2d, scoring_engine=engine)
+    kb.shared_path = path
+    kb.snapshot = snap
+    return kb
+
+
+def publish(kb=None, directory=None):
+    """Writes kb (default: the current one) to shared memory and exports its path
+    to child processes; returns the path"""
+    import knowledge
+
+    kb = kb or knowledge.store.current
+    directory = directory or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+    path = os.path.join(directory, f"symptom-kb-{os.getpid()}-v{kb.version}.snapshot")
+    snapshot.write_snapshot(path, dict(kb.disease_to_symptoms), dict(kb.disease_info),
+                            dict(kb.disease_treatments))
+    os.environ[knowledge.SHARED_ENV] = path
+    return path
+
+
+# ----------------------------------------------------------
+# WORKER POOL MEASUREMENT
+# ----------------------------------------------------------
+
+def memory_kib():
+    """(RSS, PSS) of this process in KiB; PSS splits shared pages between users"""
+    rss = pss = 0
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        import resource
+        rss = pss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss, pss
+
+
+def _worker(ready, results):
+    import contextlib
+    import sys
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        import knowledge
+        from chatbot import MedicalChatbot
+        kb = knowledge.store.current
+    kb.scoring_engine.diagnose(["fever", "cough", "headache"])
+    MedicalChatbot().get_response("i have a fever and a cough")
+    startup = time.perf_counter() - start
+    results.put((startup,) + memory_kib())
+    # Stay alive until every worker has measured, so shared pages are shared
+    ready.wait()
+
+
+def bench(counts):
+    import contextlib
+    import multiprocessing
+    import sys
+
+    ctx = multiprocessing.get_context("spawn")
+    with contextlib.redirect_stdout(sys.stderr):
+        import knowledge
+        path = publish()
+    del os.environ[knowledge.SHARED_ENV]
+
+    print(f"{'mode':8} {'workers':>7} {'startup ms':>11} {'RSS KiB':>9} {'PSS KiB':>9}")
+    for mode in ("private", "shared"):
+        for n in counts:
+            if mode == "shared":
+                os.environ[knowledge.SHARED_ENV] = path
+            ready, results = ctx.Event(), ctx.Queue()
+            procs = [ctx.Process(target=_worker, args=(ready, results)) for _ in range(n)]
+            with contextlib.redirect_stdout(sys.stderr):
+                for p in procs:
+                    p.start()
+                samples = [results.get() for _ in procs]
+            ready.set()
+            for p in procs:
+                p.join()
+            os.environ.pop(knowledge.SHARED_ENV, None)
+
+            avg = [sum(col) / n for col in zip(*samples)]
+            print(f"{mode:8} {n:>7} {avg[0] * 1000:>11.1f} {avg[1]:>9.0f} {avg[2]:>9.0f}")
+    os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared-memory knowledge base tools")
+    parser.add_argument("--bench", type=int, nargs="+", metavar="N", default=[1, 2, 4, 8],
+                        help="worker counts to measure")
+    args = parser.parse_args(argv)
+    bench(args.bench)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Precompiled binary knowledge snapshot
+Stores the parsed CSVs as interned string IDs + fixed-width offset arrays
+(4-byte aligned, so the file can also be mmap'd), so startup skips csv
+parsing. knowledge.py loads it when it is newer than every CSV.
+
+Usage:
+    python snapshot.py          # compile knowledge.snapshot and report load times
+
+Layout (native byte order, every integer is a uint32):
+    magic (8 bytes) | header: version, n_strings, blob_len, n_diseases,
+    n_edges, n_info, n_treat, n_prec, n_symptoms, n_postings
+    string offsets[n_strings + 1]
+    disease names[n_diseases]        string IDs
+    symptom indptr[n_diseases + 1]   CSR offsets into symptom IDs
+    symptom IDs[n_edges]
+    info pairs[2 * n_info]           (disease ID, description ID)
+    treatment names[n_treat]
+    precaution indptr[n_treat + 1]
+    precaution IDs[n_prec]
+    symptoms[n_symptoms]             string IDs sorted by UTF-8 bytes
+    postings indptr[n_symptoms + 1]  CSR offsets into disease indexes
+    postings[n_postings]             disease indexes, in disease order
+    disease order[n_diseases]        disease indexes sorted by name
+    info order[n_info]               info pair indexes sorted by disease name
+    treatment order[n_treat]         treatment indexes sorted by disease name
+    string blob[blob_len]            UTF-8
+
+The sorted sections let shared.py answer lookups straight from an mmap'd
+file (binary search) without building any dicts.
+"""
+
+import os
+import sys
+import time
+from array import array
+
+from graph import Treatment
+
+MAGIC = b"SYMKB" + (b"L" if sys.byteorder == "little" else b"B") + b"\0\0"
+VERSION = 2
+HEADER = ("version", "n_strings", "blob_len", "n_diseases", "n_edges",
+          "n_info", "n_treat", "n_prec", "n_symptoms", "n_postings")
+
+
+def sections(h):
+    """(name, uint32 count) of each array section, in file order"""
+    return [("offsets", h["n_strings"] + 1), ("names", h["n_diseases"]),
+            ("indptr", h["n_diseases"] + 1), ("edges", h["n_edges"]),
+            ("info", 2 * h["n_info"]), ("treat_names", h["n_treat"]),
+            ("prec_ptr", h["n_treat"] + 1), ("precs", h["n_prec"]),
+            ("symptoms", h["n_symptoms"]), ("post_ptr", h["n_symptoms"] + 1),
+            ("postings", h["n_postings"]), ("disease_order", h["n_diseases"]),
+            ("info_order", h["n_info"]), ("treat_order", h["n_treat"])]
+
+
+def parse_layout(view):
+    """Splits a snapshot buffer into (header, {section: uint32 view}, blob view)"""
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("not a knowledge snapshot (or wrong byte order)")
+    pos = len(MAGIC)
+    header = dict(zip(HEADER, view[pos:pos + 4 * len(HEADER)].cast("I")))
+    if header["version"] != VERSION:
+        raise ValueError(f"unsupported snapshot version {header['version']}")
+    pos += 4 * len(HEADER)
+
+    arrays = {}
+    for name, n in sections(header):
+        arrays[name] = view[pos:pos + 4 * n].cast("I")
+        pos += 4 * n
+    blob = view[pos:pos + header["blob_len"]]
+    if len(blob) != header["blob_len"]:
+        raise ValueError("truncated snapshot")
+    return header, arrays, blob
+
+
+def is_fresh(path, sources):
+    """True if the snapshot exists and is newer than every existing source file"""
+    try:
+        built = os.path.getmtime(path)
+    except OSError:
+        return False
+    return all(built >= os.path.getmtime(s) for s in sources if os.path.exists(s))
+
+
+def write_snapshot(path, disease_to_symptoms, disease_info, disease_treatments):
+    """Writes the three knowledge dicts to path atomically"""
+    strings, ids = [], {}
+
+    def intern(s):
+        sid = ids.get(s)
+        if sid is None:
+            sid = ids[s] = len(strings)
+            strings.append(s)
+        return sid
+
+    names = array("I", (intern(d) for d in disease_to_symptoms))
+    indptr, edges = array("I", [0]), array("I")
+    for symptoms in disease_to_symptoms.values():
+        edges.extend(intern(s) for s in symptoms)
+        indptr.append(len(edges))
+
+    info = array("I")
+    for d, desc in disease_info.items():
+        info.extend((intern(d), intern(desc)))
+
+    treat_names, prec_ptr, precs = array("I"), array("I", [0]), array("I")
+    for d, t in disease_treatments.items():
+        treat_names.append(intern(d))
+        precs.extend(intern(p) for p in t.precautions)
+        prec_ptr.append(len(precs))
+
+    # Symptom -> disease postings over a name-sorted symptom table
+    disease_index = {d: i for i, d in enumerate(disease_to_symptoms)}
+    postings_by_symptom = {}
+    for d, symptoms in disease_to_symptoms.items():
+        for s in symptoms:
+            postings_by_symptom.setdefault(s, []).append(disease_index[d])
+    sorted_symptoms = sorted(postings_by_symptom, key=lambda s: s.encode("utf-8"))
+    symptom_table, post_ptr, postings = array("I"), array("I", [0]), array("I")
+    for s in sorted_symptoms:
+        symptom_table.append(intern(s))
+        postings.extend(postings_by_symptom[s])
+        post_ptr.append(len(postings))
+
+    by_name = lambda keys: array("I", sorted(range(len(keys)), key=lambda i: keys[i].encode("utf-8")))
+    disease_order = by_name(list(disease_to_symptoms))
+    info_order = by_name(list(disease_info))
+    treat_order = by_name(list(disease_treatments))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array("I", [0])
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+    blob = b"".join(encoded)
+
+    counts = {"version": VERSION, "n_strings": len(strings), "blob_len": len(blob),
+              "n_diseases": len(names), "n_edges": len(edges), "n_info": len(disease_info),
+              "n_treat": len(treat_names), "n_prec": len(precs),
+              "n_symptoms": len(symptom_table), "n_postings": len(postings)}
+    header = array("I", [counts[f] for f in HEADER])
+    arrays = {"offsets": offsets, "names": names, "indptr": indptr, "edges": edges, "info": info,
+              "treat_names": treat_names, "prec_ptr": prec_ptr, "precs": precs,
+              "symptoms": symptom_table, "post_ptr": post_ptr, "postings": postings,
+              "disease_order": disease_order, "info_order": info_order, "treat_order": treat_order}
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        header.tofile(f)
+        for name, _ in sections(counts):
+            arrays[name].tofile(f)
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path):
+    """Returns (disease_to_symptoms, disease_info, disease_treatments) from a snapshot"""
+    with open(path, "rb") as f:
+        data = f.read()
+    header, a, blob = parse_layout(memoryview(data))
+    offsets = a["offsets"]
+    strings = [str(blob[offsets[i]:offsets[i + 1]], "utf-8") for i in range(header["n_strings"])]
+
+    names, indptr, edges = a["names"], a["indptr"], a["edges"]
+    disease_to_symptoms = {
+        strings[names[i]]: [strings[j] for j in edges[indptr[i]:indptr[i + 1]]]
+        for i in range(header["n_diseases"])
+    }
+    info = a["info"]
+    disease_info = {strings[info[2 * i]]: strings[info[2 * i + 1]] for i in range(header["n_info"])}
+    treat_names, prec_ptr, precs = a["treat_names"], a["prec_ptr"], a["precs"]
+    disease_treatments = {
+        strings[treat_names[i]]: Treatment([strings[j] for j in precs[prec_ptr[i]:prec_ptr[i + 1]]])
+        for i in range(header["n_treat"])
+    }
+    return disease_to_symptoms, disease_info, disease_treatments
+
+
+def main():
+    import knowledge
+
+    start = time.perf_counter()
+    kb = knowledge.parse_csvs()
+    parse_time = time.perf_counter() - start
+
+    write_snapshot(knowledge.snapshot_path, *kb)
+
+    start = time.perf_counter()
+    loaded = read_snapshot(knowledge.snapshot_path)
+    load_time = time.perf_counter() - start
+    assert loaded == kb, "snapshot round trip mismatch"
+
+    size = os.path.getsize(knowledge.snapshot_path)
+    print(f"Wrote {knowledge.snapshot_path} ({size / 1024:.1f} KiB)")
+    print(f"CSV parse: {parse_time * 1000:.1f} ms, snapshot load: {load_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
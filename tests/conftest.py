@@ -0,0 +1,55 @@
+import contextlib
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def kb():
+    """The bundled knowledge base (dataset.csv and friends)"""
+    import knowledge
+    with contextlib.redirect_stdout(sys.stderr):
+        return knowledge.store.current
+
+
+@pytest.fixture(scope="session")
+def selections(kb):
+    """Random symptom selections of 1-6 known symptoms"""
+    rng = random.Random(0)
+    symptoms = sorted(kb.symptom_to_diseases)
+    return [rng.sample(symptoms, rng.randint(1, 6)) for _ in range(500)]
+
+
+@pytest.fixture(scope="session")
+def sqlite_kb(tmp_path_factory):
+    """The bundled knowledge base served from a SQLite file (see database.py)"""
+    import database
+    import knowledge
+    path = str(tmp_path_factory.mktemp("db") / "knowledge.db")
+    with contextlib.redirect_stdout(sys.stderr):
+        return database.load(path, [knowledge.csv_path, knowledge.desc_path, knowledge.prec_path])
+
+
+@pytest.fixture(scope="session")
+def shared_kb(kb, tmp_path_factory):
+    """The bundled knowledge base mmap'd from a shared snapshot (see shared.py)"""
+    import knowledge
+    import shared
+    path = shared.publish(kb, str(tmp_path_factory.mktemp("shm")))
+    # Only this process attaches; nothing else should inherit it
+    del os.environ[knowledge.SHARED_ENV]
+    return shared.attach(path)
+
+
+@pytest.fixture(scope="session")
+def generated(tmp_path_factory):
+    """disease_to_symptoms of a generated knowledge base (see bench.generate), big
+    enough for the impact-ordered top-k and the bitset batch scorer to engage"""
+    import bench
+    import knowledge
+    paths = bench.generate(str(tmp_path_factory.mktemp("generated")), 60_000)
+    return knowledge.read_symptoms(paths[0])
@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from chatbot import SYNONYMS
+from matcher import SymptomMatcher
+
+
+def test_scan_matches_in_memory_matcher(kb, sqlite_kb):
+    ref = SymptomMatcher(kb.symptom_to_diseases, SYNONYMS)
+    sql = database.SQLiteMatcher(sqlite_kb.database, SYNONYMS)
+    for text in ["i have a fever and a cough", "  pain abdominal  ", "hi", "", "nausea,vomiting"]:
+        assert sql.scan(text) == ref.scan(text)
+    for symptom in list(kb.symptom_to_diseases)[:200]:
+        text = f"since yesterday {symptom.replace('_', ' ')} and worse"
+        assert sql.scan(text) == ref.scan(text)
+
+
+def test_scoring_under_concurrent_threads(kb, sqlite_kb, selections):
+    # A tiny LRU so threads evict each other's postings constantly
+    engine = database.SQLiteScoringEngine(sqlite_kb.database, hot=8)
+    want = [kb.scoring_engine.diagnose(sorted(s)) for s in selections]
+    with ThreadPoolExecutor(8) as pool:
+        for _ in range(3):
+            assert list(pool.map(lambda s: engine.diagnose(sorted(s)), selections)) == want
+    assert len(engine.hot.entries) <= 8
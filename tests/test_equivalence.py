@@ -0,0 +1,254 @@
+"""Every engine against the scans it replaced (the baseline GUI and chatbot
+code), on the in-memory, shared-memory and SQLite backends"""
+
+import difflib
+import random
+
+import pytest
+
+import chatbot
+import knowledge
+import microbatch
+import related
+import snapshot
+import triage
+from cache import DiagnosisCache
+from fuzzy import FuzzyIndex, edit_distance
+from graph import KnowledgeGraph
+from topk import ImpactIndex, patient_queries
+
+
+@pytest.fixture(params=["kb", "shared_kb", "sqlite_kb"])
+def backend(request):
+    return request.getfixturevalue(request.param)
+
+
+@pytest.fixture(scope="session")
+def baseline():
+    """(disease_to_symptoms, symptom_to_diseases) as plain dicts from the CSV"""
+    d2s = knowledge.read_symptoms()
+    return d2s, knowledge.reverse_mapping(d2s)
+
+
+# ----------------------------------------------------------
+# BASELINE SCANS
+# ----------------------------------------------------------
+
+def baseline_rank(d2s, s2d, selected, k=3, method="certainty"):
+    """The GUI's compute_certainty / the chatbot's analyze_symptoms, without the floor"""
+    matches = {}
+    for s in selected:
+        for d in s2d.get(s, []):
+            matches[d] = matches.get(d, 0) + 1
+    user = set(selected)
+    scores = {}
+    for d, c in matches.items():
+        disease = set(d2s[d])
+        if method == "certainty":
+            shared = user & disease
+            scores[d] = round(len(shared) / len(user | disease) * 70 + len(shared) / len(user) * 30, 1)
+        else:
+            scores[d] = round((c / len(d2s[d])) * 100, 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def baseline_diagnose(d2s, s2d, selected, k=3):
+    top = baseline_rank(d2s, s2d, selected, k)
+    if top and top[0][1] < 35:
+        top[0] = (top[0][0], 35.0)
+    return top
+
+
+def baseline_exact_scan(symptoms, text):
+    """extract_symptoms before the matcher: slang replaced pattern by pattern,
+    then every symptom tested in turn"""
+    for slang, medical in chatbot.SYNONYMS.items():
+        text = text.replace(slang, medical)
+    return text, {s for s in symptoms if s.replace("_", " ") in text or s in text}
+
+
+def messages(symptoms, n=200, seed=0):
+    """Chat messages mixing symptom names, slang, typos and filler"""
+    rng = random.Random(seed)
+    slang = list(chatbot.SYNONYMS)
+    filler = ["i have", "and", "also some", "since yesterday", "my", "really bad", "a bit of"]
+    out = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            choice = rng.random()
+            if choice < 0.5:
+                parts.append(rng.choice(symptoms).replace("_", " ") if rng.random() < 0.8 else rng.choice(symptoms))
+            elif choice < 0.7:
+                parts.append(rng.choice(slang))
+            elif choice < 0.85:
+                parts.append(typo(rng, rng.choice(symptoms).replace("_", " ")))
+            parts.append(rng.choice(filler))
+        out.append(" ".join(parts))
+    return out
+
+
+def typo(rng, word):
+    """word with one or two random deletions, insertions, substitutions or swaps"""
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(word))
+        op = rng.randrange(4)
+        if op == 0 and len(word) > 1:
+            word = word[:i] + word[i + 1:]
+        elif op == 1:
+            word = word[:i] + rng.choice("aeiourst") + word[i:]
+        elif op == 2:
+            word = word[:i] + rng.choice("aeiourst") + word[i + 1:]
+        elif i + 1 < len(word):
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+# ----------------------------------------------------------
+# SCORING
+# ----------------------------------------------------------
+
+def test_diagnose_matches_baseline(backend, baseline, selections):
+    d2s, s2d = baseline
+    engine, cache = backend.scoring_engine, DiagnosisCache()
+    for selection in selections:
+        query = sorted(selection)
+        want = baseline_diagnose(d2s, s2d, query)
+        assert engine.diagnose(query) == want
+        assert cache.get(backend, selection) == want
+        assert engine.rank(query, 3, "coverage") == baseline_rank(d2s, s2d, query, 3, "coverage")
+
+
+def test_impact_top_k_matches_baseline(generated):
+    s2d = knowledge.reverse_mapping(generated)
+    graph = KnowledgeGraph(generated)
+    impact = ImpactIndex(graph)
+    pruned = 0
+    for query in patient_queries(random.Random(0), graph, 500):
+        query = sorted(query)
+        for method in ("certainty", "coverage"):
+            top = impact.top(query, 5, method)
+            if top is not None:
+                pruned += 1
+                assert top == baseline_rank(generated, s2d, query, 5, method)
+    assert pruned
+
+
+def test_generated_engine_matches_baseline(generated):
+    s2d = knowledge.reverse_mapping(generated)
+    graph = KnowledgeGraph(generated)
+    engine = graph.scoring_engine()
+    assert engine.impact is not None
+    for query in patient_queries(random.Random(1), graph, 300):
+        query = sorted(query)
+        assert engine.diagnose(query) == baseline_diagnose(generated, s2d, query)
+
+
+def test_batch_scorer_matches_baseline(backend, baseline, selections, monkeypatch):
+    monkeypatch.setattr(microbatch, "BITSET_MIN_DISEASES", 0)
+    d2s, s2d = baseline
+    queries = [sorted(s) for s in selections]
+    scorer = microbatch.BatchScorer(backend.scoring_engine)
+    assert scorer.diagnose_batch(queries) == [baseline_diagnose(d2s, s2d, q) for q in queries]
+    assert scorer.rank_batch(queries, 3, "coverage") == [baseline_rank(d2s, s2d, q, 3, "coverage") for q in queries]
+
+
+def test_batch_scorer_on_generated_matches_baseline(generated):
+    s2d = knowledge.reverse_mapping(generated)
+    graph = KnowledgeGraph(generated)
+    scorer = microbatch.BatchScorer(graph.scoring_engine())
+    assert scorer.bitsets
+    queries = [sorted(q) for q in patient_queries(random.Random(2), graph, 300)]
+    assert scorer.diagnose_batch(queries, 5) == [baseline_diagnose(generated, s2d, q, 5) for q in queries]
+
+
+# ----------------------------------------------------------
+# SNAPSHOT
+# ----------------------------------------------------------
+
+def test_snapshot_round_trip(kb, tmp_path):
+    path = str(tmp_path / "kb.snapshot")
+    d2s, info, treatments = dict(kb.disease_to_symptoms), dict(kb.disease_info), dict(kb.disease_treatments)
+    snapshot.write_snapshot(path, d2s, info, treatments)
+    assert snapshot.read_snapshot(path) == (d2s, info, treatments)
+
+
+def test_shared_tables_match_baseline(shared_kb, baseline):
+    d2s, s2d = baseline
+    assert dict(shared_kb.disease_to_symptoms) == d2s
+    assert dict(shared_kb.symptom_to_diseases) == s2d
+
+
+# ----------------------------------------------------------
+# SYMPTOM EXTRACTION
+# ----------------------------------------------------------
+
+def test_matcher_matches_baseline_scan(backend, baseline):
+    symptoms = sorted(baseline[1])
+    matcher = chatbot.build_matcher(backend)
+    for text in messages(symptoms):
+        replaced, want = baseline_exact_scan(symptoms, text)
+        assert matcher.replace_slang(text) == replaced
+        assert matcher.scan(replaced) == want
+
+
+def test_fuzzy_lookup_matches_brute_force(backend, baseline):
+    index = backend.symptom_index
+    phrases = sorted({s.replace("_", " ") for s in baseline[1]})
+    rng = random.Random(0)
+    terms = [typo(rng, rng.choice(phrases)) for _ in range(300)]
+    terms += [w for p in rng.sample(phrases, 50) for w in p.split()]
+    for term in terms:
+        limit = index.budget(term)
+        want = sorted(((p, d) for p in phrases if (d := edit_distance(term, p, limit)) <= limit),
+                      key=lambda x: (x[1], x[0]))
+        assert index.lookup(term) == want, term
+
+
+def test_fuzzy_ratio_matches_difflib(baseline):
+    symptoms = list(baseline[1])
+    index = FuzzyIndex(symptoms, mode="ratio")
+    for text in messages(sorted(symptoms), n=100, seed=1):
+        want = {s for s in symptoms for word in text.split()
+                if difflib.get_close_matches(word, [s.replace("_", " ")], n=1, cutoff=0.85)}
+        assert index.search(text) == want
+
+
+# ----------------------------------------------------------
+# WHOLE-GRAPH INDEXES
+# ----------------------------------------------------------
+
+def test_related_matches_exact_scan(backend, baseline):
+    d2s = baseline[0]
+    idx = related.index(backend)
+    hits = total = 0
+    for disease, symptoms in d2s.items():
+        mine = set(symptoms)
+        for other, j in idx.related(disease):
+            theirs = set(d2s[other])
+            assert j == round(len(mine & theirs) / len(mine | theirs), 3)
+        want = related.exact_related(d2s, disease)
+        hits += len({d for d, _ in idx.related(disease)} & set(want))
+        total += len(want)
+    assert hits / total >= 0.95
+
+
+def test_next_question_matches_exhaustive(backend, baseline, selections):
+    d2s, s2d = baseline
+    idx = triage.index(backend)
+    rng = random.Random(0)
+    rows = {d: set(s) for d, s in d2s.items()}
+    for selection in selections[:200]:
+        confirmed = selection[:rng.randint(0, 2)]
+        denied = [s for s in rng.sample(sorted(s2d), 2) if s not in confirmed]
+        cand = [d for d, row in rows.items() if row.issuperset(confirmed) and not row.intersection(denied)]
+        best = max((min(a, len(cand) - a) for a in
+                    (sum(s in rows[d] for d in cand) for s in s2d)), default=0)
+        got = idx.ask(confirmed, denied)
+        if best == 0:
+            assert got is None
+        else:
+            symptom, bits = got
+            assert bits == round(triage.gain(len(cand), best), 3)
+            a = sum(symptom in rows[d] for d in cand)
+            assert min(a, len(cand) - a) == best
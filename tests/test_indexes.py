@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+import related
+import triage
+
+
+@pytest.fixture(params=["shared_kb", "sqlite_kb"])
+def backend(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_id_graph_matches_in_memory_graph(kb, backend):
+    graph, other = kb.id_graph(), backend.id_graph()
+    assert list(other.indptr) == list(graph.indptr)
+    assert list(other.indices) == list(graph.indices)
+    assert list(other.post_indices) == list(graph.post_indices)
+    assert [other.symptoms[i] for i in range(len(other.symptoms))] == graph.symptoms
+    assert all(other.symptom_ids.get(s) == i for i, s in enumerate(graph.symptoms))
+    assert all(other.disease_ids.get(d) == i for i, d in enumerate(graph.diseases))
+    assert other.symptom_ids.get("no such symptom") is None
+
+
+def test_related_same_on_every_backend(kb, backend):
+    mine, theirs = related.index(kb), related.index(backend)
+    for disease in kb.disease_to_symptoms:
+        assert theirs.related(disease) == mine.related(disease)
+
+
+def test_next_question_same_on_every_backend(kb, backend):
+    mine, theirs = triage.index(kb), triage.index(backend)
+    rng = random.Random(0)
+    symptoms, diseases = sorted(kb.symptom_to_diseases), list(kb.disease_to_symptoms)
+    for _ in range(300):
+        confirmed, denied = rng.sample(symptoms, rng.randint(0, 2)), rng.sample(symptoms, rng.randint(0, 2))
+        among = rng.sample(diseases, 3)
+        assert theirs.ask(confirmed, denied) == mine.ask(confirmed, denied)
+        assert theirs.ask(confirmed, denied, among) == mine.ask(confirmed, denied, among)
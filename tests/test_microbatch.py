@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+import microbatch
+
+
+@pytest.fixture(params=["kb", "shared_kb"])
+def engine(request, monkeypatch):
+    # The bundled knowledge base is below the bitset threshold; score it with bitsets anyway
+    monkeypatch.setattr(microbatch, "BITSET_MIN_DISEASES", 0)
+    return request.getfixturevalue(request.param).scoring_engine
+
+
+def test_batch_matches_engine(kb, engine, selections):
+    scorer = microbatch.BatchScorer(engine)
+    assert scorer.bitsets
+    queries = [sorted(s) for s in selections] + [["no such symptom"], ["fever", "no such symptom"], []]
+    want = kb.scoring_engine
+    assert scorer.diagnose_batch(queries, 5) == [want.diagnose(q, 5) for q in queries]
+    assert scorer.rank_batch(queries, 3, "coverage") == [want.rank(q, 3, "coverage") for q in queries]
+
+
+def test_diagnose_batch_matches_core(kb, selections):
+    import core
+
+    requests = [(s, 1 + i % 5) for i, s in enumerate(selections)]
+    assert microbatch.diagnose_batch(requests) == [core.diagnose(s, k) for s, k in requests]
+
+
+def test_full_queue_is_rejected():
+    release = threading.Event()
+
+    def slow(requests):
+        release.wait()
+        return requests
+
+    batcher = microbatch.MicroBatcher(slow, max_batch=1, max_delay=0, max_queue=2)
+    futures = []
+    with pytest.raises(microbatch.Overloaded):
+        for i in range(10):
+            futures.append(batcher.submit(i))
+    # At most one request being scored plus max_queue waiting
+    assert 2 <= len(futures) <= 3
+    release.set()
+    assert [f.result(5) for f in futures] == list(range(len(futures)))
+    assert batcher.stats()["rejected"] == 1
+    batcher.close()
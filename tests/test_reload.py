@@ -0,0 +1,60 @@
+import random
+
+from fuzzy import FuzzyIndex
+from graph import KnowledgeGraph
+from topk import ImpactIndex
+
+
+def edited(disease_to_symptoms, seed):
+    """A copy with a few rows changed, one emptied, new symptoms and one new disease"""
+    rng = random.Random(seed)
+    d2s = {d: list(s) for d, s in disease_to_symptoms.items()}
+    symptoms = sorted({s for row in d2s.values() for s in row})
+    names = list(d2s)
+    for disease in rng.sample(names, 5):
+        row = d2s[disease]
+        rng.shuffle(row)
+        d2s[disease] = row[1:] + rng.sample(symptoms, 2)
+    d2s[rng.choice(names)].append(f"new_symptom_{seed}")
+    d2s[rng.choice(names)] = []
+    d2s[f"New Disease {seed}"] = rng.sample(symptoms, 3) + ["brand_new_symptom"]
+    return d2s
+
+
+def assert_same_graph(graph, want):
+    assert graph.diseases == want.diseases and graph.disease_ids == want.disease_ids
+    assert graph.symptoms == want.symptoms and graph.symptom_ids == want.symptom_ids
+    assert graph.labels == want.labels
+    for name in ("indptr", "indices", "sizes", "post_ptr", "post_indices"):
+        assert list(getattr(graph, name)) == list(getattr(want, name)), name
+
+
+def test_patched_graph_equals_rebuild(kb):
+    old = KnowledgeGraph(dict(kb.disease_to_symptoms))
+    impact = ImpactIndex(old)
+    for seed in range(5):
+        d2s = edited(kb.disease_to_symptoms, seed)
+        graph, moves = old.patched(d2s)
+        want = KnowledgeGraph(d2s)
+        assert_same_graph(graph, want)
+        assert list(impact.patched(graph, *moves).indices) == list(ImpactIndex(want).indices)
+
+
+def test_removed_disease_needs_rebuild(kb):
+    old = KnowledgeGraph(dict(kb.disease_to_symptoms))
+    d2s = dict(kb.disease_to_symptoms)
+    del d2s[next(iter(d2s))]
+    assert old.patched(d2s) is None
+
+
+def test_patched_fuzzy_index_equals_rebuild(kb):
+    old = FuzzyIndex(list(kb.symptom_to_diseases), max_distance=2)
+    symptoms = [s for s in kb.symptom_to_diseases if not s.startswith("s")] + ["brand_new_symptom"]
+    index, want = old.patched(symptoms), FuzzyIndex(symptoms, max_distance=2)
+    assert index.phrases == want.phrases and index.max_words == want.max_words
+    assert {k: sorted(v) for k, v in index.deletes.items()} == {k: sorted(v) for k, v in want.deletes.items()}
+    rng = random.Random(0)
+    for _ in range(100):
+        text = "i have " + " and ".join(s.replace("_", " ") for s in rng.sample(symptoms, 2))
+        assert index.search(text) == want.search(text)
+        assert index.search(text[:-1]) == want.search(text[:-1])
@@ -0,0 +1,28 @@
+import random
+
+from scoring import LiveRanking
+
+
+def test_live_ranking_matches_diagnose(kb, selections):
+    engine = kb.scoring_engine
+    for selection in selections:
+        live = LiveRanking(engine, selection)
+        assert live.top(3) == engine.diagnose(sorted(selection), 3)
+        assert live.top(5, floor=False) == engine.rank(sorted(selection), 5)
+
+
+def test_live_ranking_coverage_matches_rank(kb, selections):
+    engine = kb.scoring_engine
+    for selection in selections:
+        assert LiveRanking(engine, selection, "coverage").top(3) == engine.rank(sorted(selection), 3, "coverage")
+
+
+def test_live_ranking_after_adds_and_removes(kb, selections):
+    engine = kb.scoring_engine
+    rng = random.Random(1)
+    live = LiveRanking(engine)
+    for selection in selections[:100]:
+        live.update(selection)
+        if len(selection) > 1:
+            live.remove(rng.choice(selection))
+        assert live.top(3) == engine.diagnose(sorted(live.symptoms), 3)
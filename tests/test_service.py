@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import service as service_module
+from service import ChatService
+
+
+@pytest.fixture
+def service(kb):
+    service = ChatService()
+    yield service
+    service.batcher.close()
+
+
+def post(service, path, payload):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    return asyncio.run(service.route("POST", path, body))
+
+
+def test_chat_severity_without_gui_diagnosis(service):
+    sid = post(service, "/sessions", {})[1]["session_id"]
+    assert post(service, f"/sessions/{sid}/messages", {"text": "I have a fever and a cough"})[0] == 200
+    status, payload = post(service, f"/sessions/{sid}/messages", {"text": "is it serious?"})
+    assert status == 200 and "mild" in payload["reply"]
+
+
+@pytest.mark.parametrize("payload", [
+    {"diseases": [1]},
+    {"diseases": "Flu"},
+    {"diseases": [["Flu"]]},
+    {"diseases": [["Flu", "high"]]},
+    {"diseases": [["Influenza", 62.5]], "severity": None},
+    {"diseases": [["Influenza", 62.5]], "symptoms": "fever"},
+])
+def test_diagnosis_context_is_validated(service, payload):
+    sid = post(service, "/sessions", {})[1]["session_id"]
+    assert post(service, f"/sessions/{sid}/diagnosis", payload)[0] == 400
+    # The session is unchanged and still usable
+    assert post(service, f"/sessions/{sid}/messages", {"text": "is it serious?"})[0] == 200
+
+
+def test_unexpected_error_is_a_500(service, monkeypatch):
+    def broken(*args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(service, "dispatch", broken)
+    assert post(service, "/sessions", {}) == (500, {"error": "internal error"})
+
+
+def test_diagnose_matches_core(service, selections):
+    import core
+
+    for selection in selections[:50]:
+        status, payload = post(service, "/diagnose", {"symptoms": selection, "k": 3})
+        assert status == 200
+        assert [tuple(r) for r in payload["results"]] == core.diagnose(selection, 3)
+
+
+def test_chat_turn_does_not_block_other_requests(service, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_turn(context, text):
+        started.set()
+        release.wait(5)
+        return "done", 1
+
+    monkeypatch.setattr(service_module, "_turn", slow_turn)
+
+    async def scenario():
+        sid = (await service.route("POST", "/sessions", b""))[1]["session_id"]
+        turn = asyncio.ensure_future(service.route("POST", f"/sessions/{sid}/messages", b'{"text": "hi"}'))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        # The turn is still running on the executor; the loop keeps serving
+        health = await service.route("GET", "/health", b"")
+        other = await service.route("POST", "/sessions", b"")
+        assert not turn.done()
+        release.set()
+        return health, other, await turn
+
+    health, other, turn = asyncio.run(scenario())
+    assert health[0] == 200 and other[0] == 201
+    assert turn == (200, {"reply": "done", "knowledge_version": 1})
@@ -0,0 +1,206 @@
+"""
+Exact top-k diagnosis without scoring every candidate
+Both ranking scores (certainty and coverage) grow with the number of shared
+symptoms c and shrink with the disease's size. So each symptom's postings
+are kept in impact order (smallest disease first), and the first posting
+gives the best score anything in that list can reach. Lists are walked
+rarest first (MaxScore style). Once the best possible score of the next
+posting falls below the current k-th best, the rest of that list is
+skipped. This is usually most of "fever" or "pain". Results, including
+tie order, equal ScoringEngine.rank / diagnose.
+
+Usage:
+    engine.impact = ImpactIndex(graph)   # done by KnowledgeGraph.scoring_engine() on big graphs
+    engine.diagnose(["fever", "cough"])  # now pruned
+
+    python topk.py --edges 1000000       # latency vs exhaustive scoring (see bench.py)
+"""
+
+import argparse
+import heapq
+import random
+from array import array
+from bisect import bisect_left
+from itertools import chain
+
+from scoring import certainty_score
+
+# A posting list is pruned when longer than this many times all shorter
+# query lists together; below that, scoring every candidate is as cheap
+NON_ESSENTIAL = 4
+
+# Cost of scoring one candidate per query symptom, relative to counting one
+# posting exhaustively; decides when pruning is not worth it
+SCORE_COST = 1
+
+
+class ImpactIndex:
+    def __init__(self, graph):
+        self.graph = graph
+        sizes = graph.sizes
+        # Same CSR layout as graph.post_ptr, but each list sorted by (size, disease ID)
+        self.indptr = graph.post_ptr
+        self.indices = array("i", bytes(4 * len(graph.post_indices)))
+        fill = array("i", self.indptr)
+        post = self.indices
+        for did in sorted(range(len(sizes)), key=sizes.__getitem__):
+            for sid in graph.symptoms_of(did):
+                post[fill[sid]] = did
+                fill[sid] += 1
+
+    def patched(self, graph, order, touched):
+        """ImpactIndex of graph, patched from this one (see KnowledgeGraph.patched):
+        lists of untouched symptoms are copied, touched ones re-sorted"""
+        index = ImpactIndex.__new__(ImpactIndex)
+        index.graph, index.indptr, index.indices = graph, graph.post_ptr, array("i")
+        sizes, old_ptr, old = graph.sizes, self.indptr, self.indices
+        for sid, before in enumerate(order):
+            if before in touched:
+                index.indices.extend(sorted(graph.diseases_of(sid), key=lambda d: (sizes[d], d)))
+            else:
+                index.indices.extend(old[old_ptr[before]:old_ptr[before + 1]])
+        return index
+
+    def top(self, symptoms, k=3, method="certainty"):
+        """Best k (disease, score) pairs, as ScoringEngine.rank(symptoms, k, method);
+        None when pruning would not beat scoring every candidate"""
+        if method == "certainty":
+            query = list(dict.fromkeys(symptoms))
+            n = len(query)
+            score = lambda c, size: certainty_score(c, n, size)
+            # c shared symptoms need a disease of at least c symptoms
+            bound = lambda c, size: certainty_score(c, n, max(c, size))
+        elif method == "coverage":
+            query = list(symptoms)
+            score = bound = lambda c, size: round((c / size) * 100, 1)
+        else:
+            raise ValueError(f"Unknown scoring method: {method}")
+        if not query or k <= 0:
+            return None
+
+        g = self.graph
+        ptr, by_id, sizes = g.post_ptr, g.post_indices, g.sizes
+        # Distinct query symptoms: (symptom ID, times asked, first query position)
+        wanted = {}
+        for pos, s in enumerate(query):
+            sid = g.symptom_ids.get(s)
+            if sid is not None:
+                wanted.setdefault(sid, [sid, 0, pos])[1] += 1
+        terms = sorted(wanted.values(), key=lambda t: (ptr[t[0] + 1] - ptr[t[0]], t[2]))
+        lengths = [ptr[t[0] + 1] - ptr[t[0]] for t in terms]
+
+        # Lists much longer than all shorter lists together are "non-essential":
+        # a disease found in none of the others is only scored if it can still win
+        split, shorter = len(terms), 0
+        for i, length in enumerate(lengths):
+            if length > NON_ESSENTIAL * shorter and i:
+                split = i
+                break
+            shorter += length
+        essential, rest = terms[:split], terms[split:]
+
+        def exact(did):
+            # Shared symptoms and first query position, by binary search of
+            # the disease-ordered postings (ties break on both, as when exhaustive)
+            c, first = 0, len(query)
+            for sid, times, pos in terms:
+                lo, hi = ptr[sid], ptr[sid + 1]
+                at = bisect_left(by_id, did, lo, hi)
+                if at < hi and by_id[at] == did:
+                    c += times
+                    if pos < first:
+                        first = pos
+            return (score(c, sizes[did]), -first, -did)
+
+        if not rest:
+            return None
+        seen = set(chain.from_iterable(by_id[ptr[t[0]]:ptr[t[0] + 1]] for t in essential))
+        heap = heapq.nlargest(k, map(exact, seen))
+        heap.reverse()
+        heapq.heapify(heap)
+
+        # Unseen diseases share at most `remaining` symptoms, all from these lists
+        remaining = sum(t[1] for t in rest)
+        post = self.indices
+        if len(heap) == k:
+            # Postings each list would still be walked for at the current threshold
+            cut = lambda p: bound(remaining, sizes[post[p]]) < heap[0][0]
+            walk = sum(bisect_left(range(ptr[t[0]], ptr[t[0] + 1]), True, key=cut) for t in rest)
+        else:
+            walk = sum(lengths[split:])
+        if (len(seen) + walk) * len(terms) * SCORE_COST > sum(lengths):
+            # The bound is too loose for this query: counting everything is cheaper
+            return None
+
+        for sid, times, _ in rest:
+            complete = True
+            for p in range(ptr[sid], ptr[sid + 1]):
+                did = post[p]
+                if did in seen:
+                    continue
+                if len(heap) == k and bound(remaining, sizes[did]) < heap[0][0]:
+                    # Impact order: every later posting is a bigger disease
+                    complete = False
+                    break
+                seen.add(did)
+                item = exact(did)
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+            # A list cut short may still hold unseen diseases
+            if complete:
+                remaining -= times
+
+        return [(g.diseases[-d], s) for s, _, d in sorted(heap, reverse=True)]
+
+
+# ----------------------------------------------------------
+# BENCHMARK
+# ----------------------------------------------------------
+
+def patient_queries(rng, graph, n):
+    """1-6 symptoms of one disease, as a patient would present them"""
+    out = []
+    for _ in range(n):
+        did = rng.randrange(len(graph.diseases))
+        symptoms = [graph.symptoms[s] for s in graph.symptoms_of(did)]
+        out.append(rng.sample(symptoms, min(len(symptoms), rng.randint(1, 6))))
+    return out
+
+
+def main(argv=None):
+    import bench
+    import knowledge
+    from graph import KnowledgeGraph
+
+    parser = argparse.ArgumentParser(description="Pruned vs exhaustive top-k latency")
+    parser.add_argument("--edges", type=int, help="generated dataset size (default: dataset.csv)")
+    parser.add_argument("--data-dir", default=bench.DATA_DIR)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    path = bench.dataset(args.data_dir, args.edges)[0] if args.edges else knowledge.csv_path
+    graph = KnowledgeGraph(knowledge.read_symptoms(path))
+    exhaustive = graph.scoring_engine()
+    exhaustive.impact = None
+    pruned = graph.scoring_engine()
+    pruned.impact = ImpactIndex(graph)
+
+    rng = random.Random(0)
+    vocab = graph.symptoms
+    workloads = {"random": [rng.sample(vocab, rng.randint(1, 6)) for _ in range(args.samples)],
+                 "patient": patient_queries(rng, graph, args.samples)}
+    print(f"{len(graph.diseases)} diseases, {len(vocab)} symptoms, {len(graph)} edges")
+    for name, sets in workloads.items():
+        for method in ("certainty", "coverage"):
+            a = bench.summarize(bench.timed(lambda q: exhaustive.rank(q, args.k, method), sets))
+            b = bench.summarize(bench.timed(lambda q: pruned.rank(q, args.k, method), sets))
+            mismatches = sum(exhaustive.rank(q, args.k, method) != pruned.rank(q, args.k, method) for q in sets)
+            print(f"{name:8} {method:10} exhaustive p50 {a['p50_ms']:8.4f} p99 {a['p99_ms']:8.4f} ms | "
+                  f"pruned p50 {b['p50_ms']:8.4f} p99 {b['p99_ms']:8.4f} ms | mismatches {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
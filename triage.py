@@ -0,0 +1,250 @@
+"""
+Next best question: the unasked symptom that best splits the candidates
+Candidates are the diseases consistent with every answer so far (they list
+each confirmed symptom and none of the denied ones), taken as equally
+likely. Asking about a symptom splits n candidates into a that have it and
+n - a that don't, leaving (a log2 a + (n - a) log2 (n - a)) / n bits of
+entropy on average. So the best question has the most balanced split.
+
+Each common symptom's diseases are one Python int used as a bitset, so a
+split count over every candidate is a single AND + bit_count. Rare symptoms
+keep plain posting lists. They can split off only that many candidates, so
+they are only counted while they could still beat the best common one.
+Small candidate sets are counted straight from their diseases' rows.
+
+Usage:
+    triage.index(kb).ask(["fever", "cough"], denied=["headache"])   # (symptom, gain in bits) or None
+
+    python triage.py fever cough               # next question for these symptoms
+    python triage.py --bench --edges 100000    # latency on a generated dataset (see bench.py)
+"""
+
+import argparse
+import math
+import random
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate, chain
+
+# Symptoms listed by at least 1/DENSE_FRACTION of all diseases get a bitset;
+# an int of D bits then costs at most as much as DENSE_FRACTION / 8 bytes per edge
+DENSE_FRACTION = 256
+
+
+def gain(n, a):
+    """Expected entropy reduction (bits) of a yes/no split of n equally likely candidates"""
+    if not 0 < a < n:
+        return 0.0
+    return math.log2(n) - (a * math.log2(a) + (n - a) * math.log2(n - a)) / n
+
+
+def members(bits):
+    """Set bit positions of an int, lowest first"""
+    # Word by word: shifting the whole int per bit is quadratic in its size
+    out = []
+    words = array("Q", bits.to_bytes((bits.bit_length() + 63) // 64 * 8, "little"))
+    for i, w in enumerate(words):
+        base = i * 64
+        while w:
+            low = w & -w
+            out.append(base + low.bit_length() - 1)
+            w ^= low
+    return out
+
+
+class TriageIndex:
+    def __init__(self, graph):
+        """graph: the knowledge version's KnowledgeGraph (kb.id_graph()); its IDs,
+        disease rows and symptom postings are used in place, not copied"""
+        self.graph = graph
+        self.diseases, self.disease_ids = graph.diseases, graph.disease_ids
+        self.symptoms, self.symptom_ids = graph.symptoms, graph.symptom_ids
+        self.indptr, self.indices = graph.indptr, graph.indices
+        self.nbytes = (len(self.diseases) + 7) // 8
+        self.everyone = (1 << len(self.diseases)) - 1
+
+        # Common symptoms as (symptom ID, disease bitset); rare ones longest list first
+        ptr = graph.post_ptr
+        self.lengths = array("i", (ptr[i + 1] - ptr[i] for i in range(len(self.symptoms))))
+        threshold = max(1, len(self.diseases) // DENSE_FRACTION)
+        self.dense = [(sid, self.bitset(graph.diseases_of(sid)))
+                      for sid, n in enumerate(self.lengths) if n >= threshold]
+        self.columns = dict(self.dense)
+        self.sparse = sorted((sid for sid, n in enumerate(self.lengths) if n < threshold),
+                             key=lambda sid: -self.lengths[sid])
+        # Postings in the first i rare lists, and minus each list's length (ascending, for bisect)
+        self.sparse_work = array("q", accumulate((self.lengths[sid] for sid in self.sparse), initial=0))
+        self.sparse_neg = array("i", (-self.lengths[sid] for sid in self.sparse))
+        self.mean_size = len(self.indices) / len(self.diseases) if len(self.diseases) else 0.0
+
+    def bitset(self, dids):
+        """Int with bit d set for each disease ID d"""
+        bits = bytearray(self.nbytes)
+        for d in dids:
+            bits[d >> 3] |= 1 << (d & 7)
+        return int.from_bytes(bits, "little")
+
+    def column(self, symptom):
+        """Bitset of the diseases listing a symptom (0 if unknown)"""
+        sid = self.symptom_ids.get(symptom)
+        if sid is None:
+            return 0
+        bits = self.columns.get(sid)
+        return self.bitset(self.graph.diseases_of(sid)) if bits is None else bits
+
+    def candidates(self, confirmed=(), denied=(), among=None):
+        """Bitset of the diseases (of among, if given) that list every confirmed symptom and no denied one"""
+        if among is None:
+            cand = self.everyone
+        else:
+            cand = self.bitset(d for d in map(self.disease_ids.get, among) if d is not None)
+        for s in confirmed:
+            cand &= self.column(s)
+        for s in denied:
+            cand &= ~self.column(s)
+        return cand
+
+    def ask(self, confirmed=(), denied=(), among=None):
+        """(symptom, expected information gain in bits) of the best question, or None
+        if no question splits the candidates. When nothing is consistent with
+        the answers, among (e.g. the current top diagnoses) is split instead"""
+        cand = self.candidates(confirmed, denied)
+        # Symptoms already answered split consistent candidates not at all (a = n or 0)
+        asked = ()
+        if not cand and among:
+            cand = self.candidates((), denied, among)
+            asked = {sid for sid in map(self.symptom_ids.get, chain(confirmed, denied)) if sid is not None}
+        n = cand.bit_count()
+        if n < 2:
+            return None
+        if n * self.mean_size <= len(self.dense):
+            best, best_sid = self._best_by_rows(cand, n, asked)
+        else:
+            best, best_sid = self._best_by_columns(cand, n, asked)
+        if best_sid is None:
+            return None
+        return self.symptoms[best_sid], round(gain(n, best), 3)
+
+    def _best_by_rows(self, cand, n, asked=()):
+        # Few candidates: count their symptoms directly
+        indptr, indices = self.indptr, self.indices
+        counts = Counter(chain.from_iterable(indices[indptr[d]:indptr[d + 1]] for d in members(cand)))
+        for sid in asked:
+            counts.pop(sid, None)
+        best = max(map(min, counts.values(), map(n.__sub__, counts.values())), default=0)
+        if not best:
+            return 0, None
+        return best, min(sid for sid, a in counts.items() if a == best or a == n - best)
+
+    def _best_by_columns(self, cand, n, asked=()):
+        # m = min(a, n - a): the gain grows with it
+        best, best_sid = 0, None
+        for sid, bits in self.dense:
+            a = (cand & bits).bit_count()
+            m = min(a, n - a)
+            if m > best and sid not in asked:
+                best, best_sid = m, sid
+        # A rare symptom splits off at most len(postings) candidates; when the
+        # lists that could still win hold more postings than the candidates' rows, count those
+        if self.sparse_work[bisect_left(self.sparse_neg, -best)] > n * self.mean_size:
+            return self._best_by_rows(cand, n, asked)
+        if self.sparse and self.lengths[self.sparse[0]] > best:
+            member = cand.to_bytes(self.nbytes, "little")
+            for sid in self.sparse:
+                if self.lengths[sid] <= best:
+                    break
+                a = sum(member[d >> 3] >> (d & 7) & 1 for d in self.graph.diseases_of(sid))
+                m = min(a, n - a)
+                if m > best and sid not in asked:
+                    best, best_sid = m, sid
+        return best, best_sid
+
+
+def index(kb):
+    """The TriageIndex of a knowledge version, built on first use"""
+    return kb.derived("triage_index", lambda kb: TriageIndex(kb.id_graph()))
+
+
+# ----------------------------------------------------------
+# BENCHMARK
+# ----------------------------------------------------------
+
+def exact_ask(idx, confirmed=(), denied=()):
+    """Best split by counting every symptom over every candidate, for comparison"""
+    cand = members(idx.candidates(confirmed, denied))
+    counts = Counter(chain.from_iterable(idx.indices[idx.indptr[d]:idx.indptr[d + 1]] for d in cand))
+    return max((min(a, len(cand) - a) for a in counts.values()), default=0)
+
+
+def bench(idx, samples=500, seed=0):
+    import bench as timing
+
+    rng = random.Random(seed)
+    # A patient's first 1-2 symptoms, then a few questions answered truthfully
+    sessions = []
+    for _ in range(samples):
+        did = rng.randrange(len(idx.diseases))
+        row = [idx.symptoms[s] for s in idx.indices[idx.indptr[did]:idx.indptr[did + 1]]]
+        sessions.append((did, rng.sample(row, min(len(row), rng.randint(1, 2)))))
+
+    states, sizes, mismatches = [], [], 0
+    for did, confirmed in sessions:
+        confirmed, denied = list(confirmed), []
+        has = set(idx.indices[idx.indptr[did]:idx.indptr[did + 1]])
+        for _ in range(4):
+            states.append((list(confirmed), list(denied)))
+            sizes.append(idx.candidates(confirmed, denied).bit_count())
+            best = idx.ask(confirmed, denied)
+            if best is None:
+                break
+            symptom, bits = best
+            want = exact_ask(idx, confirmed, denied)
+            n = sizes[-1]
+            if round(gain(n, want), 3) != bits:
+                mismatches += 1
+            (confirmed if idx.symptom_ids[symptom] in has else denied).append(symptom)
+
+    stats = timing.summarize(timing.timed(lambda state: idx.ask(*state), states))
+    sizes.sort()
+    print(f"{len(idx.diseases)} diseases, {len(idx.symptoms)} symptoms ({len(idx.dense)} as bitsets), "
+          f"{len(states)} questions, median {sizes[len(sizes) // 2]} / max {sizes[-1]} candidates")
+    print(f"next question p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, "
+          f"max {stats['max_ms']:.3f} ms | mismatches vs exhaustive count {mismatches}")
+
+
+def main(argv=None):
+    import contextlib
+    import sys
+
+    parser = argparse.ArgumentParser(description="Next best question by expected information gain")
+    parser.add_argument("symptoms", nargs="*", help="symptoms the patient has")
+    parser.add_argument("--no", nargs="*", default=[], metavar="SYMPTOM", help="symptoms the patient does not have")
+    parser.add_argument("--bench", action="store_true", help="question latency over simulated patients")
+    parser.add_argument("--edges", type=int, help="with --bench: use a generated dataset (see bench.py)")
+    args = parser.parse_args(argv)
+
+    import knowledge
+    from graph import KnowledgeGraph
+    if args.bench:
+        if args.edges:
+            import bench as timing
+            d2s = knowledge.read_symptoms(timing.dataset(timing.DATA_DIR, args.edges)[0])
+        else:
+            d2s = knowledge.read_symptoms()
+        bench(TriageIndex(KnowledgeGraph(d2s)))
+        return
+
+    with contextlib.redirect_stdout(sys.stderr):
+        kb = knowledge.store.current
+    idx = index(kb)
+    n = idx.candidates(args.symptoms, args.no).bit_count()
+    best = idx.ask(args.symptoms, args.no)
+    if best is None:
+        print(f"{n} candidate(s): no question splits them")
+    else:
+        print(f"{n} candidates: ask about {best[0]!r} ({best[1]} bits)")
+
+
+if __name__ == "__main__":
+    main()